@@ -1,11 +1,31 @@
-import sys
+import argparse
+import csv
 import json
-import hashlib
+import os
+import socket
+import sys
 import time
-import webbrowser
-from configparser import ConfigParser
+from contextlib import contextmanager
 from pathlib import Path
-import boto3
+
+# O núcleo de busca é compartilhado com a interface web (webapp/main).
+sys.path.insert(0, str(Path(__file__).resolve().parent / "webapp"))
+# Como o núcleo, a linguagem de consulta (main.query e o QueryError) só é
+# importada dentro das funções que buscam.
+
+
+class _LazyCore:
+    """
+    Importa o núcleo (e com ele o boto3/botocore) só no primeiro uso, para que
+    --help, erros de argumento e o início do script não paguem essa importação.
+    """
+
+    def __getattr__(self, name):
+        from main import aws_manager_core
+        return getattr(aws_manager_core, name)
+
+
+core = _LazyCore()
 
 # ==============================================================================
 #           Script de busca por recursos em AWS Accounts via SSO (Versão Python)
@@ -18,6 +38,11 @@ import boto3
 # --- Configuração ---
 SSO_PROFILE = "IAM"
 ROUTE53_SEARCH_ACCOUNT_ID = "979633380910"
+# Preenchido por --profile e --profile-json.
+PROFILING = {"print": False, "json": None, "last": None}
+# Formato da saída dos subcomandos. Em ndjson e csv o stdout só recebe os
+# resultados; mensagens, estatísticas e a linha do tempo vão para o stderr.
+OUTPUT = {"format": "text"}
 # --------------------
 
 # Classe para gerenciar as cores do terminal
@@ -31,94 +56,29 @@ class Colors:
 
 # --- Funções Auxiliares ---
 
+def info_stream():
+    """Para onde vão as mensagens: stdout no modo texto, stderr em ndjson e csv."""
+    return sys.stdout if OUTPUT["format"] == "text" else sys.stderr
+
 def print_color(color, text):
     """Imprime texto com a cor especificada."""
-    print(f"{color}{text}{Colors.NC}")
-
-def get_sso_config_value(profile_name, key):
-    """
-    Lê um valor específico (como sso_start_url ou sso_region) do perfil no
-    arquivo de configuração da AWS.
-    """
-    try:
-        config_path = Path.home() / ".aws" / "config"
-        parser = ConfigParser()
-        parser.read(config_path)
-
-        profile_section = f"profile {profile_name}" if profile_name else "default"
-        if not parser.has_section(profile_section):
-            print_color(Colors.RED, f"ERRO: Perfil '{profile_name}' não encontrado em {config_path}")
-            return None
-
-        return parser.get(profile_section, key, fallback=None)
-
-    except Exception as e:
-        print_color(Colors.RED, f"ERRO ao ler o arquivo de configuração da AWS: {e}")
-        return None
+    print(f"{color}{text}{Colors.NC}", file=info_stream())
 
-def get_sso_token(profile_name, sso_start_url):
+def perform_sso_login(profile_name):
     """
-    Busca o token de acesso do cache do SSO.
+    Realiza o login via AWS SSO. Reaproveita o token em cache (AWS CLI ou do
+    próprio aws-manager) e só abre o navegador quando ele não existe ou expirou.
     """
-    try:
-        sha1 = hashlib.sha1(sso_start_url.encode()).hexdigest()
-        cache_path = Path.home() / ".aws" / "sso" / "cache" / f"{sha1}.json"
-
-        if not cache_path.exists():
-            print_color(Colors.RED, "ERRO: Arquivo de cache do SSO não encontrado. Tente fazer login novamente.")
-            return None
-            
-        with open(cache_path) as f:
-            data = json.load(f)
-        return data.get("accessToken")
-
-    except Exception as e:
-        print_color(Colors.RED, f"ERRO ao ler o token do SSO: {e}")
-        return None
-
-def perform_sso_login(profile_name):
-    """Realiza o login via AWS SSO usando o fluxo de device authorization."""
-    sso_start_url = get_sso_config_value(profile_name, 'sso_start_url')
-    sso_region = get_sso_config_value(profile_name, 'sso_region')
-    if not sso_start_url or not sso_region:
+    cached = core.sso_cached_login(profile_name)
+    if cached:
+        print_color(Colors.GRAY, "Token do SSO em cache reutilizado.")
+        return cached
+
+    print_color(Colors.GRAY, "Nenhum token válido em cache. Aprove o acesso no navegador...")
+    result = core.sso_login(profile_name)
+    if not result:
         return None, None
-
-    try:
-        oidc = boto3.client('sso-oidc', region_name=sso_region)
-        reg = oidc.register_client(clientName='aws-manager', clientType='public')
-        client_id = reg['clientId']
-        client_secret = reg['clientSecret']
-        device = oidc.start_device_authorization(
-            clientId=client_id,
-            clientSecret=client_secret,
-            startUrl=sso_start_url,
-        )
-        webbrowser.open(device['verificationUriComplete'])
-        device_code = device['deviceCode']
-        interval = device['interval']
-        expires_in = device['expiresIn']
-
-        for _ in range(expires_in // interval):
-            time.sleep(interval)
-            try:
-                token = oidc.create_token(
-                    clientId=client_id,
-                    clientSecret=client_secret,
-                    grantType='urn:ietf:params:oauth:grant-type:device_code',
-                    deviceCode=device_code,
-                )
-                return token['accessToken'], sso_region
-            except oidc.exceptions.AuthorizationPendingException:
-                continue
-            except oidc.exceptions.SlowDownException:
-                time.sleep(interval)
-                continue
-            except oidc.exceptions.ExpiredTokenException:
-                break
-    except Exception as e:
-        print_color(Colors.RED, f"Falha no login do SSO: {e}")
-
-    return None, None
+    return result
 
 def display_menu(title, options):
     """Exibe um menu customizado e retorna a escolha do usuário."""
@@ -134,6 +94,74 @@ def display_menu(title, options):
     else:
         return None
 
+def print_client_stats(since=None):
+    """
+    Exibe quantos clientes AWS foram criados e reutilizados e, por operação, as
+    chamadas feitas desde o snapshot `since` (core.api_metrics.snapshot()).
+    """
+    stats = core.client_pool.stats()
+    print_color(Colors.GRAY, f"Clientes AWS: {stats['created']} criado(s), {stats['reused']} reutilizado(s).")
+    for api, limits in core.rate_limiters.stats().items():
+        if limits["throttles"]:
+            print_color(Colors.GRAY, f"Limite de taxa em {api}: {limits['throttles']} throttle(s), {limits['waited']}s de espera.")
+
+    summary = core.api_metrics.summary(since)
+    if not summary["operations"]:
+        return
+    print_color(Colors.GRAY, "Chamadas AWS:")
+    for api, op in sorted(summary["operations"].items(), key=lambda x: -x[1]["seconds"]):
+        average = op["seconds"] / op["calls"] if op["calls"] else 0
+        print_color(Colors.GRAY, (
+            f"  {api:<36} {op['calls']:>5} chamada(s) {op['seconds']:>8.2f}s (média {average:.3f}s)"
+            f"  {op['retries']} nova(s) tentativa(s), {op['throttles']} throttle(s), {op['errors']} erro(s)"
+        ))
+    for service, built in summary["clients"].items():
+        print_color(Colors.GRAY, f"  Construção de clientes {service}: {built['built']} em {built['seconds']:.2f}s")
+    slowest = sorted(summary["accounts"].items(), key=lambda x: -x[1])[:5]
+    if len(summary["accounts"]) > 1:
+        print_color(Colors.GRAY, "  Contas mais lentas: " + ", ".join(f"{account} ({seconds:.2f}s)" for account, seconds in slowest))
+
+    if PROFILING["last"]:
+        print_profile(PROFILING["last"])
+        PROFILING["last"] = None
+
+@contextmanager
+def profiled_search(name):
+    """
+    Com --profile ou --profile-json, registra a linha do tempo da busca
+    (busca → conta → role → página da API) para print_client_stats exibir.
+    """
+    if not (PROFILING["print"] or PROFILING["json"]):
+        yield
+        return
+    from main.profiling import profiled
+    with profiled(name) as profile:
+        yield
+    PROFILING["last"] = profile
+
+def print_profile(profile, width=40):
+    """Exibe a linha do tempo em cascata e grava o JSON do Chrome trace, se pedido."""
+    if PROFILING["json"]:
+        Path(PROFILING["json"]).write_text(json.dumps(profile.chrome_trace()))
+        print_color(Colors.GRAY, f"Linha do tempo gravada em {PROFILING['json']} (abra em chrome://tracing ou ui.perfetto.dev).")
+    if not PROFILING["print"]:
+        return
+
+    total = max(profile.duration, 1e-9)
+    print_color(Colors.YELLOW, f"\nLinha do tempo ({total * 1000:.0f} ms):")
+    for row in profile.waterfall():
+        start = int(row["left"] / 100 * width)
+        size = max(1, int(row["width"] / 100 * width))
+        bar = " " * start + "█" * min(size, width - start)
+        label = ("  " * row["depth"] + row["name"])[:44]
+        details = " ".join(f"{key}={value}" for key, value in row["attrs"].items())
+        print(f"  {label:<44} {row['offset_ms']:>8.0f} ms {row['duration_ms']:>8.0f} ms |{bar:<{width}}| {Colors.GRAY}{details}{Colors.NC}", file=info_stream())
+    slowest = profile.slowest("account", 5)
+    if slowest:
+        print_color(Colors.YELLOW, "Contas mais lentas:")
+        for account in slowest:
+            print(f"  {account['name']} ({account['attrs'].get('account_id')}): {account['duration_ms']:.0f} ms, {account['attrs'].get('status')}", file=info_stream())
+
 def display_cdn_details(distribution, account_name, account_id):
     """Exibe os detalhes formatados de uma CDN encontrada."""
     dist_id = distribution.get("Id", "N/A")
@@ -163,12 +191,13 @@ def display_cdn_details(distribution, account_name, account_id):
     else:
         print("    - (nenhuma)")
 
-def display_r53_record_details(record, zone_name):
+def display_r53_record_details(record, zone_name, account_name=None):
     """Exibe os detalhes formatados de um registro DNS encontrado."""
     record_name, record_type = record.get("Name", "N/A"), record.get("Type", "N/A")
     record_values = [rr.get("Value", "N/A") for rr in record.get("ResourceRecords", [])]
 
-    print_color(Colors.GREEN, f"Registro encontrado na Zona {Colors.YELLOW}{zone_name}{Colors.NC}")
+    account = f" da conta {Colors.YELLOW}{account_name}{Colors.NC}" if account_name else ""
+    print_color(Colors.GREEN, f"Registro encontrado na Zona {Colors.YELLOW}{zone_name}{Colors.NC}{account}")
     print(f"  {Colors.BLUE}{'Nome do Registro':<20}:{Colors.NC} {record_name}")
     print(f"  {Colors.BLUE}{'Tipo':<20}:{Colors.NC} {record_type}")
     print(f"  {Colors.BLUE}{'Valores':<20}:{Colors.NC}")
@@ -177,19 +206,30 @@ def display_r53_record_details(record, zone_name):
             print(f"    - {value}")
     else:
         print("    - (nenhum)")
+    alias_target = record.get("AliasTarget", {}).get("DNSName")
+    if alias_target:
+        print(f"  {Colors.BLUE}{'Alias para':<20}:{Colors.NC} {alias_target}")
 
 ################################################################################
 # FUNÇÃO PRINCIPAL DE BUSCA DO CLOUDFRONT
 ################################################################################
-def run_cloudfront_search(access_token, sso_region, search_behavior):
-    """Executa o fluxo completo de busca por CDNs."""
-    cdn_options = ["Por ID da Distribuição", "Por DomainName do CloudFront", "Por Aliases (CNAMEs)"]
+def run_cloudfront_search(access_token, sso_region, search_behavior, mode="live"):
+    """
+    Executa o fluxo completo de busca por CDNs. Com mode="index" a busca é
+    respondida pelo inventário local em vez de varrer as contas.
+    """
+    cdn_options = [
+        "Por ID da Distribuição",
+        "Por DomainName do CloudFront",
+        "Por Aliases (CNAMEs)",
+        "Por consulta (ex.: origin:*.s3.amazonaws.com AND NOT enabled:false)",
+    ]
     choice = display_menu("Como você deseja buscar a CDN?", cdn_options)
     
     if choice is None:
         print_color(Colors.RED, "Opção inválida."); return
 
-    search_map = {1: "Id", 2: "DomainName", 3: "Aliases"}
+    search_map = {1: "Id", 2: "DomainName", 3: "Aliases", 4: "Query"}
     search_type = search_map[choice]
 
     print("")
@@ -197,152 +237,211 @@ def run_cloudfront_search(access_token, sso_region, search_behavior):
     if not search_value:
         print_color(Colors.RED, "O valor de busca não pode ser vazio."); return
 
+    if mode == "index":
+        run_cloudfront_index_search(access_token, sso_region, search_type, search_value)
+        return
+
     print_color(Colors.BLUE, "\n" + "="*80)
     print_color(Colors.BLUE, "Iniciando busca em todas as contas...")
     print_color(Colors.BLUE, "="*80)
 
-    overall_found_count = 0
+    state = {"found": 0, "done": 0, "shown": False}
+    metrics_mark = core.api_metrics.snapshot()
+
+    def on_account(status, account_results):
+        """Exibe o resultado de cada conta assim que a varredura dela termina."""
+        state["done"] += 1
+        account_id, account_name = status["account_id"], status["account_name"]
+        print(f"\r{' ' * 80}\r", end="")
+        if account_results and not (search_behavior == 'find_first' and state["shown"]):
+            for item in account_results:
+                display_cdn_details(item["distribution"], account_name, account_id)
+            state["shown"] = True
+        elif status["status"] == "cancelled":
+            pass
+        elif status["status"] == "timeout":
+            print(f"[{Colors.RED}TEMPO ESGOTADO{Colors.NC}] Na conta {Colors.YELLOW}{account_name}{Colors.NC} ({account_id})")
+        elif status["status"] == "denied":
+            print(f"[{Colors.RED}ACESSO NEGADO{Colors.NC}] Na conta {Colors.YELLOW}{account_name}{Colors.NC} ({account_id})")
+        elif status["status"] == "skipped-cached":
+            print(f"[{Colors.GRAY}IGNORADA{Colors.NC}] Na conta {Colors.YELLOW}{account_name}{Colors.NC} ({account_id}): acesso negado recentemente")
+        elif status["status"] == "error":
+            print(f"[{Colors.RED}ERRO{Colors.NC}] Na conta {Colors.YELLOW}{account_name}{Colors.NC} ({account_id}): {status.get('error')}")
+        elif not account_results:
+            print(f"[{Colors.GRAY}NÃO ENCONTRADO{Colors.NC}] Na conta {Colors.YELLOW}{account_name}{Colors.NC} ({account_id}){' ' * 20}")
+        state["found"] += len(account_results)
+        print(f"[{Colors.YELLOW}CONTAS{Colors.NC}] {state['done']} concluída(s)...", end="\r", flush=True)
+
     try:
-        # Cria um cliente SSO para listar contas e obter credenciais
-        sso_client = boto3.client('sso', region_name=sso_region)
-        paginator = sso_client.get_paginator('list_accounts')
-        
-        all_accounts = []
-        for page in paginator.paginate(accessToken=access_token):
-            all_accounts.extend(page['accountList'])
-        
-        sorted_accounts = sorted(all_accounts, key=lambda x: x['accountName'])
-
-        for account in sorted_accounts:
-            account_id, account_name = account['accountId'], account['accountName']
-            print(f"[{Colors.YELLOW}CONTA{Colors.NC}] Buscando em {Colors.YELLOW}{account_name}{Colors.NC} ({account_id})...", end="\r")
-            sys.stdout.flush()
-
-            found_in_account = False
-            roles = sso_client.list_account_roles(accessToken=access_token, accountId=account_id).get('roleList', [])
-            
-            for role in roles:
-                role_name = role['roleName']
-                try:
-                    creds_response = sso_client.get_role_credentials(roleName=role_name, accountId=account_id, accessToken=access_token)
-                    creds = creds_response.get('roleCredentials', {})
-                    if not creds: continue
-
-                    cloudfront_client = boto3.client('cloudfront', aws_access_key_id=creds['accessKeyId'], aws_secret_access_key=creds['secretAccessKey'], aws_session_token=creds['sessionToken'])
-                    paginator_dist = cloudfront_client.get_paginator('list_distributions')
-
-                    for page_dist in paginator_dist.paginate():
-                        distributions = page_dist.get('DistributionList', {})
-                        if 'Items' not in distributions: continue
-                        
-                        for dist in distributions.get('Items', []):
-                            match = False
-                            if search_type == "Id" and dist.get('Id') == search_value: match = True
-                            elif search_type == "DomainName" and dist.get('DomainName') == search_value: match = True
-                            elif search_type == "Aliases" and search_value in dist.get('Aliases', {}).get('Items', []): match = True
-
-                            if match:
-                                display_cdn_details(dist, account_name, account_id)
-                                found_in_account = True
-                                overall_found_count += 1
-                                if search_behavior == 'find_first': return 
-                                else: break
-                except Exception:
-                    continue
-            
-            if found_in_account and search_behavior == 'find_all': continue
-            if not found_in_account:
-                print(f"[{Colors.GRAY}NÃO ENCONTRADO{Colors.NC}] Na conta {Colors.YELLOW}{account_name}{Colors.NC} ({account_id}){' ' * 20}")
+        # As contas são varridas em paralelo (AWS_MANAGER_MAX_WORKERS) e
+        # exibidas conforme terminam.
+        # Com find_first a busca é interrompida no primeiro resultado e as
+        # contas restantes são canceladas.
+        limit = 1 if search_behavior == 'find_first' else 0
+        with profiled_search(f"cloudfront {search_type}={search_value}"):
+            core.cloudfront_search(access_token, sso_region, search_type, search_value, on_account=on_account, limit=limit)
+    except Exception as e:
+        print_color(Colors.RED, f"Ocorreu um erro durante a busca: {e}")
     finally:
-        if overall_found_count == 0:
+        print(f"\r{' ' * 80}\r", end="")
+        if state["found"] == 0:
             print_color(Colors.YELLOW, "\nBusca finalizada. Nenhum recurso encontrado com os critérios informados.")
         else:
             print_color(Colors.GREEN, "\nBusca finalizada.")
+        print_client_stats(metrics_mark)
+
+def format_age(seconds):
+    """Formata uma idade em segundos como minutos ou horas."""
+    minutes = int(seconds // 60)
+    if minutes < 60:
+        return f"{minutes} minuto(s)"
+    return f"{minutes // 60} hora(s) e {minutes % 60} minuto(s)"
+
+def run_cloudfront_index_search(access_token, sso_region, search_type, search_value):
+    """Responde a busca de CDNs pelo inventário local do CloudFront."""
+    from main.query import QueryError
+    try:
+        results = core.cloudfront_search(access_token, sso_region, search_type, search_value, mode="index")
+    except QueryError as e:
+        print_color(Colors.RED, f"Consulta inválida: {e}"); return
+    snapshot = results.meta.get("snapshot")
+    if not snapshot:
+        print_color(Colors.RED, "\nO inventário local ainda não foi gerado. Use a opção 'Atualizar inventário local'.")
+        return
+
+    print_color(Colors.GRAY, f"\nInventário de {snapshot['accounts']} conta(s), atualizado há {format_age(snapshot['age'])}.")
+    for item in results:
+        display_cdn_details(item["distribution"], item["account_name"], item["account_id"])
+    if not results:
+        print_color(Colors.YELLOW, "\nBusca finalizada. Nenhum recurso encontrado com os critérios informados.")
+    else:
+        print_color(Colors.GREEN, "\nBusca finalizada.")
+
+def run_inventory_refresh(access_token, sso_region):
+    """Recria o inventário local do CloudFront e o índice do Route 53."""
+    print_color(Colors.BLUE, "\n" + "="*80)
+    print_color(Colors.BLUE, "Atualizando o inventário do CloudFront em todas as contas...")
+    print_color(Colors.BLUE, "="*80)
+
+    def on_account(status, account_results):
+        if status["status"] == "ok":
+            print(f"[{Colors.GREEN}ATUALIZADO{Colors.NC}] {Colors.YELLOW}{status['account_name']}{Colors.NC} ({status['account_id']}): {len(account_results)} distribuição(ões)")
+        else:
+            print(f"[{Colors.RED}MANTIDO{Colors.NC}] {Colors.YELLOW}{status['account_name']}{Colors.NC} ({status['account_id']}): {status.get('error', status['status'])}")
+
+    try:
+        results = core.refresh_cloudfront_inventory(access_token, sso_region, on_account=on_account)
+        print_color(Colors.GREEN, f"\nInventário atualizado com {len(results)} distribuição(ões).")
+    except Exception as e:
+        print_color(Colors.RED, f"Ocorreu um erro ao atualizar o inventário: {e}")
+
+    selection = route53_selection()
+    print_color(Colors.BLUE, f"\nAtualizando o índice do Route 53 na(s) conta(s) {selection}...")
+
+    def on_zone(zone):
+        print(f"[{Colors.YELLOW}INDEXANDO{Colors.NC}] Zona: {zone['Name']}", flush=True)
+
+    def on_zones_account(status, account_zones):
+        if status["status"] == "ok":
+            print(f"[{Colors.GREEN}ATUALIZADO{Colors.NC}] {Colors.YELLOW}{status['account_name']}{Colors.NC} ({status['account_id']}): {len(account_zones)} zona(s)")
+        else:
+            print(f"[{Colors.RED}MANTIDO{Colors.NC}] {Colors.YELLOW}{status['account_name']}{Colors.NC} ({status['account_id']}): {status.get('error', status['status'])}")
+
+    try:
+        zones = core.refresh_route53_inventory(access_token, sso_region, on_zone=on_zone, on_account=on_zones_account)
+        if zones.meta.get("error"):
+            print_color(Colors.RED, f"ERRO: Conta(s) {selection} não encontrada(s) ou inacessível(is).")
+        else:
+            sync = zones.meta["sync"]
+            print_color(Colors.GREEN, f"\nÍndice atualizado com {sum(z['records'] for z in zones)} registro(s) em {len(zones)} zona(s).")
+            print_color(Colors.GRAY, (
+                f"Zonas atualizadas: {sync['zones_refreshed']}, sem alteração: {sync['zones_skipped']}, "
+                f"removidas: {sync['zones_removed']}. Chamadas à API: {sync['api_calls']} feitas, "
+                f"{sync['api_calls_saved']} evitadas."
+            ))
+    except Exception as e:
+        print_color(Colors.RED, f"Ocorreu um erro ao atualizar o índice do Route 53: {e}")
 
 ################################################################################
 # FUNÇÃO PRINCIPAL DE BUSCA DO ROUTE 53
 ################################################################################
-def run_route53_search(access_token, sso_region):
+def run_route53_search(access_token, sso_region, mode="live"):
     """
     Executa o fluxo de busca por registros DNS, consolidando os resultados
-    para exibição no final.
+    para exibição no final. Com mode="index" a busca usa o índice local.
     """
-    r53_options = ["Pelo Nome do Registro", "Pelo Valor do Registro"]
+    from main.query import QueryError
+    r53_options = [
+        "Pelo Nome do Registro",
+        "Pelo Valor do Registro",
+        "Por consulta (ex.: type:CNAME ttl<=60 name:*.internal.*)",
+    ]
     choice = display_menu("Como você deseja buscar o registro DNS?", r53_options)
     if choice is None:
         print_color(Colors.RED, "Opção inválida."); return
 
-    search_type = "Name" if choice == 1 else "Value"
+    search_type = {1: "Name", 2: "Value", 3: "Query"}[choice]
     print("")
     search_value = input(f"Digite o valor para buscar por '{search_type}': ")
     if not search_value:
         print_color(Colors.RED, "O valor de busca não pode ser vazio."); return
     
+    if mode == "index":
+        try:
+            found_records = core.route53_search(access_token, sso_region, search_type, search_value, mode="index")
+        except QueryError as e:
+            print_color(Colors.RED, f"Consulta inválida: {e}"); return
+        snapshot = found_records.meta.get("snapshot")
+        if not snapshot:
+            print_color(Colors.RED, "\nO inventário local ainda não foi gerado. Use a opção 'Atualizar inventário local'.")
+            return
+        print_color(Colors.GRAY, f"\nÍndice do Route 53 atualizado há {format_age(snapshot['age'])}.")
+        display_r53_results(found_records)
+        return
+
+    selection = route53_selection()
     print_color(Colors.BLUE, "\n" + "="*80)
-    print_color(Colors.BLUE, f"Iniciando busca na conta {ROUTE53_SEARCH_ACCOUNT_ID}...")
+    print_color(Colors.BLUE, f"Iniciando busca no Route 53 na(s) conta(s) {selection}...")
     print_color(Colors.BLUE, "="*80)
 
     # Lista para armazenar os resultados encontrados durante a busca
     found_records = []
-    
-    try:
-        sso_client = boto3.client('sso', region_name=sso_region)
-        
-        target_account_list = sso_client.list_accounts(accessToken=access_token).get('accountList', [])
-        target_account = next((acc for acc in target_account_list if acc['accountId'] == ROUTE53_SEARCH_ACCOUNT_ID), None)
-        if not target_account:
-            print_color(Colors.RED, f"ERRO: Conta {ROUTE53_SEARCH_ACCOUNT_ID} não encontrada ou inacessível."); return
-        account_name = target_account['accountName']
-
-        roles = sso_client.list_account_roles(accessToken=access_token, accountId=ROUTE53_SEARCH_ACCOUNT_ID).get('roleList', [])
-        if not roles:
-            print_color(Colors.RED, f"Nenhuma role encontrada para a conta {ROUTE53_SEARCH_ACCOUNT_ID}.")
-            return
-
-        role_name = roles[0]['roleName']
-        creds_response = sso_client.get_role_credentials(roleName=role_name, accountId=ROUTE53_SEARCH_ACCOUNT_ID, accessToken=access_token)
-        creds = creds_response.get('roleCredentials', {})
-        if not creds:
-            print_color(Colors.RED, f"Falha ao obter credenciais para a conta {ROUTE53_SEARCH_ACCOUNT_ID}.")
-            return
-
-        route53_client = boto3.client('route53', aws_access_key_id=creds['accessKeyId'], aws_secret_access_key=creds['secretAccessKey'], aws_session_token=creds['sessionToken'])
-        
-        hosted_zones = route53_client.list_hosted_zones().get('HostedZones', [])
-        for zone in hosted_zones:
-            zone_id, zone_name = zone['Id'], zone['Name']
-            
-            # **MUDANÇA 1**: Exibe "ANALISANDO" e mantém o cursor na mesma linha.
-            print(f"[{Colors.YELLOW}ANALISANDO{Colors.NC}] Zona: {zone_name}...", end="\r", flush=True)
-
-            paginator = route53_client.get_paginator('list_resource_record_sets')
-            for page in paginator.paginate(HostedZoneId=zone_id):
-                for record in page.get('ResourceRecordSets', []):
-                    match = False
-                    if search_type == "Name" and search_value.lower() in record.get('Name', '').lower():
-                        match = True
-                    elif search_type == "Value":
-                        for rr in record.get('ResourceRecords', []):
-                            if search_value.lower() in rr.get('Value', '').lower():
-                                match = True
-                                break
-                    
-                    if match:
-                        found_records.append({
-                            "record": record,
-                            "zone_name": zone_name,
-                            "account_name": account_name
-                        })
-            
-            # **MUDANÇA 2**: Sobrescreve a linha "ANALISANDO" com "ANALISADO" e pula para a próxima linha.
-            # Adicionamos espaços no final para garantir que a linha anterior seja completamente apagada.
-            print(f"[{Colors.GRAY}ANALISADO{Colors.NC}]  Zona: {zone_name}{' ' * 40}")
+    metrics_mark = core.api_metrics.snapshot()
 
+    def on_zone(zone):
+        """Exibe cada zona ao começar a analisá-la; várias zonas são lidas ao mesmo tempo."""
+        print(f"[{Colors.YELLOW}ANALISANDO{Colors.NC}] Zona: {zone['Name']}", flush=True)
 
+    try:
+        # Contas, roles e credenciais do SSO ficam em cache entre as buscas.
+        with profiled_search(f"route53 {search_type}={search_value}"):
+            found_records = core.route53_search(access_token, sso_region, search_type, search_value, on_zone=on_zone)
+        display_route53_accounts(found_records)
+        if found_records.meta.get("error"):
+            print_color(Colors.RED, f"ERRO: Conta(s) {selection} não encontrada(s) ou inacessível(is)."); return
     except Exception as e:
         print_color(Colors.RED, f"Ocorreu um erro durante a busca: {e}")
 
-    # --- Bloco de Exibição dos Resultados Consolidados ---
+    display_r53_results(found_records)
+    print_client_stats(metrics_mark)
+
+def route53_selection(accounts=None):
+    """As contas de uma busca no Route 53, como o núcleo as escolhe (sem carregá-lo)."""
+    return accounts or os.environ.get("AWS_MANAGER_ROUTE53_ACCOUNTS") or ROUTE53_SEARCH_ACCOUNT_ID
+
+def display_route53_accounts(found_records):
+    """Exibe o resultado de cada conta varrida em uma busca no Route 53."""
+    print("")
+    for status in found_records.meta.get("accounts", []):
+        account = f"{Colors.YELLOW}{status['account_name']}{Colors.NC} ({status['account_id']})"
+        if status["status"] == "ok":
+            found = sum(1 for item in found_records if item.get("account_id") == status["account_id"])
+            print(f"[{Colors.GREEN}OK{Colors.NC}] {account}: {found} registro(s)")
+        else:
+            print(f"[{Colors.RED}{status['status'].upper()}{Colors.NC}] {account}: {status.get('error', status['status'])}")
+
+def display_r53_results(found_records):
+    """Exibe os resultados consolidados de uma busca no Route 53."""
     if not found_records:
         print_color(Colors.YELLOW, "\nBusca finalizada. Nenhum registro encontrado com os critérios informados.")
     else:
@@ -352,12 +451,492 @@ def run_route53_search(access_token, sso_region):
             display_r53_record_details(
                 record=item['record'],
                 zone_name=item['zone_name'],
+                account_name=item.get('account_name'),
             )
 
+################################################################################
+# RASTREAMENTO DE HOSTNAME
+################################################################################
+def run_trace_hostname(access_token, sso_region):
+    """
+    Mostra de onde um hostname é servido: o registro DNS no Route 53, a CDN do
+    CloudFront para a qual ele aponta e as origens dela. A varredura do
+    CloudFront e a busca no Route 53 rodam ao mesmo tempo.
+    """
+    print("")
+    hostname = input("Digite o hostname que deseja rastrear: ").strip()
+    if not hostname:
+        print_color(Colors.RED, "O hostname não pode ser vazio."); return
+
+    print_color(Colors.BLUE, "\n" + "="*80)
+    print_color(Colors.BLUE, f"Rastreando {hostname} no Route 53 e em todas as contas do CloudFront...")
+    print_color(Colors.BLUE, "="*80)
+
+    def on_account(status, account_results):
+        if status["status"] not in ("ok", "cancelled"):
+            print(f"[{Colors.RED}{status['status'].upper()}{Colors.NC}] Na conta {Colors.YELLOW}{status['account_name']}{Colors.NC} ({status['account_id']})")
+
+    metrics_mark = core.api_metrics.snapshot()
+    try:
+        with profiled_search(f"trace {hostname}"):
+            hops = core.trace_hostname(access_token, sso_region, hostname, on_account=on_account)
+    except Exception as e:
+        print_color(Colors.RED, f"Ocorreu um erro durante o rastreamento: {e}"); return
+
+    if hops.meta.get("route53_error"):
+        print_color(Colors.RED, f"ERRO: Conta(s) {route53_selection()} não encontrada(s) ou inacessível(is).")
+    display_trace(hops)
+    print_client_stats(metrics_mark)
+
+def display_trace(hops):
+    """Exibe os registros DNS, as CDNs e as origens de um rastreamento."""
+    records = hops.meta["records"]
+    if not records:
+        print_color(Colors.YELLOW, "\nNenhum registro DNS com esse nome no Route 53.")
+    for item in records:
+        print("")
+        display_r53_record_details(record=item["record"], zone_name=item["zone_name"], account_name=item.get("account_name"))
+
+    for hop in hops:
+        print("")
+        if hop["distribution"] is None:
+            print(f"[{Colors.GRAY}SEM CDN{Colors.NC}] {hop['target']} não é uma distribuição do CloudFront.")
+            continue
+        via = f"via {hop['target']}" if hop["matched_by"] == "domain" else "pelo alias da distribuição"
+        print_color(Colors.GRAY, f"Servido pelo CloudFront {via}:")
+        display_cdn_details(hop["distribution"], hop["account_name"], hop["account_id"])
+
+    timings = hops.meta["timings"]
+    print_color(Colors.GREEN, (
+        f"\nRastreamento finalizado em {timings['total']}s "
+        f"(Route 53: {timings['route53']}s, CloudFront: {timings['cloudfront']}s em paralelo)."
+    ))
+
+################################################################################
+# BUSCA EM LOTE
+################################################################################
+def run_batch_search(access_token, sso_region, resource, search_type, path, mode="live"):
+    """
+    Busca todos os valores de um arquivo (texto ou CSV, primeira coluna) com
+    uma única varredura de cada conta ou zona, agrupando os resultados por valor.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            values = core.parse_batch_values(f.read())
+    except OSError as e:
+        print_color(Colors.RED, f"ERRO ao ler o arquivo de valores: {e}"); return
+    if not values:
+        print_color(Colors.RED, "O arquivo não contém nenhum valor para buscar."); return
+
+    print_color(Colors.BLUE, "\n" + "="*80)
+    print_color(Colors.BLUE, f"Buscando {len(values)} valor(es) por '{search_type}' no {resource}...")
+    print_color(Colors.BLUE, "="*80)
+
+    metrics_mark = core.api_metrics.snapshot()
+    try:
+        with profiled_search(f"{resource} batch {search_type} ({len(values)} valores)"):
+            if resource == "cloudfront":
+                groups = core.cloudfront_batch_search(access_token, sso_region, search_type, values, mode=mode)
+            else:
+                groups = core.route53_batch_search(access_token, sso_region, search_type, values, mode=mode)
+    except Exception as e:
+        print_color(Colors.RED, f"Ocorreu um erro durante a busca: {e}"); return
+    if groups.meta.get("error"):
+        print_color(Colors.RED, f"ERRO: Conta(s) {route53_selection()} não encontrada(s) ou inacessível(is)."); return
+    if mode == "index" and not groups.meta.get("snapshot"):
+        print_color(Colors.RED, "\nO inventário local ainda não foi gerado. Use a opção 'Atualizar inventário local'."); return
+
+    for group in groups:
+        print("")
+        if not group["results"]:
+            print(f"[{Colors.GRAY}NÃO ENCONTRADO{Colors.NC}] {group['value']}")
+            continue
+        print_color(Colors.YELLOW, f"{group['value']}: {len(group['results'])} resultado(s)")
+        for item in group["results"]:
+            if resource == "cloudfront":
+                display_cdn_details(item["distribution"], item.get("account_name", "N/A"), item.get("account_id", "N/A"))
+            else:
+                display_r53_record_details(record=item["record"], zone_name=item["zone_name"], account_name=item.get("account_name"))
+
+    not_found = groups.meta["not_found"]
+    print_color(Colors.GREEN, f"\nBusca finalizada. {len(values) - len(not_found)} de {len(values)} valor(es) encontrado(s).")
+    if mode == "live":
+        print_client_stats(metrics_mark)
+
+################################################################################
+# SUBCOMANDOS (USO EM SCRIPTS)
+################################################################################
+CLOUDFRONT_TYPES = {"id": "Id", "domain": "DomainName", "alias": "Aliases", "query": "Query"}
+ROUTE53_TYPES = {"name": "Name", "value": "Value", "query": "Query"}
+
+class ResultWriter:
+    """
+    Escreve os resultados de um subcomando no stdout à medida que chegam: em
+    texto, um objeto JSON por linha (ndjson) ou as colunas compactas da
+    interface web (csv), parando após `limit` resultados (0 = sem limite).
+    As linhas do CSV podem vir prontas (`rows` e `columns`, do daemon), sem
+    precisar importar o núcleo.
+    """
+
+    def __init__(self, resource, output_format, limit=0, columns=None):
+        self.resource = resource
+        self.format = output_format
+        self.limit = limit
+        self.columns = columns
+        self.written = 0
+        self._csv = None
+
+    def write(self, items, rows=None):
+        for i, item in enumerate(items):
+            if self.limit and self.written >= self.limit:
+                return
+            self.written += 1
+            if self.format == "ndjson":
+                print(json.dumps(item, default=str), flush=True)
+            elif self.format == "csv":
+                self._csv_writer().writerow(rows[i] if rows else self._compact_row(item))
+                sys.stdout.flush()
+            elif self.resource == "cloudfront":
+                display_cdn_details(item["distribution"], item.get("account_name", "N/A"), item.get("account_id", "N/A"))
+            elif self.resource == "route53":
+                print("")
+                display_r53_record_details(record=item["record"], zone_name=item["zone_name"])
+
+    def close(self):
+        """Garante o cabeçalho do CSV mesmo sem resultados."""
+        if self.format == "csv":
+            self._csv_writer()
+
+    def _compact_row(self, item):
+        # resultsets importa o núcleo, que a esta altura já foi carregado.
+        from main.resultsets import compact_row
+        return compact_row(self.resource, item)
+
+    def _csv_writer(self):
+        if self._csv is None:
+            if self.columns is None:
+                from main.resultsets import COLUMNS
+                self.columns = COLUMNS[self.resource]
+            self._csv = csv.DictWriter(sys.stdout, fieldnames=self.columns, lineterminator="\n")
+            self._csv.writeheader()
+        return self._csv
+
+def command_search(args):
+    """O tipo e o valor da busca de um subcomando."""
+    if args.command == "trace":
+        return None, args.hostname
+    types = CLOUDFRONT_TYPES if args.command == "cloudfront" else ROUTE53_TYPES
+    option = next(name for name in types if getattr(args, name) is not None)
+    return types[option], getattr(args, option)
+
+def command_fields(args):
+    return [field.strip() for field in (args.fields or "").split(",") if field.strip()] or None
+
+def report_account_status(status, account_results=None):
+    """Avisa no stderr (ou no stdout em modo texto) as contas que não puderam ser varridas."""
+    if status["status"] not in ("ok", "cancelled"):
+        detail = f": {status['error']}" if status.get("error") else ""
+        print_color(Colors.RED, f"[{status['status'].upper()}] Na conta {status['account_name']} ({status['account_id']}){detail}")
+
+def run_command(args, access_token, sso_region):
+    """
+    Executa um subcomando sem nenhuma pergunta e escreve os resultados no
+    formato pedido. Retorna o código de saída: 0 quando a busca terminou
+    (com ou sem resultados), 1 em erro.
+    """
+    from main.query import QueryError
+    fields = command_fields(args)
+    search_type, search_value = command_search(args)
+    metrics_mark = core.api_metrics.snapshot()
+    try:
+        if args.command == "cloudfront":
+            # As contas chegam em paralelo: o limite também vale para o que já foi escrito.
+            writer = ResultWriter("cloudfront", args.format, args.limit or 0)
+
+            def on_account(status, account_results):
+                report_account_status(status)
+                writer.write(account_results)
+
+            with profiled_search(f"cloudfront {search_type}={search_value}"):
+                results = core.cloudfront_search(
+                    access_token, sso_region, search_type, search_value,
+                    on_account=on_account if args.source == "live" else None,
+                    mode=args.source, limit=args.limit, fields=fields,
+                )
+            if args.source == "index":
+                writer.write(results)
+        elif args.command == "route53":
+            writer = ResultWriter("route53", args.format)
+
+            def on_account(status, account_results):
+                report_account_status(status)
+                writer.write(account_results)
+
+            with profiled_search(f"route53 {search_type}={search_value}"):
+                results = core.route53_search(
+                    access_token, sso_region, search_type, search_value,
+                    on_account=on_account if args.source == "live" else None,
+                    mode=args.source, fields=fields, accounts=args.accounts,
+                )
+            if args.source == "index":
+                writer.write(results)
+        else:
+            writer = ResultWriter("trace", args.format)
+            with profiled_search(f"trace {search_value}"):
+                results = core.trace_hostname(
+                    access_token, sso_region, search_value, on_account=report_account_status, mode=args.source, accounts=args.accounts,
+                )
+            if args.format != "text":
+                writer.write(results)
+    except QueryError as e:
+        print_color(Colors.RED, f"Consulta inválida: {e}"); return 1
+    except Exception as e:
+        print_color(Colors.RED, f"Ocorreu um erro durante a busca: {e}"); return 1
+
+    code = finish_command(args, results, writer)
+    if code == 0 and args.source == "live":
+        print_client_stats(metrics_mark)
+    return code
+
+def finish_command(args, results, writer):
+    """Conclui a saída de um subcomando, local ou pelo daemon, e devolve o código de saída."""
+    writer.close()
+    if args.command == "trace" and args.format == "text":
+        display_trace(results)
+    if results.meta.get("error") or results.meta.get("route53_error"):
+        accounts = route53_selection(getattr(args, "accounts", None))
+        print_color(Colors.RED, f"ERRO: Conta(s) {accounts} não encontrada(s) ou inacessível(is)."); return 1
+    if args.source == "index" and not (results.meta.get("snapshot") or results.meta.get("cloudfront_snapshot")):
+        print_color(Colors.RED, "O inventário local ainda não foi gerado. Rode o menu 'Atualizar inventário local'."); return 1
+    if args.format == "text" and args.command != "trace":
+        print_color(Colors.GREEN, f"\nBusca finalizada. {writer.written} resultado(s).")
+    return 0
+
+################################################################################
+# DAEMON
+################################################################################
+# Com o daemon rodando (aws-manager.py daemon start), os subcomandos são
+# atendidos por ele: sem importar o boto3, sem login e com clientes, credenciais
+# e resultados recentes já em memória.
+DAEMON_SOCKET = Path(os.environ.get("AWS_MANAGER_DAEMON_SOCKET", Path.home() / ".aws-manager" / "daemon.sock"))
+DAEMON_LOG = DAEMON_SOCKET.with_suffix(".log")
+
+class RemoteResults(list):
+    """Resultados recebidos do daemon, com o meta da busca como os do núcleo."""
+
+    def __init__(self, items=(), meta=None):
+        super().__init__(items)
+        self.meta = meta or {}
+
+def daemon_request(payload):
+    """
+    Envia um pedido ao daemon e devolve um iterador dos eventos da resposta,
+    ou None quando nenhum daemon atende no socket.
+    """
+    if not DAEMON_SOCKET.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(DAEMON_SOCKET))
+        sock.sendall(json.dumps(payload).encode() + b"\n")
+    except OSError:
+        sock.close()
+        return None
+
+    def events():
+        with sock, sock.makefile("rb") as lines:
+            for line in lines:
+                yield json.loads(line)
+
+    return events()
+
+def daemon_status():
+    """O estado do daemon (pid, pedidos atendidos, cache), ou None se ele não está rodando."""
+    events = daemon_request({"command": "status"})
+    if events is None:
+        return None
+    try:
+        return next(events)
+    except (OSError, ValueError, StopIteration):
+        return None
+
+def run_remote(args):
+    """Executa um subcomando pelo daemon. Devolve o código de saída, ou None se não há daemon."""
+    search_type, search_value = command_search(args)
+    events = daemon_request({
+        "command": args.command,
+        "search_type": search_type,
+        "search_value": search_value,
+        "source": args.source,
+        "fields": command_fields(args),
+        "limit": getattr(args, "limit", None),
+        "accounts": getattr(args, "accounts", None),
+        "rows": args.format == "csv",
+    })
+    if events is None:
+        return None
+
+    writer, hops, meta = None, [], None
+    try:
+        for event in events:
+            if event["event"] == "start":
+                writer = ResultWriter(args.command, args.format, columns=event["columns"])
+            elif event["event"] == "match":
+                if args.command == "trace" and args.format == "text":
+                    hops.append(event["item"])
+                else:
+                    writer.write([event["item"]], [event["row"]] if "row" in event else None)
+            elif event["event"] == "account_done":
+                report_account_status(event["status"])
+            elif event["event"] == "failed":
+                if event["kind"] == "query":
+                    print_color(Colors.RED, f"Consulta inválida: {event['error']}")
+                elif event["kind"] == "login":
+                    print_color(Colors.RED, "O daemon não tem um token do SSO válido. Rode 'aws-manager.py daemon start' para fazer login.")
+                else:
+                    print_color(Colors.RED, f"Ocorreu um erro durante a busca: {event['error']}")
+                return 1
+            elif event["event"] == "end":
+                meta = event["meta"]
+    except (OSError, ValueError) as e:
+        print_color(Colors.RED, f"A conexão com o daemon foi interrompida: {e}"); return 1
+    if meta is None:
+        print_color(Colors.RED, f"O daemon encerrou a busca sem resposta. Veja {DAEMON_LOG}."); return 1
+
+    cache = meta.get("cache", {})
+    age = f", de {cache['age']:.0f}s atrás" if "age" in cache else ""
+    print_color(Colors.GRAY, f"Respondido pelo daemon (cache: {cache.get('status', '-')}{age}).")
+    return finish_command(args, RemoteResults(hops, meta), writer)
+
+def run_daemon_command(args):
+    """Inicia, para, consulta ou roda em primeiro plano o daemon de buscas."""
+    if args.action == "run":
+        from main.daemon import DaemonRunning, serve
+        print(f"Daemon atendendo em {DAEMON_SOCKET} (pid {os.getpid()}).", flush=True)
+        try:
+            serve(DAEMON_SOCKET, lambda: core.sso_cached_login(SSO_PROFILE))
+        except DaemonRunning:
+            print_color(Colors.RED, f"Outro daemon já atende em {DAEMON_SOCKET}. Use 'daemon stop' antes de iniciar outro."); return 1
+        return 0
+
+    status = daemon_status()
+    if args.action == "status":
+        if status is None:
+            print_color(Colors.YELLOW, "O daemon não está rodando."); return 1
+        cache = status["search_cache"]
+        print_color(Colors.GREEN, f"Daemon rodando em {DAEMON_SOCKET} (pid {status['pid']}, há {format_age(status['uptime'])}).")
+        print(f"  Pedidos atendidos: {status['requests']}")
+        print(f"  Cache de buscas: {cache['hit']} acerto(s), {cache['coalesced']} compartilhada(s), {cache['miss']} varredura(s), {cache['cached']} guardada(s)")
+        print(f"  Clientes AWS: {status['clients']['created']} criado(s), {status['clients']['reused']} reutilizado(s)")
+        return 0
+    if args.action == "stop":
+        if status is None:
+            print_color(Colors.YELLOW, "O daemon não está rodando."); return 0
+        for _ in daemon_request({"command": "stop"}) or []:
+            pass
+        print_color(Colors.GREEN, f"Daemon (pid {status['pid']}) encerrado.")
+        return 0
+
+    # O login é feito aqui, onde dá para abrir o navegador; o daemon só relê o
+    # token em cache (a cada minuto), então isto também renova o login dele.
+    access_token, sso_region = perform_sso_login(SSO_PROFILE)
+    if not all([access_token, sso_region]):
+        print_color(Colors.RED, "Falha no login do SSO. Verifique suas configurações."); return 1
+    if status is not None:
+        print_color(Colors.YELLOW, f"O daemon já está rodando (pid {status['pid']})."); return 0
+    import subprocess
+    DAEMON_LOG.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    with open(DAEMON_LOG, "ab") as log:
+        subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), "daemon", "run"],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True,
+        )
+    for _ in range(100):
+        time.sleep(0.1)
+        status = daemon_status()
+        if status is not None:
+            print_color(Colors.GREEN, f"Daemon iniciado (pid {status['pid']}), atendendo em {DAEMON_SOCKET}.")
+            return 0
+    print_color(Colors.RED, f"O daemon não respondeu. Veja {DAEMON_LOG}.")
+    return 1
+
+def parse_args(argv=None):
+    """Lê os argumentos da linha de comando."""
+    parser = argparse.ArgumentParser(
+        description="Busca recursos em AWS Accounts via SSO.",
+        epilog="Sem subcomando, abre o menu interativo.",
+    )
+    parser.add_argument("--batch", metavar="ARQUIVO", help="arquivo texto ou CSV com os valores a buscar (um por linha)")
+    parser.add_argument("--resource", choices=["cloudfront", "route53"], default="cloudfront", help="recurso da busca em lote")
+    parser.add_argument("--type", dest="search_type", choices=["Id", "DomainName", "Aliases", "Name", "Value"], help="tipo da busca em lote")
+    parser.add_argument("--source", choices=["live", "index"], default="live", help="varrer as contas ou usar o inventário local")
+    parser.add_argument("--profile", action="store_true", help="exibir a linha do tempo de cada busca (contas, roles e chamadas à API)")
+    parser.add_argument("--profile-json", metavar="ARQUIVO", help="gravar a linha do tempo da última busca como JSON do Chrome trace")
+
+    # Opções comuns aos subcomandos. --source não tem padrão aqui para não
+    # sobrescrever o --source dado antes do subcomando.
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--format", choices=["text", "ndjson", "csv"], default="text", help="formato da saída (padrão: text)")
+    common.add_argument("--source", choices=["live", "index"], default=argparse.SUPPRESS, help="varrer as contas ou usar o inventário local")
+    common.add_argument("--no-daemon", action="store_true", help="buscar neste processo mesmo com o daemon rodando")
+
+    commands = parser.add_subparsers(dest="command", metavar="COMANDO")
+    cloudfront = commands.add_parser("cloudfront", parents=[common], help="busca distribuições do CloudFront em todas as contas")
+    by = cloudfront.add_mutually_exclusive_group(required=True)
+    by.add_argument("--id", help="ID da distribuição")
+    by.add_argument("--domain", help="DomainName do CloudFront (ex.: d111111abcdef8.cloudfront.net)")
+    by.add_argument("--alias", help="alias (CNAME) da distribuição")
+    by.add_argument("--query", help="consulta (ex.: 'origin:*.s3.amazonaws.com AND NOT enabled:false')")
+    cloudfront.add_argument("--limit", type=int, help="parar após N distribuições (0 = todas; padrão: 1 para --id e --domain, senão todas)")
+    cloudfront.add_argument("--fields", help="campos das distribuições a manter, separados por vírgula")
+
+    route53 = commands.add_parser("route53", parents=[common], help="busca registros DNS nas contas do Route 53")
+    by = route53.add_mutually_exclusive_group(required=True)
+    by.add_argument("--name", help="trecho do nome do registro")
+    by.add_argument("--value", help="trecho do valor do registro")
+    by.add_argument("--query", help="consulta (ex.: 'type:CNAME ttl<=60 name:*.internal.*')")
+    route53.add_argument("--fields", help="campos dos registros a manter, separados por vírgula")
+    route53.add_argument(
+        "--accounts",
+        help=(
+            "contas a buscar: 'all' ou IDs separados por vírgula (padrão: AWS_MANAGER_ROUTE53_ACCOUNTS, "
+            f"ou a conta {ROUTE53_SEARCH_ACCOUNT_ID})"
+        ),
+    )
+
+    trace = commands.add_parser("trace", parents=[common], help="rastreia um hostname (DNS → CloudFront → origem)")
+    trace.add_argument("hostname")
+    trace.add_argument("--accounts", help="contas do Route 53 a buscar, como em route53 --accounts")
+    trace.set_defaults(fields=None)
+
+    daemon = commands.add_parser("daemon", help="mantém SSO, clientes e resultados em memória para os subcomandos")
+    daemon.add_argument("action", choices=["start", "stop", "status", "run"], help="run fica em primeiro plano")
+
+    args = parser.parse_args(argv)
+    if args.command and args.batch:
+        parser.error("--batch não pode ser usado com um subcomando")
+    if args.batch:
+        valid = ["Id", "DomainName", "Aliases"] if args.resource == "cloudfront" else ["Name", "Value"]
+        args.search_type = args.search_type or valid[0]
+        if args.search_type not in valid:
+            parser.error(f"--type para {args.resource} deve ser um de: {', '.join(valid)}")
+    return args
+
 # ==============================================================================
 # INÍCIO DA EXECUÇÃO DO SCRIPT
 # ==============================================================================
 if __name__ == "__main__":
+    args = parse_args()
+    PROFILING.update({"print": args.profile, "json": args.profile_json})
+    OUTPUT["format"] = getattr(args, "format", "text")
+
+    if args.command == "daemon":
+        sys.exit(run_daemon_command(args))
+    # --profile mede a busca neste processo, então não usa o daemon.
+    if args.command and not (args.no_daemon or args.profile or args.profile_json):
+        code = run_remote(args)
+        if code is not None:
+            sys.exit(code)
 
     # --- Login ---
     print_color(Colors.BLUE, "Iniciando login no AWS IAM Identity Center...")
@@ -367,17 +946,40 @@ if __name__ == "__main__":
         sys.exit(1)
     print_color(Colors.GREEN, "\nLogin realizado com sucesso.")
 
+    if args.command:
+        sys.exit(run_command(args, access_token, sso_region))
+
+    if args.batch:
+        run_batch_search(access_token, sso_region, args.resource, args.search_type, args.batch, mode=args.source)
+        sys.exit(0)
+
     # --- Menu Principal ---
     while True:
-        main_options = ["Buscar por CDNs do CloudFront","Buscar por Registros DNS no Route 53", "Sair"]
+        main_options = [
+            "Buscar por CDNs do CloudFront",
+            "Buscar por CDNs no inventário local",
+            "Buscar por Registros DNS no Route 53",
+            "Buscar por Registros DNS no inventário local",
+            "Rastrear hostname (DNS → CloudFront → origem)",
+            "Atualizar inventário local",
+            "Sair",
+        ]
         choice = display_menu("Selecione o tipo de recurso que deseja buscar:", main_options)
 
         if choice == 1:
             run_cloudfront_search(access_token, sso_region, search_behavior="find_first")
         elif choice == 2:
+            run_cloudfront_search(access_token, sso_region, search_behavior="find_all", mode="index")
+        elif choice == 3:
             # CHAMA A NOVA FUNÇÃO, PASSANDO O COMPORTAMENTO "find_all"
             run_route53_search(access_token, sso_region)
-        elif choice == 3:
+        elif choice == 4:
+            run_route53_search(access_token, sso_region, mode="index")
+        elif choice == 5:
+            run_trace_hostname(access_token, sso_region)
+        elif choice == 6:
+            run_inventory_refresh(access_token, sso_region)
+        elif choice == 7:
             print_color(Colors.RED, "Saindo.")
             break
         else:
@@ -0,0 +1,226 @@
+"""Offline benchmarks of the searches against a simulated multi-account AWS.
+
+Runs ``cloudfront_search``, ``route53_search``, their streaming ``*_events``
+counterparts and the ``*_search_creds`` variants at several scales, and
+reports wall-clock time, time to the first result, AWS calls per operation,
+throttled calls and peak memory. No network access or AWS account is
+needed, so it can run in CI::
+
+    python benchmarks/run.py
+    python benchmarks/run.py --scale large --latency 0.05 --throttle-rate 5
+    python benchmarks/run.py --json current.json --baseline previous.json --max-regression 20
+
+Each run starts cold (empty SSO caches, client pool and rate limiters)
+unless ``--warm`` is given. Peak memory comes from one extra run under
+``tracemalloc``, so its overhead does not skew the timings.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "webapp"))
+
+from main import aws_manager_core as core  # noqa: E402
+from simulated_aws import SimulatedAWS  # noqa: E402
+
+# accounts, roles per account, distributions per account, zones, records per zone
+SCALES = {
+    "small": {"accounts": 10, "roles": 2, "distributions": 20, "zones": 5, "records": 200},
+    "medium": {"accounts": 50, "roles": 3, "distributions": 100, "zones": 10, "records": 500},
+    "large": {"accounts": 200, "roles": 3, "distributions": 500, "zones": 40, "records": 2000},
+}
+REGION = "us-east-1"
+
+
+def _searches(sim: SimulatedAWS, workers: int) -> Dict[str, Callable[[Callable[[], None]], int]]:
+    """The benchmarked searches. Each takes a callback for its first result and returns the result count."""
+    token = sim.access_token
+    middle = sim.distribution(len(sim.accounts) // 2, sim.distribution_count // 2)
+    last = sim.distribution(len(sim.accounts) - 1, sim.distribution_count - 1)
+    access_key, secret_key = sim.static_credentials(sim.route53_account_id)
+
+    def cloudfront(search_type: str, value: str):
+        def run(first_result):
+            def on_account(status, items):
+                if items:
+                    first_result()
+
+            return len(core.cloudfront_search(token, REGION, search_type, value, max_workers=workers, on_account=on_account))
+        return run
+
+    def stream(events):
+        async def consume(first_result):
+            found = 0
+            async for event in events():
+                if event["event"] == "match":
+                    found += 1
+                    first_result()
+            return found
+        return lambda first_result: asyncio.run(consume(first_result))
+
+    def returned(search):
+        # Searches without progress callbacks only return their results at the end.
+        def run(first_result):
+            results = search()
+            if results:
+                first_result()
+            return len(results)
+        return run
+
+    return {
+        "cloudfront_search Aliases": cloudfront("Aliases", middle["Aliases"][0]),
+        "cloudfront_search Id": cloudfront("Id", last["Id"]),
+        "cloudfront_search_events Aliases": stream(
+            lambda: core.cloudfront_search_events(token, REGION, "Aliases", middle["Aliases"][0], max_workers=workers)
+        ),
+        "cloudfront_search_creds Aliases": returned(
+            lambda: core.cloudfront_search_creds(access_key, secret_key, None, "Aliases", sim.distribution(0, 0)["Aliases"][0])
+        ),
+        "route53_search Value": returned(lambda: core.route53_search(token, REGION, "Value", "cloudfront.net")),
+        "route53_search_events Value": stream(lambda: core.route53_search_events(token, REGION, "Value", "cloudfront.net")),
+        "route53_search_creds Value": returned(
+            lambda: core.route53_search_creds(access_key, secret_key, None, "Value", "cloudfront.net")
+        ),
+    }
+
+
+def _reset(sim: SimulatedAWS, cold: bool) -> None:
+    """Points the core at ``sim``; ``cold`` also forgets every cache and client.
+
+    Waits first for the workers an early-stopped search left behind, so that
+    their calls are not counted against the next run.
+    """
+    sim.wait_idle()
+    if cold:
+        core.clear_sso_cache()
+        core._ROLE_AFFINITY.clear()
+        core._DENIED_CACHE.clear()
+        core.client_pool = core.ClientPool(session=sim.session(REGION))
+        core.rate_limiters = core.RateLimiters(core.rate_limiters.limits)
+    sim.reset_counters()
+
+
+def _run_once(search, memory: bool = False) -> Dict:
+    first: List[float] = []
+    if memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    count = search(lambda: first or first.append(time.perf_counter()))
+    wall = time.perf_counter() - started
+    peak = 0
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {"results": count, "wall": wall, "first_result": (first[0] - started) if first else None, "peak": peak}
+
+
+def benchmark(scale: str, options: argparse.Namespace) -> List[Dict]:
+    sim = SimulatedAWS(
+        **SCALES[scale],
+        latency=options.latency,
+        throttle_rate=options.throttle_rate,
+        route53_account_id=core.ROUTE53_SEARCH_ACCOUNT_ID,
+        denied_roles=options.denied_roles,
+    )
+    reports = []
+    for name, search in _searches(sim, options.workers).items():
+        if options.only and options.only not in name:
+            continue
+        _reset(sim, cold=True)
+        runs = []
+        for _ in range(options.repeat):
+            _reset(sim, cold=not options.warm)
+            runs.append(_run_once(search))
+        # Calls still finishing after an early stop belong to this search.
+        sim.wait_idle()
+        calls, throttled = dict(sim.calls), dict(sim.throttled)
+        peak = None
+        if options.memory:
+            _reset(sim, cold=not options.warm)
+            peak = _run_once(search, memory=True)["peak"]
+        firsts = [run["first_result"] for run in runs if run["first_result"] is not None]
+        reports.append({
+            "scale": scale,
+            "search": name,
+            "results": runs[-1]["results"],
+            "wall": round(statistics.median(run["wall"] for run in runs), 4),
+            "wall_min": round(min(run["wall"] for run in runs), 4),
+            "first_result": round(statistics.median(firsts), 4) if firsts else None,
+            "calls": calls,
+            "throttled": throttled,
+            "peak_mib": round(peak / 2**20, 2) if peak is not None else None,
+        })
+        _print(reports[-1])
+    return reports
+
+
+def _print(report: Dict) -> None:
+    first = f"{report['first_result']:.3f}s" if report["first_result"] is not None else "-"
+    calls = ", ".join(f"{op}={n}" for op, n in sorted(report["calls"].items()))
+    throttled = sum(report["throttled"].values())
+    peak = f"{report['peak_mib']:.2f}" if report["peak_mib"] is not None else "-"
+    print(
+        f"{report['scale']:<7} {report['search']:<34} {report['results']:>6} "
+        f"{report['wall']:>8.3f}s {first:>9} {peak:>8} {throttled:>6}  {calls}",
+        flush=True,
+    )
+
+
+def _compare(reports: List[Dict], baseline_path: str, max_regression: float | None) -> bool:
+    """Prints wall-clock changes against a previous ``--json`` file; False if one regressed too much."""
+    baseline = {(r["scale"], r["search"]): r for r in json.loads(Path(baseline_path).read_text())["reports"]}
+    ok = True
+    print(f"\nCompared with {baseline_path}:")
+    for report in reports:
+        before = baseline.get((report["scale"], report["search"]))
+        if not before or not before["wall"]:
+            continue
+        change = (report["wall"] - before["wall"]) / before["wall"] * 100
+        flag = ""
+        if max_regression is not None and change > max_regression:
+            flag, ok = "  REGRESSION", False
+        print(f"{report['scale']:<7} {report['search']:<34} {before['wall']:>8.3f}s -> {report['wall']:>8.3f}s {change:+7.1f}%{flag}")
+    return ok
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the searches against a simulated AWS.")
+    parser.add_argument("--scale", action="append", choices=sorted(SCALES), help="scale to run, repeatable (default: small and medium)")
+    parser.add_argument("--only", help="run only the searches whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per search (default: 3)")
+    parser.add_argument("--warm", action="store_true", help="keep SSO caches and clients between runs")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every AWS call (default: 0.02)")
+    parser.add_argument("--throttle-rate", type=float, help="calls per second each account allows per operation")
+    parser.add_argument("--denied-roles", type=int, default=0, help="roles of each account denied CloudFront and Route53")
+    parser.add_argument("--workers", type=int, default=core.SEARCH_MAX_WORKERS, help="concurrent account scans")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the peak memory run")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare with the results of an earlier --json run")
+    parser.add_argument("--max-regression", type=float, help="exit with status 1 if a search got slower than this, in percent")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    options = parse_args(argv)
+    print(f"{'scale':<7} {'search':<34} {'found':>6} {'wall':>9} {'first':>9} {'peak MiB':>8} {'thrott':>6}  calls")
+    reports = []
+    for scale in options.scale or ["small", "medium"]:
+        reports.extend(benchmark(scale, options))
+
+    if options.json:
+        settings = {key: getattr(options, key) for key in ("repeat", "warm", "latency", "throttle_rate", "denied_roles", "workers")}
+        Path(options.json).write_text(json.dumps({"settings": settings, "scales": SCALES, "reports": reports}, indent=2))
+    if options.baseline and not _compare(reports, options.baseline, options.max_regression):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
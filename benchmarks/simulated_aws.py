@@ -0,0 +1,432 @@
+"""A simulated multi-account AWS answering boto3 clients without any network.
+
+``SimulatedAWS`` holds an SSO instance with ``accounts`` accounts of
+``roles`` roles each, ``distributions`` CloudFront distributions per
+account and, in the Route53 account, ``zones`` hosted zones of ``records``
+records. Its ``session()`` is a boto3 session whose clients get their HTTP
+responses from the simulation, through a ``before-send`` handler registered
+after every other one: request signing, paginators, response parsing,
+retries and the rate limiters of ``aws_manager_core`` all run as they would
+against AWS.
+
+Every call sleeps ``latency`` seconds. With ``throttle_rate`` set, each
+account allows that many calls per second and operation (SSO calls share one
+allowance) and answers the rest with a throttling error, as AWS does.
+"""
+import json
+import threading
+import time
+from typing import Dict, List
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import escape
+
+import boto3
+from botocore.awsrequest import AWSResponse
+
+CLOUDFRONT_NS = "http://cloudfront.amazonaws.com/doc/2020-05-31/"
+ROUTE53_NS = "https://route53.amazonaws.com/doc/2013-04-01/"
+CLOUDFRONT_ZONE_ID = "Z2FDTNDATAQYW2"
+
+
+class _Raw:
+    """Stands in for the urllib3 response botocore reads the body from."""
+
+    def __init__(self, body: bytes):
+        self.body = body
+
+    def stream(self, *args, **kwargs):
+        yield self.body
+
+
+class _Allowance:
+    """Calls per second allowed by one account for one operation."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+def _xml(tag: str, value) -> str:
+    if isinstance(value, bool):
+        value = "true" if value else "false"
+    return f"<{tag}>{escape(str(value))}</{tag}>"
+
+
+def _reversed_name(name: str) -> tuple:
+    """Route53 lists records ordered by their labels read right to left."""
+    return tuple(reversed(name.rstrip(".").split(".")))
+
+
+class SimulatedAWS:
+    def __init__(
+        self,
+        accounts: int = 10,
+        roles: int = 2,
+        distributions: int = 50,
+        zones: int = 5,
+        records: int = 100,
+        latency: float = 0.02,
+        throttle_rate: float | None = None,
+        route53_account_id: str = "979633380910",
+        denied_roles: int = 0,
+        denied_operations: Dict[str, set] | None = None,
+    ):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.route53_account_id = route53_account_id
+        self.access_token = "simulated-token"
+
+        ids = [route53_account_id] + [str(100000000000 + i) for i in range(1, accounts)]
+        self.accounts = [
+            {"accountId": account_id, "accountName": f"account-{i:04d}", "emailAddress": f"aws+{i}@example.com"}
+            for i, account_id in enumerate(ids[:accounts])
+        ]
+        # The first ``denied_roles`` roles of each account may not read CloudFront or Route53.
+        self.roles = [f"Role{r}" for r in range(roles)]
+        self.denied_roles = set(self.roles[:denied_roles])
+        # Operations a role may not call although it reads the rest, e.g. {"Role0": {"GetDistribution"}}.
+        self.denied_operations = denied_operations or {}
+        self.distribution_count = distributions
+        self.zones = [
+            {"Id": f"/hostedzone/Z{z:012d}", "Name": f"zone{z:03d}.example.com.", "records": records}
+            for z in range(zones)
+        ]
+        self._records: Dict[str, List[Dict]] = {}
+
+        self.calls: Dict[str, int] = {}
+        self.throttled: Dict[str, int] = {}
+        self._keys: Dict[str, tuple[str, str | None]] = {}
+        self._allowances: Dict[tuple, _Allowance] = {}
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._last_request = 0.0
+
+    # --- Data ----------------------------------------------------------------
+
+    def distribution(self, account_index: int, number: int) -> Dict:
+        name = f"{account_index:05d}{number:08d}"
+        owner = f"account-{account_index:04d}"
+        s3 = number % 3 == 0
+        origin = f"assets-{number}-{owner}.s3.amazonaws.com" if s3 else f"origin{number}.{owner}.internal.example.net"
+        return {
+            "Id": f"E{name}",
+            "ARN": f"arn:aws:cloudfront::{self.accounts[account_index]['accountId']}:distribution/E{name}",
+            "Status": "Deployed",
+            "LastModifiedTime": "2024-05-01T12:00:00Z",
+            "DomainName": f"d{name}.cloudfront.net",
+            "Aliases": [f"app{number}.{owner}.example.com", f"www{number}.{owner}.example.com"],
+            "Origin": origin,
+            "OriginId": f"origin-{number}",
+            "S3": s3,
+            "Comment": f"distribution {number} of {owner}",
+            "Enabled": number % 10 != 9,
+            "Certificate": f"arn:aws:acm:us-east-1:{self.accounts[account_index]['accountId']}:certificate/{number:08d}",
+        }
+
+    def record_sets(self, zone: Dict) -> List[Dict]:
+        """The records of ``zone``, in Route53 order, built once."""
+        records = self._records.get(zone["Id"])
+        if records is None:
+            apex = zone["Name"]
+            records = [
+                {"Name": apex, "Type": "NS", "TTL": 172800, "Values": [f"ns-{i}.awsdns-{i}.net." for i in range(4)]},
+                {"Name": apex, "Type": "SOA", "TTL": 900, "Values": [f"ns-0.awsdns-0.net. hostmaster.{apex} 1 7200 900 1209600 86400"]},
+            ]
+            for k in range(max(0, zone["records"] - 2)):
+                kind = k % 4
+                name = f"host{k}.{apex}"
+                if kind == 0:
+                    records.append({"Name": name, "Type": "A", "TTL": 300, "Values": [f"10.{k // 65536 % 256}.{k // 256 % 256}.{k % 256}"]})
+                elif kind == 1:
+                    records.append({"Name": name, "Type": "CNAME", "TTL": 60, "Values": [f"backend{k}.internal.example.net"]})
+                elif kind == 2:
+                    records.append({"Name": name, "Type": "A", "Alias": f"d{k:013d}.cloudfront.net."})
+                else:
+                    records.append({"Name": name, "Type": "TXT", "TTL": 300, "Values": [f'"v=spf1 include:example{k}.com ~all"']})
+            records.sort(key=lambda r: (_reversed_name(r["Name"]), r["Type"]))
+            self._records[zone["Id"]] = records
+        return records
+
+    # --- Sessions and credentials --------------------------------------------
+
+    def session(self, region_name: str = "us-east-1") -> boto3.session.Session:
+        """A boto3 session whose clients talk to this simulation."""
+        session = boto3.session.Session(
+            aws_access_key_id="SIMULATED", aws_secret_access_key="simulated", region_name=region_name
+        )
+        session.events.register_last("before-send", self._handle)
+        return session
+
+    def static_credentials(self, account_id: str) -> tuple[str, str]:
+        """An access key and secret key for ``account_id``, as for credentials logins."""
+        key = f"AKIA{account_id}"
+        self._keys[key] = (account_id, None)
+        return key, "simulated-secret"
+
+    def wait_idle(self, quiet: float = 0.2, timeout: float = 60) -> None:
+        """Waits until no request is in flight and none started for ``quiet`` seconds.
+
+        Searches that stop early return while some of their workers are still
+        finishing a call; their calls must not be counted in the next run.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                idle = self._in_flight == 0 and time.monotonic() - self._last_request >= quiet
+            if idle:
+                return
+            time.sleep(quiet / 4)
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.calls.clear()
+            self.throttled.clear()
+            self._allowances.clear()
+
+    # --- Requests ------------------------------------------------------------
+
+    def _handle(self, request, event_name: str, **kwargs):
+        with self._lock:
+            self._in_flight += 1
+            self._last_request = time.monotonic()
+        try:
+            return self._answer(request, event_name)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _answer(self, request, event_name: str):
+        service, operation = event_name.split(".")[-2:]
+        url = urlsplit(request.url)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if service == "sso":
+            principal = self.access_token if request.headers.get("x-amz-sso_bearer_token") else None
+            account_id, role = params.get("account_id"), None
+        else:
+            principal = self._access_key(request.headers.get("Authorization", ""))
+            account_id, role = self._keys.get(principal, (None, None))
+
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            throttled = False
+            if self.throttle_rate:
+                key = ("sso" if service == "sso" else account_id, operation)
+                allowance = self._allowances.setdefault(key, _Allowance(self.throttle_rate))
+                throttled = not allowance.take()
+                if throttled:
+                    self.throttled[operation] = self.throttled.get(operation, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        if service == "sso":
+            if throttled:
+                return self._json_error(429, "TooManyRequestsException")
+            if principal != self.access_token:
+                return self._json_error(401, "UnauthorizedException")
+            return self._sso(operation, params)
+        if throttled:
+            return self._xml_error(400, "Throttling", "Rate exceeded")
+        if account_id is None or role in self.denied_roles or operation in self.denied_operations.get(role, ()):
+            return self._xml_error(403, "AccessDenied", "User is not authorized to perform this operation")
+        if service == "cloudfront":
+            return self._cloudfront(operation, account_id, url.path, params)
+        return self._route53(operation, account_id, url.path, params)
+
+    @staticmethod
+    def _access_key(authorization: str | bytes) -> str | None:
+        if isinstance(authorization, bytes):
+            authorization = authorization.decode()
+        _, _, credential = authorization.partition("Credential=")
+        return credential.split("/", 1)[0] or None
+
+    def _response(self, url: str, status: int, body: bytes, headers: Dict) -> AWSResponse:
+        return AWSResponse(url, status, headers, _Raw(body))
+
+    def _json(self, body: Dict) -> AWSResponse:
+        return self._response("", 200, json.dumps(body).encode(), {"content-type": "application/json"})
+
+    def _json_error(self, status: int, code: str) -> AWSResponse:
+        body = json.dumps({"message": code}).encode()
+        return self._response("", status, body, {"content-type": "application/json", "x-amzn-ErrorType": code})
+
+    def _xml_doc(self, body: str) -> AWSResponse:
+        return self._response("", 200, f'<?xml version="1.0" encoding="UTF-8"?>\n{body}'.encode(), {"content-type": "text/xml"})
+
+    def _xml_error(self, status: int, code: str, message: str) -> AWSResponse:
+        body = (
+            f"<ErrorResponse><Error><Type>Sender</Type>{_xml('Code', code)}{_xml('Message', message)}</Error>"
+            "<RequestId>00000000-0000-0000-0000-000000000000</RequestId></ErrorResponse>"
+        )
+        return self._response("", status, body.encode(), {"content-type": "text/xml"})
+
+    @staticmethod
+    def _page(items: List, params: Dict, marker: str, size: str, default_size: int) -> tuple[List, str | None]:
+        start = int(params.get(marker) or 0)
+        count = int(params.get(size) or default_size)
+        end = start + count
+        return items[start:end], (str(end) if end < len(items) else None)
+
+    # --- SSO -----------------------------------------------------------------
+
+    def _sso(self, operation: str, params: Dict) -> AWSResponse:
+        if operation == "ListAccounts":
+            page, token = self._page(self.accounts, params, "next_token", "max_result", 20)
+            return self._json({"accountList": page, **({"nextToken": token} if token else {})})
+        if operation == "ListAccountRoles":
+            roles = [{"roleName": role, "accountId": params["account_id"]} for role in self.roles]
+            page, token = self._page(roles, params, "next_token", "max_result", 20)
+            return self._json({"roleList": page, **({"nextToken": token} if token else {})})
+        if operation == "GetRoleCredentials":
+            key = f"ASIA{params['account_id']}{params['role_name']}"
+            with self._lock:
+                self._keys[key] = (params["account_id"], params["role_name"])
+            return self._json({
+                "roleCredentials": {
+                    "accessKeyId": key,
+                    "secretAccessKey": "simulated-secret",
+                    "sessionToken": "simulated-session",
+                    "expiration": int((time.time() + 3600) * 1000),
+                }
+            })
+        return self._json_error(400, "InvalidRequestException")
+
+    # --- CloudFront ----------------------------------------------------------
+
+    def _cloudfront(self, operation: str, account_id: str, path: str, params: Dict) -> AWSResponse:
+        index = next(i for i, account in enumerate(self.accounts) if account["accountId"] == account_id)
+        if operation == "GetDistribution":
+            # Ids are "E" + account index (5 digits) + distribution number (8 digits).
+            distribution_id = path.rstrip("/").rsplit("/", 1)[-1]
+            number = int(distribution_id[6:]) if distribution_id[1:].isdigit() and len(distribution_id) == 14 else -1
+            if distribution_id[1:6] != f"{index:05d}" or not 0 <= number < self.distribution_count:
+                return self._xml_error(404, "NoSuchDistribution", "The specified distribution does not exist.")
+            dist = self.distribution(index, number)
+            return self._xml_doc(
+                f'<Distribution xmlns="{CLOUDFRONT_NS}">'
+                f"{_xml('Id', dist['Id'])}{_xml('ARN', dist['ARN'])}{_xml('Status', dist['Status'])}"
+                f"{_xml('LastModifiedTime', dist['LastModifiedTime'])}<InProgressInvalidationBatches>0</InProgressInvalidationBatches>"
+                f"{_xml('DomainName', dist['DomainName'])}"
+                f"<DistributionConfig>{_xml('CallerReference', dist['Id'])}{self._config_xml(dist)}</DistributionConfig>"
+                "</Distribution>"
+            )
+        if operation != "ListDistributions":
+            return self._xml_error(400, "InvalidArgument", f"{operation} is not simulated")
+        numbers, next_marker = self._page(list(range(self.distribution_count)), params, "Marker", "MaxItems", 100)
+        items = "".join(self._distribution_xml(self.distribution(index, number)) for number in numbers)
+        body = (
+            f'<DistributionList xmlns="{CLOUDFRONT_NS}">'
+            f"{_xml('Marker', params.get('Marker', ''))}"
+            f"{_xml('NextMarker', next_marker) if next_marker else ''}"
+            f"{_xml('MaxItems', params.get('MaxItems', 100))}"
+            f"{_xml('IsTruncated', bool(next_marker))}{_xml('Quantity', len(numbers))}"
+            f"{f'<Items>{items}</Items>' if numbers else ''}</DistributionList>"
+        )
+        return self._xml_doc(body)
+
+    @classmethod
+    def _distribution_xml(cls, dist: Dict) -> str:
+        return (
+            "<DistributionSummary>"
+            f"{_xml('Id', dist['Id'])}{_xml('ARN', dist['ARN'])}{_xml('Status', dist['Status'])}"
+            f"{_xml('LastModifiedTime', dist['LastModifiedTime'])}{_xml('DomainName', dist['DomainName'])}"
+            f"{cls._config_xml(dist)}</DistributionSummary>"
+        )
+
+    @staticmethod
+    def _config_xml(dist: Dict) -> str:
+        """The fields a distribution summary shares with its ``DistributionConfig``."""
+        aliases = "".join(_xml("CNAME", alias) for alias in dist["Aliases"])
+        if dist["S3"]:
+            origin_config = "<S3OriginConfig><OriginAccessIdentity></OriginAccessIdentity></S3OriginConfig>"
+        else:
+            origin_config = (
+                "<CustomOriginConfig><HTTPPort>80</HTTPPort><HTTPSPort>443</HTTPSPort>"
+                "<OriginProtocolPolicy>https-only</OriginProtocolPolicy></CustomOriginConfig>"
+            )
+        return (
+            f"<Aliases>{_xml('Quantity', len(dist['Aliases']))}<Items>{aliases}</Items></Aliases>"
+            "<Origins><Quantity>1</Quantity><Items><Origin>"
+            f"{_xml('Id', dist['OriginId'])}{_xml('DomainName', dist['Origin'])}<OriginPath></OriginPath>"
+            f"<CustomHeaders><Quantity>0</Quantity></CustomHeaders>{origin_config}"
+            "</Origin></Items></Origins>"
+            "<DefaultCacheBehavior>"
+            f"{_xml('TargetOriginId', dist['OriginId'])}<ViewerProtocolPolicy>redirect-to-https</ViewerProtocolPolicy>"
+            "</DefaultCacheBehavior>"
+            f"{_xml('Comment', dist['Comment'])}<PriceClass>PriceClass_100</PriceClass>{_xml('Enabled', dist['Enabled'])}"
+            "<ViewerCertificate>"
+            f"{_xml('ACMCertificateArn', dist['Certificate'])}<SSLSupportMethod>sni-only</SSLSupportMethod>"
+            "<MinimumProtocolVersion>TLSv1.2_2021</MinimumProtocolVersion>"
+            "</ViewerCertificate>"
+            "<WebACLId></WebACLId><HttpVersion>http2</HttpVersion><IsIPV6Enabled>true</IsIPV6Enabled>"
+            "<Staging>false</Staging>"
+        )
+
+    # --- Route53 -------------------------------------------------------------
+
+    def _route53(self, operation: str, account_id: str, path: str, params: Dict) -> AWSResponse:
+        zones = self.zones if account_id == self.route53_account_id else []
+        if operation == "ListHostedZones":
+            page, next_marker = self._page(zones, params, "marker", "maxitems", 100)
+            items = "".join(
+                "<HostedZone>"
+                f"{_xml('Id', zone['Id'])}{_xml('Name', zone['Name'])}{_xml('CallerReference', zone['Id'])}"
+                f"<Config><PrivateZone>false</PrivateZone></Config>{_xml('ResourceRecordSetCount', zone['records'])}"
+                "</HostedZone>"
+                for zone in page
+            )
+            body = (
+                f'<ListHostedZonesResponse xmlns="{ROUTE53_NS}"><HostedZones>{items}</HostedZones>'
+                f"{_xml('Marker', params.get('marker', ''))}{_xml('IsTruncated', bool(next_marker))}"
+                f"{_xml('NextMarker', next_marker) if next_marker else ''}{_xml('MaxItems', params.get('maxitems', 100))}"
+                "</ListHostedZonesResponse>"
+            )
+            return self._xml_doc(body)
+        if operation == "ListResourceRecordSets":
+            zone_id = path.split("/hostedzone/", 1)[-1].split("/", 1)[0]
+            zone = next((zone for zone in zones if zone["Id"].endswith(zone_id)), None)
+            if zone is None:
+                return self._xml_error(404, "NoSuchHostedZone", f"No hosted zone found with ID: {zone_id}")
+            return self._xml_doc(self._record_sets_xml(zone, params))
+        return self._xml_error(400, "InvalidInput", f"{operation} is not simulated")
+
+    def _record_sets_xml(self, zone: Dict, params: Dict) -> str:
+        records = self.record_sets(zone)
+        start = 0
+        if params.get("name"):
+            # Seek to the first record at or after (name, type), like Route53.
+            seek = (_reversed_name(params["name"].lower()), params.get("type", ""))
+            start = next((i for i, r in enumerate(records) if (_reversed_name(r["Name"]), r["Type"]) >= seek), len(records))
+        size = int(params.get("maxitems") or 300)
+        page = records[start:start + size]
+        following = records[start + size] if start + size < len(records) else None
+
+        items = []
+        for record in page:
+            if "Alias" in record:
+                data = (
+                    f"<AliasTarget>{_xml('HostedZoneId', CLOUDFRONT_ZONE_ID)}{_xml('DNSName', record['Alias'])}"
+                    "<EvaluateTargetHealth>false</EvaluateTargetHealth></AliasTarget>"
+                )
+            else:
+                values = "".join(f"<ResourceRecord>{_xml('Value', value)}</ResourceRecord>" for value in record["Values"])
+                data = f"{_xml('TTL', record['TTL'])}<ResourceRecords>{values}</ResourceRecords>"
+            items.append(f"<ResourceRecordSet>{_xml('Name', record['Name'])}{_xml('Type', record['Type'])}{data}</ResourceRecordSet>")
+        following_xml = (
+            f"{_xml('NextRecordName', following['Name'])}{_xml('NextRecordType', following['Type'])}" if following else ""
+        )
+        return (
+            f'<ListResourceRecordSetsResponse xmlns="{ROUTE53_NS}">'
+            f"<ResourceRecordSets>{''.join(items)}</ResourceRecordSets>"
+            f"{_xml('IsTruncated', following is not None)}{following_xml}{_xml('MaxItems', size)}"
+            "</ListResourceRecordSetsResponse>"
+        )
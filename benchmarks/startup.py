@@ -0,0 +1,81 @@
+"""Startup time of the CLI, checked against a budget.
+
+Automation calls ``aws-manager.py`` thousands of times, so the time before
+it does any work matters. This runs ``aws-manager.py --help`` (or other
+arguments that exit before logging in) several times and compares the
+median with a bare ``python -c pass``. It fails when the difference exceeds
+the budget, or when a module that should only load once a command needs AWS
+(boto3, botocore, the search core, the query language) was imported::
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --budget-ms 80 --runs 30
+    python benchmarks/startup.py --args "cloudfront --help"
+"""
+import argparse
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+CLI = Path(__file__).resolve().parent.parent / "aws-manager.py"
+BUDGET_MS = 100
+# Modules the CLI must not import before a command runs.
+LAZY_MODULES = ("boto3", "botocore", "main.aws_manager_core", "main.query", "asyncio")
+
+
+def _time(command: List[str], runs: int) -> List[float]:
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def _imports(args: List[str]) -> Dict[str, int]:
+    """Modules imported by one run with their cumulative import time in microseconds (``-X importtime``)."""
+    run = subprocess.run([sys.executable, "-X", "importtime", str(CLI), *args], capture_output=True, text=True, check=False)
+    imports = {}
+    for line in run.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imports[name.strip()] = int(cumulative)
+    return imports
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measure the CLI startup time against a budget.")
+    parser.add_argument("--runs", type=int, default=15, help="timed runs (default: 15)")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS, help=f"allowed time over a bare interpreter (default: {BUDGET_MS})")
+    parser.add_argument("--args", default="--help", help="CLI arguments, which must exit before logging in (default: --help)")
+    options = parser.parse_args(argv)
+    args = shlex.split(options.args)
+
+    bare = statistics.median(_time([sys.executable, "-c", "pass"], options.runs))
+    cli = statistics.median(_time([sys.executable, str(CLI), *args], options.runs))
+    overhead_ms = (cli - bare) * 1000
+    print(f"python -c pass        {bare * 1000:8.1f} ms")
+    print(f"aws-manager.py {options.args:<6} {cli * 1000:8.1f} ms  (+{overhead_ms:.1f} ms, budget {options.budget_ms:.0f} ms)")
+
+    imports = _imports(args)
+    print("slowest imports:")
+    for name, micros in sorted(imports.items(), key=lambda x: -x[1])[:8]:
+        print(f"  {name:<30} {micros / 1000:8.1f} ms")
+
+    ok = True
+    eager = sorted({lazy for name in imports for lazy in LAZY_MODULES if name == lazy or name.startswith(lazy + ".")})
+    if eager:
+        print(f"FAIL: imported at startup: {', '.join(eager)}")
+        ok = False
+    if overhead_ms > options.budget_ms:
+        print(f"FAIL: startup over budget by {overhead_ms - options.budget_ms:.1f} ms")
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
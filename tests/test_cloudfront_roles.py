@@ -0,0 +1,46 @@
+"""CloudFront searches with roles allowed only some CloudFront operations."""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "benchmarks"))
+sys.path.insert(0, str(ROOT / "webapp"))
+
+import run  # noqa: E402
+from run import REGION, core  # noqa: E402
+from simulated_aws import SimulatedAWS  # noqa: E402
+
+
+def _statuses(results):
+    return {status["status"] for status in results.meta["accounts"]}
+
+
+def test_denied_get_distribution_does_not_hide_listed_distributions():
+    sim = SimulatedAWS(accounts=3, roles=1, distributions=4, latency=0, denied_operations={"Role0": {"GetDistribution"}})
+    run._reset(sim, cold=True)
+    dist = sim.distribution(2, 1)
+
+    by_id = core.cloudfront_search(sim.access_token, REGION, "Id", dist["Id"], limit=0)
+    assert [item["distribution"]["Id"] for item in by_id] == [dist["Id"]]
+    assert _statuses(by_id) == {"ok"}
+    assert sim.calls["GetDistribution"] == 3
+
+    # The GetDistribution denial must not skip the role for listing searches.
+    sim.reset_counters()
+    by_alias = core.cloudfront_search(sim.access_token, REGION, "Aliases", dist["Aliases"][0])
+    assert [item["distribution"]["Id"] for item in by_alias] == [dist["Id"]]
+    assert _statuses(by_alias) == {"ok"}
+    assert "GetDistribution" not in sim.calls
+
+
+def test_get_distribution_denial_is_remembered_per_operation():
+    sim = SimulatedAWS(accounts=1, roles=1, distributions=2, latency=0, denied_operations={"Role0": {"GetDistribution"}})
+    run._reset(sim, cold=True)
+    dist_id = sim.distribution(0, 1)["Id"]
+
+    core.cloudfront_search(sim.access_token, REGION, "Id", dist_id)
+    sim.reset_counters()
+    results = core.cloudfront_search(sim.access_token, REGION, "Id", dist_id)
+    assert [item["distribution"]["Id"] for item in results] == [dist_id]
+    assert "GetDistribution" not in sim.calls
+    assert sim.calls["ListDistributions"] == 1
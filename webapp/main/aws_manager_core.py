@@ -1,19 +1,929 @@
+import asyncio
+import bisect
+import contextvars
+import csv
+import functools
 import json
 import hashlib
+import math
+import os
+import threading
 import time
 import webbrowser
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from configparser import ConfigParser
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Dict
+from typing import AsyncIterator, Callable, Iterator, List, Dict
 
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from .inventory import inventory, zone_fingerprint
+from .matching import AhoCorasick, LabelTrie, reversed_labels
+from .profiling import attach_client, record_span, run_in_context, span
+from .query import QUERY_SEARCH_TYPE, SEARCH_TYPES, field_getter, projector, search_predicate
 
 SSO_PROFILE = "IAM"
 ROUTE53_SEARCH_ACCOUNT_ID = "979633380910"
+# Accounts covered by Route53 searches: empty for ROUTE53_SEARCH_ACCOUNT_ID
+# only, "all" for every SSO account, or comma-separated account ids.
+ROUTE53_ACCOUNTS = os.environ.get("AWS_MANAGER_ROUTE53_ACCOUNTS", "")
+
+# Concurrency of the multi-account scans. Both can be overridden per call.
+SEARCH_MAX_WORKERS = int(os.environ.get("AWS_MANAGER_MAX_WORKERS", "16"))
+ACCOUNT_TIMEOUT = float(os.environ.get("AWS_MANAGER_ACCOUNT_TIMEOUT", "120"))
+# Hosted zones paged at once within each account of a Route53 search, and the
+# time budget of one account, which pages whole zones.
+ROUTE53_ZONE_WORKERS = int(os.environ.get("AWS_MANAGER_ROUTE53_ZONE_WORKERS", "4"))
+ROUTE53_ACCOUNT_TIMEOUT = float(os.environ.get("AWS_MANAGER_ROUTE53_ACCOUNT_TIMEOUT", "600"))
+
+# SSO lookups are cached per access token. Role credentials expire on their
+# own ``expiration``; account and role lists after SSO_LIST_TTL seconds.
+SSO_CACHE_SIZE = int(os.environ.get("AWS_MANAGER_SSO_CACHE_SIZE", "4096"))
+SSO_LIST_TTL = float(os.environ.get("AWS_MANAGER_SSO_LIST_TTL", "900"))
+CREDENTIALS_EXPIRY_MARGIN = 300
+
+# SSO access tokens are reused from the AWS CLI cache and from this tool's own
+# cache, and refreshed with their refresh token when one was issued.
+AWS_SSO_CACHE = Path.home() / ".aws" / "sso" / "cache"
+SSO_TOKEN_CACHE = Path(os.environ.get("AWS_MANAGER_SSO_TOKEN_CACHE", Path.home() / ".aws-manager" / "sso-cache"))
+SSO_REGISTRATION_SCOPES = ["sso:account:access"]
+
+# Route53 syncs re-page every zone at least this often (seconds), since
+# editing a record in place does not change the zone's record count.
+ROUTE53_FULL_SYNC_AGE = float(os.environ.get("AWS_MANAGER_ROUTE53_FULL_SYNC_AGE", "86400"))
+ROUTE53_PAGE_SIZE = 300
+# Records asked for when seeking to one record name, which rarely has more types.
+ROUTE53_SEEK_PAGE_SIZE = 10
+
+# Which role worked last for each (account, operation) is tried first, and
+# (account, role, operation) combinations that got AccessDenied are skipped for
+# DENIED_TTL seconds.
+DENIED_TTL = float(os.environ.get("AWS_MANAGER_DENIED_TTL", "900"))
+ACCESS_DENIED_CODES = {"AccessDenied", "AccessDeniedException"}
+
+# Results of complete searches are shared by identical searches of the same
+# credentials for SEARCH_CACHE_TTL seconds; 0 keeps only the coalescing of
+# searches running at the same time.
+SEARCH_CACHE_TTL = float(os.environ.get("AWS_MANAGER_SEARCH_CACHE_TTL", "60"))
+SEARCH_CACHE_SIZE = int(os.environ.get("AWS_MANAGER_SEARCH_CACHE_SIZE", "256"))
+
+# Starting client-side rate limits in calls per second, shared by every search
+# of the process. SSO limits are global; the others apply per account. The
+# rates grow past these guesses until AWS throttles. Override with
+# AWS_MANAGER_RATE_LIMITS="route53:ListResourceRecordSets=5,...".
+RATE_LIMITS = {
+    "sso:ListAccounts": 10,
+    "sso:ListAccountRoles": 10,
+    "sso:GetRoleCredentials": 10,
+    "cloudfront:ListDistributions": 10,
+    "cloudfront:GetDistribution": 10,
+    "route53:ListHostedZones": 5,
+    "route53:ListResourceRecordSets": 5,
+}
+DEFAULT_RATE_LIMIT = 10
+# Seconds of calls at the current rate a bucket holds, so a cold search can
+# make that many calls at once before being paced.
+RATE_LIMIT_BURST = float(os.environ.get("AWS_MANAGER_RATE_LIMIT_BURST", "2"))
+THROTTLING_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottledException",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+    "PriorRequestNotComplete",
+    "SlowDown",
+}
+
+# Upper bounds, in seconds, of the AWS call and client construction latency
+# histograms exported at /metrics.
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Every AWS client is built from this single configuration. Connections are
+# kept alive and pooled per client, and clients are reused across searches.
+CLIENT_POOL_SIZE = int(os.environ.get("AWS_MANAGER_CLIENT_POOL_SIZE", "512"))
+CLIENT_CONFIG = Config(
+    max_pool_connections=int(os.environ.get("AWS_MANAGER_MAX_POOL_CONNECTIONS", "32")),
+    tcp_keepalive=True,
+    connect_timeout=10,
+    read_timeout=60,
+    retries={
+        "max_attempts": int(os.environ.get("AWS_MANAGER_MAX_ATTEMPTS", "5")),
+        "mode": "standard",
+    },
+)
+
+
+class SearchResults(list):
+    """List of search results that also carries metadata about the search."""
+
+    def __init__(self, items=(), meta: Dict | None = None):
+        super().__init__(items)
+        self.meta: Dict = meta if meta is not None else {}
+
+
+class AccountTimeout(Exception):
+    """Raised inside a worker when an account scan exceeds its time budget."""
+
+
+class AccountAccessDenied(Exception):
+    """Raised when no role of an account is allowed to run the scan.
+
+    ``cached`` is true when every role was skipped because of a recent
+    AccessDenied, so no call was made at all.
+    """
+
+    def __init__(self, cached: bool):
+        super().__init__("skipped-cached" if cached else "denied")
+        self.cached = cached
+
+
+class SearchCancelled(Exception):
+    """Raised inside a worker once its search no longer needs the result."""
+
+
+class Deadline:
+    """Time budget of one account scan, also carrying the search's cancel flag.
+
+    Scans call ``check()`` between API calls and pages, which is where they
+    stop when the budget is spent or the search was cancelled.
+    """
+
+    def __init__(self, seconds: float, cancel: threading.Event | None = None):
+        self.expires = time.monotonic() + seconds
+        self.cancel = cancel
+
+    def check(self) -> None:
+        if self.cancel is not None and self.cancel.is_set():
+            raise SearchCancelled()
+        if time.monotonic() > self.expires:
+            raise AccountTimeout()
+
+
+# The deadline of the account scan running in this context, so that every AWS
+# call it makes, down to the rate limiters, stops once the search is cancelled.
+_scan_deadline: contextvars.ContextVar = contextvars.ContextVar("aws_manager_scan_deadline", default=None)
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries expire at their own deadline."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at: float | None = None) -> None:
+        """Stores ``value`` until ``expires_at`` (epoch seconds), by default ``ttl`` from now."""
+        if expires_at is None:
+            expires_at = time.time() + self.ttl
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_SSO_CACHE = TTLCache(SSO_CACHE_SIZE, SSO_LIST_TTL)
+_ROLE_AFFINITY = TTLCache(SSO_CACHE_SIZE, ttl=86400)
+_DENIED_CACHE = TTLCache(SSO_CACHE_SIZE, DENIED_TTL)
+
+
+def _token_key(access_token: str) -> str:
+    return hashlib.sha256(access_token.encode()).hexdigest()
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose rate follows AIMD on throttling responses.
+
+    The bucket starts full and holds ``burst`` seconds of calls at the
+    current rate. Each successful attempt adds roughly ``increase`` calls per
+    second to the rate per second of traffic, past the starting ``rate`` and
+    up to ``max_rate`` when given, so the limiter probes for the real limit;
+    each throttled attempt multiplies the rate by ``decrease``, down to
+    ``min_rate``, and empties the bucket.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float = RATE_LIMIT_BURST,
+        max_rate: float | None = None,
+        min_rate: float = 0.5,
+        increase: float = 0.5,
+        decrease: float = 0.5,
+    ):
+        self.initial_rate = rate
+        self.burst = burst
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.rate = rate
+        self.calls = 0
+        self.throttles = 0
+        self.waited = 0.0
+        self._tokens = self._capacity()
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _capacity(self) -> float:
+        return max(1.0, self.rate * self.burst)
+
+    def acquire(self, cancel: threading.Event | None = None) -> None:
+        """Blocks until a call is allowed; raises ``SearchCancelled`` as soon as ``cancel`` is set."""
+        while True:
+            if cancel is not None and cancel.is_set():
+                raise SearchCancelled()
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity(), self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.calls += 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+                self.waited += wait
+            if cancel is not None:
+                cancel.wait(wait)
+            else:
+                time.sleep(wait)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate += self.increase / self.rate
+            if self.max_rate is not None:
+                self.rate = min(self.max_rate, self.rate)
+
+    def on_throttle(self) -> None:
+        with self._lock:
+            self.throttles += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._tokens = min(self._tokens, 0.0)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "rate": round(self.rate, 2),
+                "initial_rate": self.initial_rate,
+                "calls": self.calls,
+                "throttles": self.throttles,
+                "waited": round(self.waited, 3),
+            }
+
+
+class RateLimiters:
+    """Shared rate limiters, one per API and, for account-scoped APIs, per account.
+
+    SSO limits apply to the whole Identity Center instance, while CloudFront
+    and Route53 limits apply per AWS account, so their buckets are split by
+    the account the client's credentials belong to.
+    """
+
+    def __init__(self, limits: Dict[str, float], default: float = DEFAULT_RATE_LIMIT):
+        self.limits = limits
+        self.default = default
+        self._limiters: Dict[tuple, AdaptiveRateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, service: str, operation: str, account_id: str | None = None) -> AdaptiveRateLimiter:
+        key = (service, operation, account_id)
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(key)
+                if limiter is None:
+                    limiter = AdaptiveRateLimiter(self.limits.get(f"{service}:{operation}", self.default))
+                    self._limiters[key] = limiter
+        return limiter
+
+    def attach(self, client, service: str, account_id: str | None = None) -> None:
+        """Throttles every HTTP attempt made by ``client`` through the shared limiters."""
+
+        def before_send(event_name: str, **kwargs):
+            operation = event_name.rsplit(".", 1)[-1]
+            started = time.perf_counter()
+            deadline = _scan_deadline.get()
+            self.get(service, operation, account_id).acquire(deadline.cancel if deadline else None)
+            if time.perf_counter() - started > 0.001:
+                record_span("rate limit wait", "wait", started, api=f"{service}:{operation}")
+
+        def needs_retry(event_name: str, response=None, **kwargs):
+            limiter = self.get(service, event_name.rsplit(".", 1)[-1], account_id)
+            code = response[1].get("Error", {}).get("Code") if response else None
+            if code in THROTTLING_CODES:
+                limiter.on_throttle()
+            elif response is not None:
+                limiter.on_success()
+
+        client.meta.events.register("before-send", before_send)
+        client.meta.events.register("needs-retry", needs_retry)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per-API limiter state, summed over accounts."""
+        totals: Dict[str, Dict] = {}
+        with self._lock:
+            limiters = list(self._limiters.items())
+        for (service, operation, _), limiter in limiters:
+            stats = limiter.stats()
+            total = totals.setdefault(
+                f"{service}:{operation}",
+                {"calls": 0, "throttles": 0, "waited": 0.0, "min_rate": stats["rate"], "max_rate": stats["rate"]},
+            )
+            total["calls"] += stats["calls"]
+            total["throttles"] += stats["throttles"]
+            total["waited"] = round(total["waited"] + stats["waited"], 3)
+            total["min_rate"] = min(total["min_rate"], stats["rate"])
+            total["max_rate"] = max(total["max_rate"], stats["rate"])
+        return totals
+
+
+def _parse_rate_limits(value: str) -> Dict[str, float]:
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, rate = item.partition("=")
+        limits[name.strip()] = float(rate)
+    return limits
+
+
+rate_limiters = RateLimiters({**RATE_LIMITS, **_parse_rate_limits(os.environ.get("AWS_MANAGER_RATE_LIMITS", ""))})
+
+
+def _label_value(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: str) -> str:
+    return "{" + ",".join(f'{name}="{_label_value(value)}"' for name, value in labels.items()) + "}"
+
+
+class ApiMetrics:
+    """Per-operation AWS API metrics, fed by the botocore events of every pooled client.
+
+    For each service, operation and account it counts calls, their latency
+    (retries included), retried and throttled attempts and errors by code,
+    and it times client construction per service. ``prometheus()`` renders
+    everything in the Prometheus text format and ``summary()`` sums it per
+    operation, optionally since an earlier ``snapshot()``.
+    """
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        # (service, operation, account) -> [calls, seconds, retries, throttles, *bucket counts]
+        self._calls: Dict[tuple, List] = {}
+        # (service, operation, account, code) -> errors
+        self._errors: Dict[tuple, int] = {}
+        # service -> [clients, seconds, *bucket counts]
+        self._builds: Dict[str, List] = {}
+        self._lock = threading.Lock()
+
+    def _row(self, key: tuple) -> List:
+        row = self._calls.get(key)
+        if row is None:
+            row = self._calls[key] = [0, 0.0, 0, 0] + [0] * len(self.buckets)
+        return row
+
+    def _observe(self, row: List, offset: int, seconds: float) -> None:
+        row[0] += 1
+        row[1] += seconds
+        index = bisect.bisect_left(self.buckets, seconds)
+        if index < len(self.buckets):
+            row[offset + index] += 1
+
+    def observe_call(self, service: str, operation: str, account: str, seconds: float, retries: int, error: str | None) -> None:
+        with self._lock:
+            row = self._row((service, operation, account))
+            self._observe(row, 4, seconds)
+            row[2] += retries
+            if error:
+                key = (service, operation, account, error)
+                self._errors[key] = self._errors.get(key, 0) + 1
+
+    def observe_throttle(self, service: str, operation: str, account: str) -> None:
+        with self._lock:
+            self._row((service, operation, account))[3] += 1
+
+    def observe_client_build(self, service: str, seconds: float) -> None:
+        with self._lock:
+            row = self._builds.get(service)
+            if row is None:
+                row = self._builds[service] = [0, 0.0] + [0] * len(self.buckets)
+            self._observe(row, 2, seconds)
+
+    def attach(self, client, service: str, account_id: str | None = None) -> None:
+        """Records every call made by ``client``, labelled with ``account_id``.
+
+        Calls that name an account themselves, such as SSO role credential
+        fetches, are labelled with that account instead.
+        """
+
+        def before_parameter_build(event_name: str, params: Dict, context: Dict, **kwargs):
+            context["metrics_account"] = params.get("accountId") or account_id or ""
+
+        def before_call(event_name: str, context: Dict, **kwargs):
+            context["metrics_started"] = time.perf_counter()
+
+        def after_call(event_name: str, http_response=None, parsed=None, context=None, **kwargs):
+            started = (context or {}).pop("metrics_started", None)
+            if started is None:
+                return
+            parsed = parsed or {}
+            error = None
+            if http_response is not None and http_response.status_code >= 300:
+                error = parsed.get("Error", {}).get("Code") or str(http_response.status_code)
+            retries = parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+            account = context.get("metrics_account", "")
+            self.observe_call(service, event_name.rsplit(".", 1)[-1], account, time.perf_counter() - started, retries, error)
+
+        def after_call_error(event_name: str, exception=None, context=None, **kwargs):
+            started = (context or {}).pop("metrics_started", None)
+            if started is not None:
+                account = context.get("metrics_account", "")
+                error = type(exception).__name__
+                self.observe_call(service, event_name.rsplit(".", 1)[-1], account, time.perf_counter() - started, 0, error)
+
+        def needs_retry(event_name: str, response=None, request_dict=None, **kwargs):
+            if response and response[1].get("Error", {}).get("Code") in THROTTLING_CODES:
+                account = (request_dict or {}).get("context", {}).get("metrics_account", account_id or "")
+                self.observe_throttle(service, event_name.rsplit(".", 1)[-1], account)
+
+        client.meta.events.register("before-parameter-build", before_parameter_build)
+        client.meta.events.register("before-call", before_call)
+        client.meta.events.register("after-call", after_call)
+        client.meta.events.register("after-call-error", after_call_error)
+        client.meta.events.register("needs-retry", needs_retry)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "calls": {key: list(row) for key, row in self._calls.items()},
+                "errors": dict(self._errors),
+                "builds": {key: list(row) for key, row in self._builds.items()},
+            }
+
+    def summary(self, since: Dict | None = None) -> Dict:
+        """Totals per operation and per account, and client builds, since ``since``.
+
+        ``operations`` maps ``service:operation`` to its calls, seconds,
+        retries, throttles and errors; ``accounts`` maps each account to the
+        seconds spent in its calls; ``clients`` maps each service to the
+        clients built and the seconds it took.
+        """
+        now = self.snapshot()
+        before = since or {"calls": {}, "errors": {}, "builds": {}}
+        operations: Dict[str, Dict] = {}
+        accounts: Dict[str, float] = {}
+        for key, row in now["calls"].items():
+            old = before["calls"].get(key, [0, 0.0, 0, 0])
+            calls, seconds, retries, throttles = (row[i] - old[i] for i in range(4))
+            if not (calls or throttles):
+                continue
+            service, operation, account = key
+            total = operations.setdefault(f"{service}:{operation}", {"calls": 0, "seconds": 0.0, "retries": 0, "throttles": 0, "errors": 0})
+            total["calls"] += calls
+            total["seconds"] += seconds
+            total["retries"] += retries
+            total["throttles"] += throttles
+            if account:
+                accounts[account] = accounts.get(account, 0.0) + seconds
+        for (service, operation, account, code), count in now["errors"].items():
+            count -= before["errors"].get((service, operation, account, code), 0)
+            if count:
+                operations[f"{service}:{operation}"]["errors"] += count
+        clients = {}
+        for service, row in now["builds"].items():
+            old = before["builds"].get(service, [0, 0.0])
+            if row[0] - old[0]:
+                clients[service] = {"built": row[0] - old[0], "seconds": row[1] - old[1]}
+        return {"operations": operations, "accounts": accounts, "clients": clients}
+
+    def _histogram(self, lines: List[str], name: str, labels: Dict, row: List, offset: int) -> None:
+        cumulative = 0
+        for bound, count in zip(self.buckets, row[offset:]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(**labels, le=repr(bound))} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {row[0]}")
+        lines.append(f"{name}_sum{_labels(**labels)} {row[1]:.6f}")
+        lines.append(f"{name}_count{_labels(**labels)} {row[0]}")
+
+    def prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        calls = sorted(snapshot["calls"].items())
+        lines = [
+            "# HELP aws_manager_api_calls_total AWS API calls, each counted once however many attempts it took.",
+            "# TYPE aws_manager_api_calls_total counter",
+        ]
+        for (service, operation, account), row in calls:
+            lines.append(f"aws_manager_api_calls_total{_labels(service=service, operation=operation, account=account)} {row[0]}")
+        lines += [
+            "# HELP aws_manager_api_call_duration_seconds AWS API call latency, retries included.",
+            "# TYPE aws_manager_api_call_duration_seconds histogram",
+        ]
+        for (service, operation, account), row in calls:
+            self._histogram(lines, "aws_manager_api_call_duration_seconds", {"service": service, "operation": operation, "account": account}, row, 4)
+        for index, name, help_text in ((2, "retries", "Retried AWS API attempts."), (3, "throttles", "AWS API attempts rejected by throttling.")):
+            lines += [f"# HELP aws_manager_api_{name}_total {help_text}", f"# TYPE aws_manager_api_{name}_total counter"]
+            for (service, operation, account), row in calls:
+                lines.append(f"aws_manager_api_{name}_total{_labels(service=service, operation=operation, account=account)} {row[index]}")
+        lines += ["# HELP aws_manager_api_errors_total Failed AWS API calls by error code.", "# TYPE aws_manager_api_errors_total counter"]
+        for (service, operation, account, code), count in sorted(snapshot["errors"].items()):
+            lines.append(f"aws_manager_api_errors_total{_labels(service=service, operation=operation, account=account, code=code)} {count}")
+        lines += [
+            "# HELP aws_manager_client_build_duration_seconds Time spent building AWS clients.",
+            "# TYPE aws_manager_client_build_duration_seconds histogram",
+        ]
+        for service, row in sorted(snapshot["builds"].items()):
+            self._histogram(lines, "aws_manager_client_build_duration_seconds", {"service": service}, row, 2)
+        return "\n".join(lines) + "\n"
+
+
+api_metrics = ApiMetrics()
+
+
+class ClientPool:
+    """Reuses boto3 clients keyed by service, region and credential identity.
+
+    Clients are thread-safe and keep their own HTTP connection pool, so a
+    pooled client serves every account scan that uses the same credentials.
+    All clients come from one boto3 session, which loads each service model
+    only once. Entries expire with the credentials they were built from.
+    A ``session`` can be given to build the clients from instead, such as
+    the simulated AWS of the benchmarks.
+    """
+
+    def __init__(self, maxsize: int = CLIENT_POOL_SIZE, config: Config = CLIENT_CONFIG, session=None):
+        self.config = config
+        self._clients = TTLCache(maxsize, ttl=3600)
+        self._lock = threading.Lock()
+        self._session = session
+        self._created: Dict[str, int] = {}
+        self._reused: Dict[str, int] = {}
+
+    @staticmethod
+    def _identity(credentials: Dict | None) -> tuple:
+        if not credentials:
+            return ()
+        secret = f"{credentials['secretAccessKey']}:{credentials.get('sessionToken') or ''}"
+        return (credentials["accessKeyId"], hashlib.sha256(secret.encode()).hexdigest())
+
+    def client(
+        self,
+        service: str,
+        region_name: str | None = None,
+        credentials: Dict | None = None,
+        account_id: str | None = None,
+    ):
+        """Returns a client for ``service``, built from SSO-style ``credentials``.
+
+        ``account_id`` names the account the credentials belong to; its
+        calls are rate limited together with the other clients of the same
+        account.
+        """
+        key = (service, region_name, *self._identity(credentials))
+        client = self._clients.get(key)
+        if client is not None:
+            with self._lock:
+                self._reused[service] = self._reused.get(service, 0) + 1
+            return client
+
+        # boto3 sessions are not thread-safe, so clients are built under the lock.
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._reused[service] = self._reused.get(service, 0) + 1
+                return client
+            if self._session is None:
+                self._session = boto3.session.Session()
+            kwargs = {}
+            if credentials:
+                kwargs = {
+                    "aws_access_key_id": credentials["accessKeyId"],
+                    "aws_secret_access_key": credentials["secretAccessKey"],
+                    "aws_session_token": credentials.get("sessionToken"),
+                }
+            started = time.perf_counter()
+            with span(f"{service} client", "client"):
+                client = self._session.client(service, region_name=region_name, config=self.config, **kwargs)
+            api_metrics.observe_client_build(service, time.perf_counter() - started)
+            rate_limiters.attach(client, service, account_id)
+            api_metrics.attach(client, service, account_id)
+            attach_client(client, service)
+            self._created[service] = self._created.get(service, 0) + 1
+            expires_at = None
+            if credentials and credentials.get("expiration"):
+                expires_at = credentials["expiration"] / 1000 - CREDENTIALS_EXPIRY_MARGIN
+            self._clients.set(key, client, expires_at)
+            return client
+
+    def stats(self) -> Dict:
+        """Client construction and reuse counts, in total and per service."""
+        with self._lock:
+            return {
+                "created": sum(self._created.values()),
+                "reused": sum(self._reused.values()),
+                "pooled": len(self._clients),
+                "created_by_service": dict(self._created),
+                "reused_by_service": dict(self._reused),
+            }
+
+
+client_pool = ClientPool()
+
+
+class _Flight:
+    """A search in progress, which identical searches wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.results: SearchResults | None = None
+        self.error: BaseException | None = None
+
+
+def search_key(identity: str, resource: str, search_type: str | None, search_value: str, **options) -> tuple:
+    """Cache key of a search: who runs it, what it looks for and the options changing its results."""
+    options = tuple(sorted((name, tuple(value) if isinstance(value, list) else value) for name, value in options.items()))
+    return (identity, resource, search_type, search_value, options)
+
+
+def _cacheable(results: SearchResults) -> bool:
+    """Only complete searches are reused; timed out or failed accounts are retried by the next one.
+
+    Denied accounts (``denied``, ``skipped-cached``) are a complete answer:
+    running the search again would only be denied again.
+    """
+    if results.meta.get("error") or results.meta.get("route53_error"):
+        return False
+    return all(status["status"] not in ("timeout", "error") for status in results.meta.get("accounts", []))
+
+
+class SearchCache:
+    """Results of recent searches, shared by identical searches.
+
+    Only one search per key runs at a time: identical searches started
+    meanwhile wait for it and get its results ("coalesced"), and complete
+    results are then served for ``ttl`` seconds ("hit"). The returned
+    results carry ``meta["cache"]`` with the status and, for hits, the age.
+
+    The cache lives in the process: with several server worker processes,
+    each one coalesces and caches only its own searches.
+    """
+
+    def __init__(self, maxsize: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL):
+        self.ttl = ttl
+        self._results = TTLCache(maxsize, ttl)
+        self._flights: Dict[tuple, _Flight] = {}
+        self._lock = threading.Lock()
+        self._counts = {"hit": 0, "coalesced": 0, "miss": 0}
+
+    @staticmethod
+    def _tagged(results: SearchResults, status: str, stored_at: float | None = None) -> SearchResults:
+        cache = {"status": status}
+        if stored_at is not None:
+            cache["age"] = round(time.time() - stored_at, 1)
+        return SearchResults(results, meta={**results.meta, "cache": cache})
+
+    def claim(self, key: tuple) -> tuple[str, SearchResults | _Flight]:
+        """Returns ``("hit" | "coalesced", results)``, or ``("miss", flight)``.
+
+        After a miss the caller runs the search and must hand its outcome to
+        ``finish()``, which wakes the identical searches waiting meanwhile.
+        """
+        while True:
+            with self._lock:
+                cached = self._results.get(key)
+                if cached is not None:
+                    self._counts["hit"] += 1
+                    results, stored_at = cached
+                    return "hit", self._tagged(results, "hit", stored_at)
+                flight = self._flights.get(key)
+                if flight is None:
+                    flight = self._flights[key] = _Flight()
+                    self._counts["miss"] += 1
+                    return "miss", flight
+            with span("identical search in progress", "wait"):
+                flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            if flight.results is not None:
+                with self._lock:
+                    self._counts["coalesced"] += 1
+                return "coalesced", self._tagged(flight.results, "coalesced")
+            # The search was abandoned before it finished: run it again.
+
+    def finish(
+        self, key: tuple, flight: _Flight, results: SearchResults | None = None, error: BaseException | None = None
+    ) -> None:
+        """Publishes the outcome of a claimed search; neither results nor error means it was abandoned."""
+        with self._lock:
+            self._flights.pop(key, None)
+            if results is not None and self.ttl > 0 and _cacheable(results):
+                self._results.set(key, (results, time.time()))
+        flight.results, flight.error = results, error
+        flight.done.set()
+
+    def run(self, key: tuple, search: Callable[..., List[Dict]], *args, **kwargs) -> SearchResults:
+        """Returns the results of ``search(*args, **kwargs)``, cached or shared under ``key``."""
+        status, claimed = self.claim(key)
+        if status != "miss":
+            return claimed
+        try:
+            results = search(*args, **kwargs)
+        except Exception as e:
+            self.finish(key, claimed, error=e)
+            raise
+        except BaseException:
+            self.finish(key, claimed)
+            raise
+        if not isinstance(results, SearchResults):
+            results = SearchResults(results)
+        self.finish(key, claimed, results)
+        return self._tagged(results, "miss")
+
+    def clear(self) -> None:
+        self._results.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self._counts, "cached": len(self._results), "in_progress": len(self._flights)}
+
+
+search_cache = SearchCache()
+
+
+def clear_sso_cache() -> None:
+    """Drops every cached account list, role list and role credential."""
+    _SSO_CACHE.clear()
+
+
+def _list_accounts(sso_client, access_token: str) -> List[Dict]:
+    key = ("accounts", _token_key(access_token))
+    accounts = _SSO_CACHE.get(key)
+    if accounts is None:
+        accounts = []
+        paginator = sso_client.get_paginator("list_accounts")
+        for page in paginator.paginate(accessToken=access_token):
+            accounts.extend(page.get("accountList", []))
+        accounts = sorted(accounts, key=lambda x: x["accountName"])
+        _SSO_CACHE.set(key, accounts)
+    return accounts
+
+
+def _list_account_roles(sso_client, access_token: str, account_id: str) -> List[Dict]:
+    key = ("roles", _token_key(access_token), account_id)
+    roles = _SSO_CACHE.get(key)
+    if roles is None:
+        roles = []
+        paginator = sso_client.get_paginator("list_account_roles")
+        for page in paginator.paginate(accessToken=access_token, accountId=account_id):
+            roles.extend(page.get("roleList", []))
+        _SSO_CACHE.set(key, roles)
+    return roles
+
+
+def _get_role_credentials(sso_client, access_token: str, account_id: str, role_name: str) -> Dict:
+    """Returns role credentials, reusing them until shortly before they expire."""
+    key = ("credentials", _token_key(access_token), account_id, role_name)
+    creds = _SSO_CACHE.get(key)
+    if creds is None:
+        creds = sso_client.get_role_credentials(roleName=role_name, accountId=account_id, accessToken=access_token).get("roleCredentials", {})
+        if creds and creds.get("expiration"):
+            _SSO_CACHE.set(key, creds, creds["expiration"] / 1000 - CREDENTIALS_EXPIRY_MARGIN)
+    return creds
+
+
+def _run_account_scan(
+    scan: Callable[[Dict, Deadline], List[Dict]],
+    account: Dict,
+    account_timeout: float,
+    cancel: threading.Event | None = None,
+) -> tuple[Dict, List[Dict]]:
+    """Runs one account scan and returns its status along with its results.
+
+    The deadline is taken when the scan starts, so time spent waiting for a
+    free worker does not count against it. Every AWS call of the scan checks
+    its cancel flag, in the rate limiters, before being sent.
+    """
+    started = time.monotonic()
+    status = {
+        "account_id": account["accountId"],
+        "account_name": account["accountName"],
+        "status": "ok",
+    }
+    items: List[Dict] = []
+    with span(account["accountName"], "account", account_id=account["accountId"]) as account_span:
+        deadline = Deadline(account_timeout, cancel)
+        token = _scan_deadline.set(deadline)
+        try:
+            # A worker that starts after the search was cancelled makes no call.
+            deadline.check()
+            items = scan(account, deadline)
+        except AccountTimeout:
+            status["status"] = "timeout"
+        except SearchCancelled:
+            status["status"] = "cancelled"
+        except AccountAccessDenied as e:
+            status["status"] = str(e)
+        except Exception as e:
+            status["status"] = "error"
+            status["error"] = str(e)
+        finally:
+            _scan_deadline.reset(token)
+        if account_span:
+            account_span.attrs.update(status=status["status"], found=len(items))
+    status["elapsed"] = round(time.monotonic() - started, 3)
+    return status, items
+
+
+def _fan_out(
+    accounts: List[Dict],
+    scan: Callable[[Dict, Deadline], List[Dict]],
+    max_workers: int,
+    account_timeout: float,
+    on_account: Callable[[Dict, List[Dict]], None] | None = None,
+    limit: int = 0,
+) -> SearchResults:
+    """Runs ``scan(account, deadline)`` for every account on a bounded thread pool.
+
+    Results are merged in the order of ``accounts`` regardless of completion
+    order. ``on_account`` is called from the calling thread as each account
+    finishes. Once ``limit`` results were found (0 means no limit), queued
+    accounts are dropped, running scans are cancelled at their next deadline
+    check and the call returns without waiting for them.
+    """
+    per_account: Dict[str, List[Dict]] = {}
+    statuses: Dict[str, Dict] = {}
+    cancel = threading.Event()
+    found = 0
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        futures = {executor.submit(run_in_context(_run_account_scan), scan, account, account_timeout, cancel): account for account in accounts}
+        for future in as_completed(futures):
+            account = futures[future]
+            statuses[account["accountId"]], per_account[account["accountId"]] = future.result()
+            found += len(per_account[account["accountId"]])
+            if on_account:
+                on_account(statuses[account["accountId"]], per_account[account["accountId"]])
+            if limit and found >= limit:
+                cancel.set()
+                break
+    finally:
+        executor.shutdown(wait=not cancel.is_set(), cancel_futures=True)
+
+    results = SearchResults()
+    for account in accounts:
+        results.extend(per_account.get(account["accountId"], []))
+    if limit:
+        del results[limit:]
+        results.meta["stopped_early"] = cancel.is_set()
+    results.meta["accounts"] = [statuses[a["accountId"]] for a in accounts if a["accountId"] in statuses]
+    return results
+
+
+def _default_limit(search_type: str, limit: int | None) -> int:
+    """Id and DomainName identify a single distribution, so they stop at the first match."""
+    if limit is not None:
+        return limit
+    return 1 if search_type in ("Id", "DomainName") else 0
 
 
 def get_sso_config_value(profile_name: str, key: str) -> str | None:
-    """Reads a value from the AWS config file."""
+    """Reads a value from the AWS config file.
+
+    ``sso_start_url`` and ``sso_region`` fall back to the ``sso-session``
+    section the profile points to.
+    """
     try:
         config_path = Path.home() / ".aws" / "config"
         parser = ConfigParser()
@@ -22,199 +932,1168 @@ def get_sso_config_value(profile_name: str, key: str) -> str | None:
         section = f"profile {profile_name}" if profile_name else "default"
         if not parser.has_section(section):
             return None
-        return parser.get(section, key, fallback=None)
+        value = parser.get(section, key, fallback=None)
+        session = parser.get(section, "sso_session", fallback=None)
+        if value is None and session and key in ("sso_start_url", "sso_region"):
+            value = parser.get(f"sso-session {session}", key, fallback=None)
+        return value
     except Exception:
         return None
 
 
-def get_sso_token(profile_name: str, sso_start_url: str) -> str | None:
-    """Reads the SSO token from the local cache."""
+def _parse_expires_at(value: str) -> float:
+    """Converts the ``expiresAt`` format of the SSO caches to a timestamp."""
+    value = value.replace("UTC", "+00:00").replace("Z", "+00:00")
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _format_expires_at(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _token_cache_files(profile_name: str, sso_start_url: str) -> List[Path]:
+    """Token caches to try, this tool's own first, then the AWS CLI ones."""
+    url_key = hashlib.sha1(sso_start_url.encode()).hexdigest()
+    files = [SSO_TOKEN_CACHE / f"{url_key}.json"]
+    session = get_sso_config_value(profile_name, "sso_session")
+    if session:
+        files.append(AWS_SSO_CACHE / f"{hashlib.sha1(session.encode()).hexdigest()}.json")
+    files.append(AWS_SSO_CACHE / f"{url_key}.json")
+    return files
+
+
+def _read_token_cache(path: Path, sso_start_url: str) -> Dict | None:
     try:
-        sha1 = hashlib.sha1(sso_start_url.encode()).hexdigest()
-        cache_path = Path.home() / ".aws" / "sso" / "cache" / f"{sha1}.json"
-        if not cache_path.exists():
-            return None
-        with open(cache_path) as f:
+        with open(path) as f:
             data = json.load(f)
-        return data.get("accessToken")
+    except (OSError, ValueError):
+        return None
+    if data.get("startUrl", sso_start_url) != sso_start_url or not data.get("accessToken"):
+        return None
+    return data
+
+
+def _store_sso_token(
+    sso_start_url: str,
+    sso_region: str,
+    token: Dict,
+    client_id: str,
+    client_secret: str,
+    registration_expires_at: float | None,
+) -> None:
+    """Writes a token returned by ``create_token`` to this tool's cache."""
+    data = {
+        "startUrl": sso_start_url,
+        "region": sso_region,
+        "accessToken": token["accessToken"],
+        "expiresAt": _format_expires_at(time.time() + token["expiresIn"]),
+    }
+    if token.get("refreshToken"):
+        data.update(refreshToken=token["refreshToken"], clientId=client_id, clientSecret=client_secret)
+        if registration_expires_at:
+            data["registrationExpiresAt"] = _format_expires_at(registration_expires_at)
+    try:
+        SSO_TOKEN_CACHE.mkdir(parents=True, exist_ok=True)
+        path = SSO_TOKEN_CACHE / f"{hashlib.sha1(sso_start_url.encode()).hexdigest()}.json"
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+    except OSError:
+        pass
+
+
+def _refresh_sso_token(data: Dict, sso_start_url: str, sso_region: str) -> str | None:
+    """Trades a cached refresh token for a new access token."""
+    if not all(data.get(k) for k in ("refreshToken", "clientId", "clientSecret")):
+        return None
+    if data.get("registrationExpiresAt") and _parse_expires_at(data["registrationExpiresAt"]) <= time.time():
+        return None
+    try:
+        oidc = client_pool.client("sso-oidc", sso_region)
+        token = oidc.create_token(
+            clientId=data["clientId"],
+            clientSecret=data["clientSecret"],
+            grantType="refresh_token",
+            refreshToken=data["refreshToken"],
+        )
     except Exception:
         return None
+    token.setdefault("refreshToken", data["refreshToken"])
+    registration_expires_at = data.get("registrationExpiresAt")
+    _store_sso_token(
+        sso_start_url,
+        sso_region,
+        token,
+        data["clientId"],
+        data["clientSecret"],
+        _parse_expires_at(registration_expires_at) if registration_expires_at else None,
+    )
+    return token["accessToken"]
 
 
-def sso_login(profile: str = SSO_PROFILE) -> tuple[str, str] | None:
-    """Realiza login via AWS SSO utilizando o fluxo de device authorization."""
+def get_sso_token(profile_name: str, sso_start_url: str) -> str | None:
+    """Reads a still valid SSO token from the local caches.
+
+    Expired tokens are refreshed when the cache holds a refresh token.
+    """
+    sso_region = get_sso_config_value(profile_name, "sso_region")
+    expired = []
+    for path in _token_cache_files(profile_name, sso_start_url):
+        data = _read_token_cache(path, sso_start_url)
+        if data is None:
+            continue
+        try:
+            expires_at = _parse_expires_at(data["expiresAt"])
+        except (KeyError, ValueError):
+            continue
+        if expires_at - CREDENTIALS_EXPIRY_MARGIN > time.time():
+            return data["accessToken"]
+        expired.append(data)
+    for data in expired:
+        access_token = _refresh_sso_token(data, sso_start_url, data.get("region") or sso_region)
+        if access_token:
+            return access_token
+    return None
+
+
+def sso_cached_login(profile: str = SSO_PROFILE) -> tuple[str, str] | None:
+    """Returns ``(access_token, sso_region)`` from the caches, without any device flow."""
+    sso_start_url = get_sso_config_value(profile, "sso_start_url")
+    sso_region = get_sso_config_value(profile, "sso_region")
+    if not all([sso_start_url, sso_region]):
+        return None
+    access_token = get_sso_token(profile, sso_start_url)
+    if not access_token:
+        return None
+    return access_token, sso_region
+
+
+def _oidc_registration(oidc, sso_region: str) -> Dict:
+    """Registers the OIDC public client once and reuses it until its secret expires."""
+    key = ("oidc-client", sso_region)
+    registration = _SSO_CACHE.get(key)
+    if registration is None:
+        registration = oidc.register_client(
+            clientName="aws-manager",
+            clientType="public",
+            scopes=SSO_REGISTRATION_SCOPES,
+        )
+        _SSO_CACHE.set(key, registration, registration["clientSecretExpiresAt"] - CREDENTIALS_EXPIRY_MARGIN)
+    return registration
+
+
+def sso_start_device_authorization(profile: str = SSO_PROFILE) -> Dict | None:
+    """Starts the SSO device authorization flow without waiting for the user.
+
+    Returns everything ``sso_poll_token`` needs, along with the verification
+    URL and user code to show to the user, or ``None`` on failure.
+    """
     sso_start_url = get_sso_config_value(profile, "sso_start_url")
     sso_region = get_sso_config_value(profile, "sso_region")
     if not all([sso_start_url, sso_region]):
         return None
 
     try:
-        oidc = boto3.client("sso-oidc", region_name=sso_region)
-        reg = oidc.register_client(clientName="aws-manager", clientType="public")
-        client_id = reg["clientId"]
-        client_secret = reg["clientSecret"]
+        oidc = client_pool.client("sso-oidc", sso_region)
+        registration = _oidc_registration(oidc, sso_region)
         device = oidc.start_device_authorization(
-            clientId=client_id,
-            clientSecret=client_secret,
+            clientId=registration["clientId"],
+            clientSecret=registration["clientSecret"],
             startUrl=sso_start_url,
         )
-        webbrowser.open(device["verificationUriComplete"])
-        device_code = device["deviceCode"]
-        interval = device["interval"]
-        expires_in = device["expiresIn"]
-
-        for _ in range(expires_in // interval):
-            time.sleep(interval)
-            try:
-                token = oidc.create_token(
-                    clientId=client_id,
-                    clientSecret=client_secret,
-                    grantType="urn:ietf:params:oauth:grant-type:device_code",
-                    deviceCode=device_code,
-                )
-                return token["accessToken"], sso_region
-            except oidc.exceptions.AuthorizationPendingException:
-                continue
-            except oidc.exceptions.SlowDownException:
-                time.sleep(interval)
-                continue
-            except oidc.exceptions.ExpiredTokenException:
-                break
     except Exception:
         return None
 
-    return None
+    return {
+        "sso_start_url": sso_start_url,
+        "sso_region": sso_region,
+        "client_id": registration["clientId"],
+        "client_secret": registration["clientSecret"],
+        "registration_expires_at": registration["clientSecretExpiresAt"],
+        "device_code": device["deviceCode"],
+        "user_code": device["userCode"],
+        "verification_uri": device["verificationUri"],
+        "verification_uri_complete": device["verificationUriComplete"],
+        "interval": device.get("interval", 5),
+        "expires_at": time.time() + device["expiresIn"],
+    }
 
 
-def cloudfront_search(access_token: str, sso_region: str, search_type: str, search_value: str) -> List[Dict]:
-    """Searches CloudFront distributions across accounts and returns a list of results."""
-    results: List[Dict] = []
-    sso_client = boto3.client("sso", region_name=sso_region)
-    paginator = sso_client.get_paginator("list_accounts")
-
-    accounts = []
-    for page in paginator.paginate(accessToken=access_token):
-        accounts.extend(page.get("accountList", []))
-
-    for account in sorted(accounts, key=lambda x: x["accountName"]):
-        account_id = account["accountId"]
-        account_name = account["accountName"]
-        roles = sso_client.list_account_roles(accessToken=access_token, accountId=account_id).get("roleList", [])
-        for role in roles:
-            role_name = role["roleName"]
-            try:
-                creds = sso_client.get_role_credentials(roleName=role_name, accountId=account_id, accessToken=access_token).get("roleCredentials", {})
+def sso_poll_token(pending: Dict, persist: bool = False) -> Dict:
+    """Makes a single token request for a flow started by ``sso_start_device_authorization``.
+
+    Returns ``{"status": "ok", "access_token": ..., "sso_region": ...}`` once
+    the user approved, ``"pending"`` while they have not, ``"slow_down"``
+    with a longer ``interval`` when polled too fast, ``"expired"`` or
+    ``"error"``. With ``persist`` the token is written to this tool's cache
+    for later runs; only the CLI does that, since the cache is shared by
+    everyone using the machine.
+    """
+    if time.time() >= pending["expires_at"]:
+        return {"status": "expired"}
+    oidc = client_pool.client("sso-oidc", pending["sso_region"])
+    try:
+        token = oidc.create_token(
+            clientId=pending["client_id"],
+            clientSecret=pending["client_secret"],
+            grantType="urn:ietf:params:oauth:grant-type:device_code",
+            deviceCode=pending["device_code"],
+        )
+    except oidc.exceptions.AuthorizationPendingException:
+        return {"status": "pending"}
+    except oidc.exceptions.SlowDownException:
+        return {"status": "slow_down", "interval": pending["interval"] + 5}
+    except oidc.exceptions.ExpiredTokenException:
+        return {"status": "expired"}
+    except Exception:
+        return {"status": "error"}
+    if persist:
+        _store_sso_token(
+            pending["sso_start_url"],
+            pending["sso_region"],
+            token,
+            pending["client_id"],
+            pending["client_secret"],
+            pending["registration_expires_at"],
+        )
+    return {"status": "ok", "access_token": token["accessToken"], "sso_region": pending["sso_region"]}
+
+
+def sso_login(profile: str = SSO_PROFILE) -> tuple[str, str] | None:
+    """Realiza login via AWS SSO utilizando o fluxo de device authorization.
+
+    A cached token is reused when possible. Otherwise this blocks until the
+    user approves the device in the browser; the web app drives
+    ``sso_start_device_authorization``/``sso_poll_token`` instead.
+    """
+    cached = sso_cached_login(profile)
+    if cached:
+        return cached
+
+    pending = sso_start_device_authorization(profile)
+    if not pending:
+        return None
+
+    webbrowser.open(pending["verification_uri_complete"])
+    while True:
+        time.sleep(pending["interval"])
+        result = sso_poll_token(pending, persist=True)
+        if result["status"] == "ok":
+            return result["access_token"], result["sso_region"]
+        if result["status"] == "slow_down":
+            pending["interval"] = result["interval"]
+        elif result["status"] != "pending":
+            return None
+
+
+def _project(items: List[Dict], key: str, project: Callable[[Dict], Dict]) -> List[Dict]:
+    """Replaces ``item[key]`` of each result by its projection."""
+    for item in items:
+        item[key] = project(item[key])
+    return items
+
+
+def _cloudfront_index_lookup(search_type: str, search_value: str, account_ids: List[str], match: Callable[[Dict], bool]) -> List[Dict]:
+    if search_type == QUERY_SEARCH_TYPE:
+        return [item for item in inventory.cloudfront_items(account_ids) if match(item["distribution"])]
+    return inventory.cloudfront_lookup(search_type, search_value, account_ids)
+
+
+def _route53_index_lookup(search_type: str, search_value: str, account_ids: List[str], match: Callable[[Dict], bool]) -> List[Dict]:
+    if search_type == QUERY_SEARCH_TYPE:
+        return [item for item in inventory.route53_items(account_ids) if match(item["record"])]
+    return inventory.route53_lookup(search_type, search_value, account_ids)
+
+
+def _is_access_denied(error: Exception) -> bool:
+    return isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") in ACCESS_DENIED_CODES
+
+
+def _scan_with_roles(
+    sso_client,
+    access_token: str,
+    account: Dict,
+    service: str,
+    work: Callable[[object], List[Dict]],
+    deadline: Deadline,
+    operation: str | None = None,
+) -> List[Dict]:
+    """Runs ``work(client)`` with the first role of the account that succeeds.
+
+    The role that last succeeded for this account and ``operation`` (by
+    default the whole service, e.g. ``"cloudfront:GetDistribution"``) is
+    tried first. Roles recently denied that operation are skipped without
+    any call; other failures fall through to the next role. If no role
+    succeeds, ``AccountAccessDenied`` is raised when every attempt was
+    denied, otherwise the last error.
+    """
+    account_id = account["accountId"]
+    operation = operation or service
+    deadline.check()
+    roles = [role["roleName"] for role in _list_account_roles(sso_client, access_token, account_id)]
+    preferred = _ROLE_AFFINITY.get((account_id, operation))
+    if preferred in roles:
+        roles.remove(preferred)
+        roles.insert(0, preferred)
+
+    last_error: Exception | None = None
+    attempted = False
+    for role_name in roles:
+        deadline.check()
+        denied_key = (account_id, role_name, operation)
+        if _DENIED_CACHE.get(denied_key):
+            continue
+        attempted = True
+        try:
+            with span(role_name, "role", service=service):
+                creds = _get_role_credentials(sso_client, access_token, account_id, role_name)
                 if not creds:
                     continue
-                client = boto3.client(
-                    "cloudfront",
-                    aws_access_key_id=creds["accessKeyId"],
-                    aws_secret_access_key=creds["secretAccessKey"],
-                    aws_session_token=creds["sessionToken"],
-                )
-                paginator_dist = client.get_paginator("list_distributions")
-                for page_dist in paginator_dist.paginate():
-                    distributions = page_dist.get("DistributionList", {})
-                    if "Items" not in distributions:
-                        continue
-                    for dist in distributions.get("Items", []):
-                        match = False
-                        if search_type == "Id" and dist.get("Id") == search_value:
-                            match = True
-                        elif search_type == "DomainName" and dist.get("DomainName") == search_value:
-                            match = True
-                        elif search_type == "Aliases" and search_value in dist.get("Aliases", {}).get("Items", []):
-                            match = True
-                        if match:
-                            results.append({
-                                "account_name": account_name,
-                                "account_id": account_id,
-                                "distribution": dist,
-                            })
-            except Exception:
+                results = work(client_pool.client(service, credentials=creds, account_id=account_id))
+        except (AccountTimeout, SearchCancelled):
+            raise
+        except Exception as e:
+            if _is_access_denied(e):
+                _DENIED_CACHE.set(denied_key, True)
+            last_error = e
+            continue
+        _ROLE_AFFINITY.set((account_id, operation), role_name)
+        return results
+
+    if roles and (last_error is None or _is_access_denied(last_error)):
+        if not attempted:
+            raise AccountAccessDenied(cached=True)
+        if last_error is not None:
+            raise AccountAccessDenied(cached=False)
+    if last_error is not None:
+        raise last_error
+    return []
+
+
+# DistributionConfig fields that ListDistributions returns in each summary.
+_SUMMARY_CONFIG_KEYS = (
+    "Aliases", "Origins", "OriginGroups", "DefaultCacheBehavior", "CacheBehaviors", "CustomErrorResponses",
+    "Comment", "PriceClass", "Enabled", "ViewerCertificate", "Restrictions", "WebACLId", "HttpVersion",
+    "IsIPV6Enabled", "Staging",
+)
+
+
+def _distribution_summary(distribution: Dict) -> Dict:
+    """Reshapes a ``get_distribution`` result like a ``list_distributions`` item, so queries and projections apply."""
+    config = distribution.get("DistributionConfig", {})
+    summary = {
+        key: distribution[key]
+        for key in ("Id", "ARN", "Status", "LastModifiedTime", "DomainName", "AliasICPRecordals")
+        if key in distribution
+    }
+    summary.update({key: config[key] for key in _SUMMARY_CONFIG_KEYS if key in config})
+    return summary
+
+
+class CloudFrontPlan:
+    """How a CloudFront search reads an account: by default listing every distribution.
+
+    ``read`` stops paging once ``limit`` matches were found (0 means no
+    limit). ``api_calls`` counts the CloudFront calls made, across threads.
+    """
+
+    kind = "list"
+    operation = "cloudfront:ListDistributions"
+
+    def __init__(self, match: Callable[[Dict], bool], limit: int = 0):
+        self.match = match
+        self.limit = limit
+        self.api_calls = 0
+        self._lock = threading.Lock()
+
+    def _count(self) -> None:
+        with self._lock:
+            self.api_calls += 1
+
+    def accounts(self, accounts: List[Dict]) -> List[Dict]:
+        return accounts
+
+    def read(self, client, deadline: Deadline | None = None) -> List[Dict]:
+        """The matching distributions ``client`` can see."""
+        results: List[Dict] = []
+        paginator_dist = client.get_paginator("list_distributions")
+        for page_dist in paginator_dist.paginate():
+            self._count()
+            if deadline is not None:
+                deadline.check()
+            distributions = page_dist.get("DistributionList", {})
+            if "Items" not in distributions:
                 continue
+            for dist in distributions.get("Items", []):
+                if self.match(dist):
+                    results.append(dist)
+                    if self.limit and len(results) >= self.limit:
+                        return results
+        return results
+
+    def scan(self, sso_client, access_token: str, account: Dict, deadline: Deadline) -> List[Dict]:
+        """Reads one account with the first role that succeeds."""
+        distributions = _scan_with_roles(
+            sso_client, access_token, account, "cloudfront", lambda client: self.read(client, deadline), deadline, self.operation
+        )
+        return self._tag(account, distributions)
+
+    @staticmethod
+    def _tag(account: Dict, distributions: List[Dict]) -> List[Dict]:
+        return [
+            {"account_name": account["accountName"], "account_id": account["accountId"], "distribution": dist}
+            for dist in distributions
+        ]
+
+    def describe(self) -> Dict:
+        return {"kind": self.kind, "api_calls": self.api_calls}
+
+
+class CloudFrontGetPlan(CloudFrontPlan):
+    """Fetches one distribution by Id with ``get_distribution`` instead of listing.
+
+    Accounts that do not own the distribution answer ``NoSuchDistribution``,
+    which counts as no match. ``account_ids``, when given, are the only
+    accounts tried, for example the owner recorded in the inventory. In an
+    account where no role may call ``GetDistribution``, the distributions
+    are listed instead.
+    """
+
+    kind = "get"
+    operation = "cloudfront:GetDistribution"
+
+    def __init__(self, distribution_id: str, match: Callable[[Dict], bool], account_ids: List[str] | None = None):
+        super().__init__(match, 1)
+        self.distribution_id = distribution_id
+        self.account_ids = account_ids
+
+    def accounts(self, accounts: List[Dict]) -> List[Dict]:
+        if self.account_ids is None:
+            return accounts
+        return [account for account in accounts if account["accountId"] in self.account_ids]
+
+    def read(self, client, deadline: Deadline | None = None) -> List[Dict]:
+        if deadline is not None:
+            deadline.check()
+        self._count()
+        try:
+            distribution = client.get_distribution(Id=self.distribution_id)["Distribution"]
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "NoSuchDistribution":
+                return []
+            raise
+        dist = _distribution_summary(distribution)
+        return [dist] if self.match(dist) else []
+
+    def scan(self, sso_client, access_token: str, account: Dict, deadline: Deadline) -> List[Dict]:
+        try:
+            return super().scan(sso_client, access_token, account, deadline)
+        except AccountAccessDenied:
+            # Narrow roles may list distributions without being allowed to get one.
+            distributions = _scan_with_roles(
+                sso_client, access_token, account, "cloudfront",
+                lambda client: CloudFrontPlan.read(self, client, deadline), deadline, CloudFrontPlan.operation,
+            )
+            return self._tag(account, distributions)
+
+    def describe(self) -> Dict:
+        described = super().describe()
+        if self.account_ids is not None:
+            described["hint"] = "inventory"
+        return described
+
+
+def plan_cloudfront_search(
+    search_type: str,
+    search_value: str,
+    limit: int = 0,
+    account_ids: List[str] | None = None,
+    use_inventory: bool = True,
+) -> CloudFrontPlan:
+    """Chooses the cheapest way to answer a CloudFront search.
+
+    An Id search fetches the distribution directly in each account. A
+    DomainName search does the same when the inventory knows which
+    distribution has that domain name, only in the account it recorded;
+    the caller falls back to listing if that distribution changed since.
+    The ``dxxxx.cloudfront.net`` name is assigned by CloudFront and cannot
+    be turned into an Id otherwise. Every other search lists the
+    distributions of each account.
+
+    ``account_ids`` limits the inventory lookup to those accounts;
+    ``use_inventory=False`` skips it.
+    """
+    match = search_predicate("cloudfront", search_type, search_value)
+    if search_type == "Id" and search_value.strip():
+        return CloudFrontGetPlan(search_value.strip(), match)
+    if search_type == "DomainName" and use_inventory:
+        known = inventory.cloudfront_lookup("DomainName", search_value, account_ids)
+        if known:
+            distribution_id = known[0]["distribution"]["Id"]
+            return CloudFrontGetPlan(distribution_id, match, [item["account_id"] for item in known])
+    return CloudFrontPlan(match, limit)
+
+
+def _scan_cloudfront_account(
+    sso_client,
+    access_token: str,
+    account: Dict,
+    match: Callable[[Dict], bool],
+    deadline: Deadline,
+    limit: int = 0,
+) -> List[Dict]:
+    """Lists the distributions of one account and keeps those accepted by ``match``.
+
+    Paging stops as soon as ``limit`` matches were found (0 means no limit).
+    """
+    return CloudFrontPlan(match, limit).scan(sso_client, access_token, account, deadline)
+
+
+def cloudfront_search(
+    access_token: str,
+    sso_region: str,
+    search_type: str,
+    search_value: str,
+    max_workers: int = SEARCH_MAX_WORKERS,
+    account_timeout: float = ACCOUNT_TIMEOUT,
+    on_account: Callable[[Dict, List[Dict]], None] | None = None,
+    mode: str = "live",
+    limit: int | None = None,
+    fields: List[str] | None = None,
+) -> SearchResults:
+    """Searches CloudFront distributions across accounts and returns a list of results.
+
+    Accounts are scanned concurrently by up to ``max_workers`` threads, each
+    account getting ``account_timeout`` seconds. Results are ordered by
+    account name; ``results.meta["accounts"]`` holds the per-account status
+    and ``results.meta["clients"]`` the client pool counters.
+
+    The search stops once ``limit`` distributions were found, cancelling the
+    remaining accounts. ``None`` stops at the first match for Id and
+    DomainName searches, which can only match once, and scans everything
+    otherwise; 0 always scans everything.
+
+    With ``mode="index"`` the search is answered from the local inventory
+    snapshot instead, and ``results.meta["snapshot"]`` tells how old it is.
+
+    ``search_type="Query"`` treats ``search_value`` as a query (see
+    ``query.py``); an invalid one raises ``QueryError`` before any scan.
+    ``fields`` keeps only those fields of each distribution.
+
+    Id searches, and DomainName searches the inventory can resolve, fetch
+    the distribution directly instead of listing (see
+    ``plan_cloudfront_search``). ``results.meta["plan"]`` reports the plan
+    and the CloudFront API calls it made.
+    """
+    match = search_predicate("cloudfront", search_type, search_value)
+    project = projector("cloudfront", fields)
+    sso_client = client_pool.client("sso", sso_region)
+    accounts = _list_accounts(sso_client, access_token)
+    account_ids = [account["accountId"] for account in accounts]
+    limit = _default_limit(search_type, limit)
+    if mode == "index":
+        found = _cloudfront_index_lookup(search_type, search_value, account_ids, match)
+        return SearchResults(
+            _project(found[:limit] if limit else found, "distribution", project),
+            meta={"snapshot": inventory.snapshot_info("cloudfront")},
+        )
+
+    plan = plan_cloudfront_search(search_type, search_value, limit, account_ids)
+    results = _run_cloudfront_plan(plan, sso_client, access_token, accounts, project, max_workers, account_timeout, on_account)
+    if not results and plan.kind == "get" and search_type == "DomainName":
+        # The inventory was out of date: list every account after all.
+        hinted = plan.describe()
+        plan = CloudFrontPlan(match, limit)
+        results = _run_cloudfront_plan(plan, sso_client, access_token, accounts, project, max_workers, account_timeout, on_account)
+        results.meta["plan"]["api_calls"] += hinted["api_calls"]
+        results.meta["plan"]["fallback_from"] = hinted["kind"]
+    results.meta["clients"] = client_pool.stats()
+    results.meta["rate_limits"] = rate_limiters.stats()
     return results
 
 
-def route53_search(access_token: str, sso_region: str, search_type: str, search_value: str) -> List[Dict]:
-    """Searches Route53 records in the target account and returns a list of results."""
-    results: List[Dict] = []
-    sso_client = boto3.client("sso", region_name=sso_region)
+def _run_cloudfront_plan(
+    plan: CloudFrontPlan,
+    sso_client,
+    access_token: str,
+    accounts: List[Dict],
+    project: Callable[[Dict], Dict],
+    max_workers: int,
+    account_timeout: float,
+    on_account: Callable[[Dict, List[Dict]], None] | None,
+) -> SearchResults:
+    def scan(account: Dict, deadline: Deadline) -> List[Dict]:
+        return _project(plan.scan(sso_client, access_token, account, deadline), "distribution", project)
 
-    accounts = sso_client.list_accounts(accessToken=access_token).get("accountList", [])
-    target = next((acc for acc in accounts if acc["accountId"] == ROUTE53_SEARCH_ACCOUNT_ID), None)
-    if not target:
-        return results
-    roles = sso_client.list_account_roles(accessToken=access_token, accountId=ROUTE53_SEARCH_ACCOUNT_ID).get("roleList", [])
-    if not roles:
-        return results
+    results = _fan_out(plan.accounts(accounts), scan, max_workers, account_timeout, on_account, plan.limit)
+    results.meta["plan"] = plan.describe()
+    return results
 
-    role_name = roles[0]["roleName"]
-    creds = sso_client.get_role_credentials(roleName=role_name, accountId=ROUTE53_SEARCH_ACCOUNT_ID, accessToken=access_token).get("roleCredentials", {})
-    if not creds:
-        return results
 
-    client = boto3.client(
-        "route53",
-        aws_access_key_id=creds["accessKeyId"],
-        aws_secret_access_key=creds["secretAccessKey"],
-        aws_session_token=creds["sessionToken"],
-    )
+def refresh_cloudfront_inventory(
+    access_token: str,
+    sso_region: str,
+    max_workers: int = SEARCH_MAX_WORKERS,
+    account_timeout: float = ACCOUNT_TIMEOUT,
+    on_account: Callable[[Dict, List[Dict]], None] | None = None,
+) -> SearchResults:
+    """Rebuilds the local CloudFront inventory from a full scan of every account.
+
+    Each account is replaced in the snapshot as soon as its scan succeeds;
+    accounts that time out or fail keep their previous snapshot.
+    """
+    sso_client = client_pool.client("sso", sso_region)
+    accounts = _list_accounts(sso_client, access_token)
 
-    hosted_zones = client.list_hosted_zones().get("HostedZones", [])
-    for zone in hosted_zones:
-        zone_id = zone["Id"]
-        zone_name = zone["Name"]
+    def scan(account: Dict, deadline: Deadline) -> List[Dict]:
+        items = _scan_cloudfront_account(sso_client, access_token, account, lambda dist: True, deadline)
+        inventory.replace_cloudfront_account(account, [item["distribution"] for item in items])
+        return items
+
+    results = _fan_out(accounts, scan, max_workers, account_timeout, on_account)
+    results.meta["snapshot"] = inventory.snapshot_info("cloudfront")
+    return results
+
+
+def _scan_route53_zone(client, zone: Dict, match: Callable[[Dict], bool], deadline: Deadline | None = None) -> List[Dict]:
+    """Pages one hosted zone and returns the records accepted by ``match``.
+
+    ``deadline`` is checked after each page, so a large zone stops paging
+    when its account times out or the search is cancelled.
+    """
+    results: List[Dict] = []
+    with span(zone["Name"], "zone", zone_id=zone["Id"]):
         paginator = client.get_paginator("list_resource_record_sets")
-        for page in paginator.paginate(HostedZoneId=zone_id):
+        for page in paginator.paginate(HostedZoneId=zone["Id"]):
+            if deadline is not None:
+                deadline.check()
+            for record in page.get("ResourceRecordSets", []):
+                if match(record):
+                    results.append({"zone_name": zone["Name"], "record": record})
+    return results
+
+
+def _seek_route53_zone(
+    client,
+    zone: Dict,
+    start: str,
+    page_size: int,
+    match: Callable[[Dict], bool],
+    past: Callable[[Dict], bool],
+    deadline: Deadline | None = None,
+) -> List[Dict]:
+    """Reads one hosted zone from the record ``start`` on, until ``past`` accepts a record.
+
+    Route53 lists records ordered by their labels read right to left, so the
+    records named ``start`` and the ones below it follow it directly.
+    ``deadline`` is checked after each page, as in ``_scan_route53_zone``.
+    """
+    results: List[Dict] = []
+    params = {"HostedZoneId": zone["Id"], "StartRecordName": start, "MaxItems": str(page_size)}
+    with span(zone["Name"], "zone", zone_id=zone["Id"], start=start):
+        while True:
+            page = client.list_resource_record_sets(**params)
+            if deadline is not None:
+                deadline.check()
             for record in page.get("ResourceRecordSets", []):
-                match = False
-                if search_type == "Name" and search_value.lower() in record.get("Name", "").lower():
-                    match = True
-                elif search_type == "Value":
-                    for rr in record.get("ResourceRecords", []):
-                        if search_value.lower() in rr.get("Value", "").lower():
-                            match = True
-                            break
-                if match:
-                    results.append({
-                        "zone_name": zone_name,
-                        "record": record,
-                        "account_name": target["accountName"],
-                    })
+                if past(record):
+                    return results
+                if match(record):
+                    results.append({"zone_name": zone["Name"], "record": record})
+            if not page.get("IsTruncated"):
+                return results
+            params["StartRecordName"] = page["NextRecordName"]
+            params["StartRecordType"] = page["NextRecordType"]
+            if page.get("NextRecordIdentifier"):
+                params["StartRecordIdentifier"] = page["NextRecordIdentifier"]
+            else:
+                params.pop("StartRecordIdentifier", None)
+
+
+class Route53Plan:
+    """How a Route53 search reads the hosted zones: by default every record of every zone.
+
+    ``zones`` may be called once per account, from several threads; the
+    plan counts the zones it kept and saw across all of them.
+    """
+
+    kind = "scan"
+
+    def __init__(self, match: Callable[[Dict], bool]):
+        self.match = match
+        self.zones_planned = 0
+        self.zones_total = 0
+        self._lock = threading.Lock()
+
+    def zones(self, zones: List[Dict]) -> List[Dict]:
+        """The zones of one account the search reads."""
+        planned = self._select(zones)
+        with self._lock:
+            self.zones_planned += len(planned)
+            self.zones_total += len(zones)
+        return planned
+
+    def _select(self, zones: List[Dict]) -> List[Dict]:
+        return zones
+
+    def read(self, client, zone: Dict, deadline: Deadline | None = None) -> List[Dict]:
+        return _scan_route53_zone(client, zone, self.match, deadline)
+
+    def index_lookup(self, search_type: str, search_value: str, account_ids: List[str]) -> List[Dict]:
+        return _route53_index_lookup(search_type, search_value, account_ids, self.match)
+
+    def describe(self) -> Dict:
+        return {"kind": self.kind, "zones": self.zones_planned, "zones_total": self.zones_total}
+
+
+class Route53NamePlan(Route53Plan):
+    """Reads only the records named ``name``, or with ``subtree`` the records below it.
+
+    Only the zones named after a suffix of ``name`` can hold such records,
+    and in each of them the records are found by seeking to ``name`` rather
+    than paging the zone. With ``subtree``, zones delegated below ``name``
+    hold nothing else and are paged whole.
+    """
+
+    def __init__(self, name: str, subtree: bool = False):
+        self.name = _dns_name(name)
+        self.subtree = subtree
+        self.kind = "subtree" if subtree else "exact"
+        self._labels = reversed_labels(self.name)
+        self._dotted = ".".join(self._labels) + "."
+        super().__init__(self._below if subtree else self._named)
+
+    def _named(self, record: Dict) -> bool:
+        return _dns_name(record.get("Name", "")) == self.name
+
+    def _below(self, record: Dict) -> bool:
+        return _dns_name(record.get("Name", "")).endswith("." + self.name)
+
+    def _past(self, record: Dict) -> bool:
+        labels = reversed_labels(record.get("Name", ""))
+        if not self.subtree:
+            return labels != self._labels
+        if labels[: len(self._labels)] == self._labels:
+            return False
+        # Past the subtree both label by label and as a string, whichever way
+        # Route53 compares labels containing characters sorting before ".".
+        return labels > self._labels and ".".join(labels) > self._dotted
+
+    def _select(self, zones: List[Dict]) -> List[Dict]:
+        trie = LabelTrie((zone["Name"], index) for index, zone in enumerate(zones))
+        indexes = set(trie.suffixes(self.name))
+        if self.subtree:
+            indexes.update(trie.subtree(self.name))
+        return [zone for index, zone in enumerate(zones) if index in indexes]
+
+    def read(self, client, zone: Dict, deadline: Deadline | None = None) -> List[Dict]:
+        if reversed_labels(zone["Name"])[: len(self._labels)] == self._labels and _dns_name(zone["Name"]) != self.name:
+            return _scan_route53_zone(client, zone, self.match, deadline)
+        page_size = ROUTE53_PAGE_SIZE if self.subtree else ROUTE53_SEEK_PAGE_SIZE
+        return _seek_route53_zone(client, zone, self.name + ".", page_size, self.match, self._past, deadline)
+
+    def index_lookup(self, search_type: str, search_value: str, account_ids: List[str]) -> List[Dict]:
+        needle = ("." if self.subtree else "") + self.name + "."
+        return [item for item in inventory.route53_lookup("Name", needle, account_ids) if self.match(item["record"])]
+
+
+def plan_route53_search(search_type: str, search_value: str) -> Route53Plan:
+    """Chooses how to read the hosted zones for a Route53 search.
+
+    A Name search for a fully qualified name, ending with a dot
+    (``www.example.com.``), finds the records with exactly that name; one
+    starting with ``*.`` (``*.example.com``) finds the records below that
+    name. Both only read the zones that can hold the name, seeking to it
+    with ``StartRecordName``. Other searches page every zone.
+    """
+    value = search_value.strip()
+    if search_type == "Name" and value.startswith("*.") and _dns_name(value[2:]):
+        return Route53NamePlan(value[2:], subtree=True)
+    if search_type == "Name" and value.endswith(".") and _dns_name(value) and "*" not in value:
+        return Route53NamePlan(value)
+    return Route53Plan(search_predicate("route53", search_type, search_value))
+
+
+def _route53_accounts(accounts: List[Dict], selection: str) -> List[Dict]:
+    """The SSO accounts a Route53 search covers, in SSO order (see ``ROUTE53_ACCOUNTS``)."""
+    selection = selection.strip()
+    if selection.lower() == "all":
+        return accounts
+    wanted = {part.strip() for part in selection.split(",") if part.strip()} or {ROUTE53_SEARCH_ACCOUNT_ID}
+    return [account for account in accounts if account["accountId"] in wanted]
+
+
+def _route53_accounts_error(selection: str) -> str:
+    selection = selection.strip() or ROUTE53_SEARCH_ACCOUNT_ID
+    if selection.lower() == "all" or "," in selection:
+        return f"No Route53 search account found or accessible ({selection})."
+    return f"Account {selection} not found or inaccessible."
+
+
+def _scan_route53_account(
+    sso_client,
+    access_token: str,
+    account: Dict,
+    plan: Route53Plan,
+    zone_workers: int,
+    deadline: Deadline,
+    on_zone: Callable[[Dict], None] | None = None,
+    on_zone_done: Callable[[Dict, List[Dict]], None] | None = None,
+) -> List[Dict]:
+    """Reads the zones ``plan`` keeps in one account, up to ``zone_workers`` at a time.
+
+    ``on_zone`` is called with each zone before it is read and
+    ``on_zone_done`` with each zone and its items as it finishes, both from
+    the zone's thread. Items are tagged with their account and returned in
+    zone order.
+    """
+
+    def read(client, zone: Dict) -> List[Dict]:
+        deadline.check()
+        if on_zone:
+            on_zone(zone)
+        items = plan.read(client, zone, deadline)
+        for item in items:
+            item["account_name"] = account["accountName"]
+            item["account_id"] = account["accountId"]
+        if on_zone_done:
+            on_zone_done(zone, items)
+        return items
+
+    def work(client) -> List[Dict]:
+        zones = plan.zones(_list_hosted_zones(client))
+        executor = ThreadPoolExecutor(max_workers=max(1, zone_workers))
+        try:
+            futures = [executor.submit(run_in_context(read), client, zone) for zone in zones]
+            # Waits in completion order, so a failed zone stops the others early.
+            for future in as_completed(futures):
+                future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        return [item for future in futures for item in future.result()]
+
+    return _scan_with_roles(sso_client, access_token, account, "route53", work, deadline)
+
+
+def route53_search(
+    access_token: str,
+    sso_region: str,
+    search_type: str,
+    search_value: str,
+    on_zone: Callable[[Dict], None] | None = None,
+    mode: str = "live",
+    fields: List[str] | None = None,
+    accounts: str | None = None,
+    max_workers: int = SEARCH_MAX_WORKERS,
+    zone_workers: int = ROUTE53_ZONE_WORKERS,
+    account_timeout: float = ROUTE53_ACCOUNT_TIMEOUT,
+    on_account: Callable[[Dict, List[Dict]], None] | None = None,
+) -> SearchResults:
+    """Searches Route53 records and returns a list of results.
+
+    ``accounts`` selects the accounts searched, as ``ROUTE53_ACCOUNTS``
+    does by default. Up to ``max_workers`` accounts are searched at once,
+    each with the first role that works, and within each account up to
+    ``zone_workers`` hosted zones are paged at once. Results are tagged with
+    their account and zone and ordered by account, then zone;
+    ``results.meta["accounts"]`` holds the per-account status as in
+    ``cloudfront_search``, and ``on_account`` is called as each account
+    finishes. ``on_zone`` is called with each hosted zone before it is
+    read, from the zone's thread.
+
+    With ``mode="index"`` the search is answered from the local trigram
+    index, for the same accounts, and ``results.meta["snapshot"]`` tells
+    how old it is. ``search_type="Query"`` and ``fields`` work as in ``cloudfront_search``.
+
+    Name searches for ``www.example.com.`` or ``*.example.com`` only read
+    the zones and records that can match (see ``plan_route53_search``);
+    ``results.meta["plan"]`` tells how many zones were read.
+    """
+    plan = plan_route53_search(search_type, search_value)
+    project = projector("route53", fields)
+    sso_client = client_pool.client("sso", sso_region)
+    selection = ROUTE53_ACCOUNTS if accounts is None else accounts
+    targets = _route53_accounts(_list_accounts(sso_client, access_token), selection)
+    if mode == "index":
+        account_ids = [account["accountId"] for account in targets]
+        return SearchResults(
+            _project(plan.index_lookup(search_type, search_value, account_ids), "record", project),
+            meta={"snapshot": inventory.snapshot_info("route53")},
+        )
+
+    def scan(account: Dict, deadline: Deadline) -> List[Dict]:
+        items = _scan_route53_account(sso_client, access_token, account, plan, zone_workers, deadline, on_zone)
+        return _project(items, "record", project)
+
+    results = _fan_out(targets, scan, max_workers, account_timeout, on_account)
+    if not any(status["status"] == "ok" for status in results.meta["accounts"]):
+        results.meta["error"] = _route53_accounts_error(selection)
+    results.meta["plan"] = plan.describe()
+    results.meta["clients"] = client_pool.stats()
+    results.meta["rate_limits"] = rate_limiters.stats()
+    return results
+
+
+def _list_hosted_zones(client) -> List[Dict]:
+    zones: List[Dict] = []
+    paginator = client.get_paginator("list_hosted_zones")
+    for page in paginator.paginate():
+        zones.extend(page.get("HostedZones", []))
+    return zones
+
+
+def refresh_route53_inventory(
+    access_token: str,
+    sso_region: str,
+    on_zone: Callable[[Dict], None] | None = None,
+    incremental: bool = True,
+    max_age: float = ROUTE53_FULL_SYNC_AGE,
+    accounts: str | None = None,
+    max_workers: int = SEARCH_MAX_WORKERS,
+    account_timeout: float = ROUTE53_ACCOUNT_TIMEOUT,
+    on_account: Callable[[Dict, List[Dict]], None] | None = None,
+) -> SearchResults:
+    """Syncs the local Route53 record index of the Route53 search accounts.
+
+    ``accounts`` selects the accounts as in ``route53_search``. Up to
+    ``max_workers`` accounts are synced at once, each with the first role
+    that works; ``results.meta["accounts"]`` holds their status and
+    ``on_account`` is called as each one finishes. Accounts that fail keep
+    their previous index.
+
+    In incremental mode a hosted zone is only re-paged when its
+    ``list_hosted_zones`` metadata (name, ``ResourceRecordSetCount``, comment,
+    privacy) differs from the last sync or the zone is older than
+    ``max_age`` seconds. The record count does not change when a record is
+    edited in place, which is why zones are still fully re-synced
+    periodically.
+
+    Returns one entry per hosted zone with its account, record count and
+    whether it was refreshed; ``results.meta["sync"]`` summarizes the zones
+    skipped and refreshed and the ListResourceRecordSets calls made and saved.
+    """
+    sso_client = client_pool.client("sso", sso_region)
+    selection = ROUTE53_ACCOUNTS if accounts is None else accounts
+    targets = _route53_accounts(_list_accounts(sso_client, access_token), selection)
+    sync = {"zones_refreshed": 0, "zones_skipped": 0, "zones_removed": 0, "api_calls": 0, "api_calls_saved": 0}
+    sync_lock = threading.Lock()
+
+    def sync_account(account: Dict, deadline: Deadline) -> List[Dict]:
+        account_sync = dict.fromkeys(sync, 0)
+
+        def work(client) -> List[Dict]:
+            account_sync.update(dict.fromkeys(sync, 0))
+            zones = _list_hosted_zones(client)
+            known = inventory.route53_zones(account["accountId"]) if incremental else {}
+            entries = []
+            for zone in zones:
+                deadline.check()
+                pages = max(1, math.ceil(zone.get("ResourceRecordSetCount", 0) / ROUTE53_PAGE_SIZE))
+                entry = {"zone_name": zone["Name"], "account_name": account["accountName"], "account_id": account["accountId"]}
+                previous = known.get(zone["Id"])
+                if (
+                    previous is not None
+                    and zone_fingerprint(zone) == (previous["name"], previous["record_count"], previous["comment"], previous["private"])
+                    and time.time() - previous["synced_at"] < max_age
+                ):
+                    account_sync["zones_skipped"] += 1
+                    account_sync["api_calls_saved"] += pages
+                    entries.append({**entry, "records": previous["record_count"], "refreshed": False})
+                    continue
+
+                if on_zone:
+                    on_zone(zone)
+                records = [item["record"] for item in _scan_route53_zone(client, zone, lambda record: True, deadline)]
+                inventory.replace_route53_zone(account, zone, records)
+                account_sync["zones_refreshed"] += 1
+                account_sync["api_calls"] += pages
+                entries.append({**entry, "records": len(records), "refreshed": True})
+
+            account_sync["zones_removed"] = inventory.touch_route53_account(account, [zone["Id"] for zone in zones])
+            return entries
+
+        entries = _scan_with_roles(sso_client, access_token, account, "route53", work, deadline)
+        with sync_lock:
+            for key, value in account_sync.items():
+                sync[key] += value
+        return entries
+
+    results = _fan_out(targets, sync_account, max_workers, account_timeout, on_account)
+    if not any(status["status"] == "ok" for status in results.meta["accounts"]):
+        results.meta["error"] = _route53_accounts_error(selection)
+    results.meta["sync"] = sync
+    results.meta["snapshot"] = inventory.snapshot_info("route53")
     return results
 
 
+def _dns_name(name: str) -> str:
+    """Normalizes a DNS name for comparisons: lowercase, no trailing dot."""
+    return name.strip().lower().rstrip(".")
+
+
+def _alias_covers(alias: str, hostname: str) -> bool:
+    """Whether a CloudFront alias, possibly a ``*.`` wildcard, serves ``hostname``."""
+    alias = _dns_name(alias)
+    if alias.startswith("*."):
+        suffix = alias[1:]
+        return hostname.endswith(suffix) and "." not in hostname[: -len(suffix)]
+    return alias == hostname
+
+
+def _record_targets(record: Dict) -> List[str]:
+    """The names a record points to: CNAME-style values and the alias target."""
+    targets = [_dns_name(rr.get("Value", "")) for rr in record.get("ResourceRecords", [])]
+    if record.get("AliasTarget", {}).get("DNSName"):
+        targets.append(_dns_name(record["AliasTarget"]["DNSName"]))
+    return [target for target in targets if target]
+
+
+def _trace_route53_stage(access_token: str, sso_region: str, hostname: str, mode: str, accounts: str | None) -> SearchResults:
+    """Finds the Route53 records named ``hostname`` in the Route53 search accounts, live or from the index."""
+    return route53_search(access_token, sso_region, "Name", hostname + ".", mode=mode, accounts=accounts)
+
+
+def _trace_cloudfront_stage(
+    access_token: str,
+    sso_region: str,
+    max_workers: int,
+    account_timeout: float,
+    on_account: Callable[[Dict, List[Dict]], None] | None,
+    mode: str,
+) -> SearchResults:
+    """Lists every distribution, live or from the inventory, for the join."""
+    if mode == "index":
+        sso_client = client_pool.client("sso", sso_region)
+        account_ids = [account["accountId"] for account in _list_accounts(sso_client, access_token)]
+        return SearchResults(inventory.cloudfront_items(account_ids), meta={"snapshot": inventory.snapshot_info("cloudfront")})
+
+    sso_client = client_pool.client("sso", sso_region)
+    accounts = _list_accounts(sso_client, access_token)
+
+    def scan(account: Dict, deadline: Deadline) -> List[Dict]:
+        return _scan_cloudfront_account(sso_client, access_token, account, lambda dist: True, deadline)
+
+    return _fan_out(accounts, scan, max_workers, account_timeout, on_account)
+
+
+def trace_hostname(
+    access_token: str,
+    sso_region: str,
+    hostname: str,
+    max_workers: int = SEARCH_MAX_WORKERS,
+    account_timeout: float = ACCOUNT_TIMEOUT,
+    on_account: Callable[[Dict, List[Dict]], None] | None = None,
+    mode: str = "live",
+    accounts: str | None = None,
+) -> SearchResults:
+    """Traces where a hostname is served from: DNS record, CloudFront, origins.
+
+    The CloudFront scan of every account starts right away in a background
+    thread while the Route53 records named ``hostname`` are looked up in the
+    ``accounts`` of ``route53_search``, so the trace takes about as long as the slower of the two. Only the hosted zones
+    whose name is a suffix of the hostname are paged. Records are then joined
+    with distributions on the record's target (CNAME value or
+    ``AliasTarget.DNSName``) against the distribution ``DomainName``;
+    distributions that list the hostname as an alias, wildcards included,
+    are reported too. CNAME chains are followed for one hop only.
+
+    Returns one entry per hop with ``record``, ``target``, ``distribution``
+    (or ``None``), ``account_name``/``account_id``, ``origins`` and
+    ``matched_by`` ("domain" or "alias"). ``results.meta`` holds the
+    Route53 ``records``, the CloudFront ``accounts`` statuses and the
+    ``timings`` of each stage.
+    """
+    hostname = _dns_name(hostname)
+    started = time.monotonic()
+    timings: Dict[str, float] = {}
+
+    def timed(stage: str, func, *args):
+        stage_started = time.monotonic()
+        try:
+            with span(stage, "stage"):
+                return func(*args)
+        finally:
+            timings[stage] = round(time.monotonic() - stage_started, 3)
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace") as pipeline:
+        cloudfront_stage = pipeline.submit(
+            run_in_context(timed), "cloudfront", _trace_cloudfront_stage,
+            access_token, sso_region, max_workers, account_timeout, on_account, mode,
+        )
+        records = timed("route53", _trace_route53_stage, access_token, sso_region, hostname, mode, accounts)
+        distributions = cloudfront_stage.result()
+
+    by_domain = {_dns_name(item["distribution"].get("DomainName", "")): item for item in distributions}
+
+    def hop(item: Dict | None, matched_by: str, record: Dict | None, target: str | None) -> Dict:
+        dist = item["distribution"] if item else None
+        return {
+            "hostname": hostname,
+            "record": record,
+            "target": target,
+            "matched_by": matched_by if item else None,
+            "account_name": item["account_name"] if item else None,
+            "account_id": item["account_id"] if item else None,
+            "distribution": dist,
+            "origins": [origin.get("DomainName") for origin in dist.get("Origins", {}).get("Items", [])] if dist else [],
+        }
+
+    results = SearchResults()
+    joined = set()
+    for record in records:
+        for target in _record_targets(record["record"]):
+            item = by_domain.get(target)
+            if item:
+                joined.add(item["distribution"].get("Id"))
+            results.append(hop(item, "domain", record, target))
+    for item in distributions:
+        aliases = item["distribution"].get("Aliases", {}).get("Items", [])
+        if item["distribution"].get("Id") not in joined and any(_alias_covers(alias, hostname) for alias in aliases):
+            results.append(hop(item, "alias", None, None))
+
+    timings["total"] = round(time.monotonic() - started, 3)
+    results.meta.update(
+        records=list(records),
+        accounts=distributions.meta.get("accounts", []),
+        timings=timings,
+    )
+    for key in ("error", "snapshot"):
+        if key in records.meta:
+            results.meta[f"route53_{key}"] = records.meta[key]
+    if "snapshot" in distributions.meta:
+        results.meta["cloudfront_snapshot"] = distributions.meta["snapshot"]
+    if mode == "live":
+        results.meta["clients"] = client_pool.stats()
+        results.meta["rate_limits"] = rate_limiters.stats()
+    return results
+
+
+def _static_credentials(access_key: str, secret_key: str, session_token: str | None) -> Dict:
+    return {"accessKeyId": access_key, "secretAccessKey": secret_key, "sessionToken": session_token}
+
+
 def cloudfront_search_creds(
     access_key: str,
     secret_key: str,
     session_token: str | None,
     search_type: str,
     search_value: str,
+    fields: List[str] | None = None,
 ) -> List[Dict]:
-    """Searches CloudFront distributions using provided credentials."""
-    results: List[Dict] = []
-    client = boto3.client(
-        "cloudfront",
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        aws_session_token=session_token,
-    )
-    paginator = client.get_paginator("list_distributions")
-    for page in paginator.paginate():
-        distributions = page.get("DistributionList", {})
-        if "Items" not in distributions:
-            continue
-        for dist in distributions.get("Items", []):
-            match = False
-            if search_type == "Id" and dist.get("Id") == search_value:
-                match = True
-            elif search_type == "DomainName" and dist.get("DomainName") == search_value:
-                match = True
-            elif search_type == "Aliases" and search_value in dist.get("Aliases", {}).get("Items", []):
-                match = True
-            if match:
-                results.append({"distribution": dist})
+    """Searches CloudFront distributions using provided credentials.
+
+    Id searches fetch the distribution directly, as in ``cloudfront_search``;
+    ``results.meta["plan"]`` reports the plan and its API calls.
+    """
+    project = projector("cloudfront", fields)
+    # The inventory holds the SSO accounts and says nothing about these credentials.
+    plan = plan_cloudfront_search(search_type, search_value, use_inventory=False)
+    client = client_pool.client("cloudfront", credentials=_static_credentials(access_key, secret_key, session_token))
+    results = SearchResults({"distribution": project(dist)} for dist in plan.read(client))
+    results.meta["plan"] = plan.describe()
     return results
 
 
@@ -224,31 +2103,437 @@ def route53_search_creds(
     session_token: str | None,
     search_type: str,
     search_value: str,
+    fields: List[str] | None = None,
 ) -> List[Dict]:
     """Searches Route53 records using provided credentials."""
+    plan = plan_route53_search(search_type, search_value)
+    project = projector("route53", fields)
     results: List[Dict] = []
-    client = boto3.client(
-        "route53",
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        aws_session_token=session_token,
-    )
+    client = client_pool.client("route53", credentials=_static_credentials(access_key, secret_key, session_token))
 
-    hosted_zones = client.list_hosted_zones().get("HostedZones", [])
-    for zone in hosted_zones:
-        zone_id = zone["Id"]
-        zone_name = zone["Name"]
-        paginator = client.get_paginator("list_resource_record_sets")
-        for page in paginator.paginate(HostedZoneId=zone_id):
-            for record in page.get("ResourceRecordSets", []):
-                match = False
-                if search_type == "Name" and search_value.lower() in record.get("Name", "").lower():
-                    match = True
-                elif search_type == "Value":
-                    for rr in record.get("ResourceRecords", []):
-                        if search_value.lower() in rr.get("Value", "").lower():
-                            match = True
-                            break
-                if match:
-                    results.append({"zone_name": zone_name, "record": record})
+    for zone in plan.zones(_list_hosted_zones(client)):
+        results.extend(_project(plan.read(client, zone), "record", project))
+    return results
+
+
+# --- Batch search -------------------------------------------------------------
+#
+# A batch search looks for many values in a single scan of every account or
+# zone. CloudFront values are exact keys looked up in a set; Route53 values are
+# substrings matched all together by an Aho-Corasick automaton. Results are
+# grouped by input value, in input order, including the values not found.
+
+
+def parse_batch_values(text: str) -> List[str]:
+    """Reads the values of a batch search from a text or CSV file.
+
+    Takes the first column of each line, skips blank lines and ``#``
+    comments, and drops duplicates while keeping the input order.
+    """
+    values: List[str] = []
+    seen = set()
+    for row in csv.reader(text.splitlines()):
+        if not row:
+            continue
+        value = row[0].strip()
+        if not value or value.startswith("#") or value in seen:
+            continue
+        seen.add(value)
+        values.append(value)
+    return values
+
+
+def _batch_getter(resource: str, search_type: str) -> Callable[[Dict], List]:
+    if search_type not in SEARCH_TYPES[resource]:
+        return lambda item: []
+    getters = [field_getter(resource, field) for field in SEARCH_TYPES[resource][search_type][0]]
+    if len(getters) == 1:
+        return getters[0]
+    return lambda item: [value for get in getters for value in get(item)]
+
+
+def _cloudfront_batch_matcher(search_type: str, values: List[str]) -> Callable[[Dict], set]:
+    """Returns a function giving the input values a distribution matches."""
+    get = _batch_getter("cloudfront", search_type)
+    wanted = set(values)
+    return lambda dist: wanted.intersection(get(dist))
+
+
+def _route53_batch_matcher(search_type: str, values: List[str]) -> Callable[[Dict], set]:
+    """Returns a function giving the input values contained in a record."""
+    get = _batch_getter("route53", search_type)
+    automaton = AhoCorasick(values)
+
+    def matched(record: Dict) -> set:
+        found = set()
+        for text in get(record):
+            found |= automaton.search(str(text))
+        return found
+
+    return matched
+
+
+def _group_batch(values: List[str], matches: List[tuple[Dict, set]], meta: Dict | None = None) -> SearchResults:
+    """Groups ``(result, matched values)`` pairs by input value."""
+    groups: Dict[str, List[Dict]] = {value: [] for value in values}
+    for item, hits in matches:
+        for value in hits:
+            groups[value].append(item)
+    results = SearchResults(({"value": value, "results": groups[value]} for value in values), meta=meta)
+    results.meta["not_found"] = [value for value in values if not groups[value]]
+    return results
+
+
+def cloudfront_batch_search(
+    access_token: str,
+    sso_region: str,
+    search_type: str,
+    values: List[str],
+    max_workers: int = SEARCH_MAX_WORKERS,
+    account_timeout: float = ACCOUNT_TIMEOUT,
+    on_account: Callable[[Dict, List[Dict]], None] | None = None,
+    mode: str = "live",
+) -> SearchResults:
+    """Searches CloudFront for many values with one scan of each account.
+
+    Returns one ``{"value", "results"}`` group per input value, in input
+    order; ``results.meta["not_found"]`` lists the values without any match.
+    Id and DomainName searches stop once every value was found.
+    """
+    matcher = _cloudfront_batch_matcher(search_type, values)
+    if mode == "index":
+        sso_client = client_pool.client("sso", sso_region)
+        account_ids = [account["accountId"] for account in _list_accounts(sso_client, access_token)]
+        matches = [
+            (item, {value})
+            for value in values
+            for item in inventory.cloudfront_lookup(search_type, value, account_ids)
+        ]
+        return _group_batch(values, matches, meta={"snapshot": inventory.snapshot_info("cloudfront")})
+
+    sso_client = client_pool.client("sso", sso_region)
+    accounts = _list_accounts(sso_client, access_token)
+    limit = len(values) if search_type in ("Id", "DomainName") else 0
+
+    def scan(account: Dict, deadline: Deadline) -> List[Dict]:
+        return _scan_cloudfront_account(
+            sso_client, access_token, account,
+            lambda dist: bool(matcher(dist)),
+            deadline,
+            limit,
+        )
+
+    found = _fan_out(accounts, scan, max_workers, account_timeout, on_account, limit)
+    results = _group_batch(values, [(item, matcher(item["distribution"])) for item in found], meta=found.meta)
+    results.meta["clients"] = client_pool.stats()
+    results.meta["rate_limits"] = rate_limiters.stats()
+    return results
+
+
+def route53_batch_search(
+    access_token: str,
+    sso_region: str,
+    search_type: str,
+    values: List[str],
+    on_zone: Callable[[Dict], None] | None = None,
+    mode: str = "live",
+    accounts: str | None = None,
+) -> SearchResults:
+    """Searches Route53 for many values with one pass over each hosted zone.
+
+    Every record is matched against all the values at once. The accounts
+    are chosen and scanned as in ``route53_search``. Returns one
+    ``{"value", "results"}`` group per input value, in input order;
+    ``results.meta["not_found"]`` lists the values without any match.
+    """
+    matcher = _route53_batch_matcher(search_type, values)
+    sso_client = client_pool.client("sso", sso_region)
+    selection = ROUTE53_ACCOUNTS if accounts is None else accounts
+    targets = _route53_accounts(_list_accounts(sso_client, access_token), selection)
+    if mode == "index":
+        account_ids = [account["accountId"] for account in targets]
+        matches = [
+            (item, {value})
+            for value in values
+            for item in inventory.route53_lookup(search_type, value, account_ids)
+        ]
+        return _group_batch(values, matches, meta={"snapshot": inventory.snapshot_info("route53")})
+
+    plan = Route53Plan(lambda record: bool(matcher(record)))
+
+    def scan(account: Dict, deadline: Deadline) -> List[Dict]:
+        return _scan_route53_account(sso_client, access_token, account, plan, ROUTE53_ZONE_WORKERS, deadline, on_zone)
+
+    found = _fan_out(targets, scan, SEARCH_MAX_WORKERS, ROUTE53_ACCOUNT_TIMEOUT)
+    results = _group_batch(values, [(item, matcher(item["record"])) for item in found], meta=found.meta)
+    if not any(status["status"] == "ok" for status in results.meta["accounts"]):
+        results.meta["error"] = _route53_accounts_error(selection)
+    results.meta["clients"] = client_pool.stats()
+    results.meta["rate_limits"] = rate_limiters.stats()
+    return results
+
+
+def cloudfront_batch_search_creds(
+    access_key: str,
+    secret_key: str,
+    session_token: str | None,
+    search_type: str,
+    values: List[str],
+) -> SearchResults:
+    """Batch CloudFront search using provided credentials."""
+    matcher = _cloudfront_batch_matcher(search_type, values)
+    client = client_pool.client("cloudfront", credentials=_static_credentials(access_key, secret_key, session_token))
+    matches = []
+    paginator = client.get_paginator("list_distributions")
+    for page in paginator.paginate():
+        for dist in page.get("DistributionList", {}).get("Items", []):
+            hits = matcher(dist)
+            if hits:
+                matches.append(({"distribution": dist}, hits))
+    return _group_batch(values, matches)
+
+
+def route53_batch_search_creds(
+    access_key: str,
+    secret_key: str,
+    session_token: str | None,
+    search_type: str,
+    values: List[str],
+) -> SearchResults:
+    """Batch Route53 search using provided credentials."""
+    matcher = _route53_batch_matcher(search_type, values)
+    client = client_pool.client("route53", credentials=_static_credentials(access_key, secret_key, session_token))
+    matches = []
+    for zone in _list_hosted_zones(client):
+        for item in _scan_route53_zone(client, zone, lambda record: bool(matcher(record))):
+            matches.append((item, matcher(item["record"])))
+    return _group_batch(values, matches)
+
+
+# --- Async search engine ----------------------------------------------------
+#
+# boto3 is blocking, so the async engine runs every per-account or per-zone
+# scan on a thread pool shared by all searches of the process and only awaits
+# the results. The event loop itself never blocks, which lets one ASGI worker
+# serve many concurrent searches.
+
+_ASYNC_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("AWS_MANAGER_ASYNC_THREADS", "64")),
+    thread_name_prefix="aws-search",
+)
+
+
+async def _run_blocking(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_ASYNC_EXECUTOR, functools.partial(run_in_context(func), *args, **kwargs))
+
+
+async def cloudfront_search_events(
+    access_token: str,
+    sso_region: str,
+    search_type: str,
+    search_value: str,
+    max_workers: int = SEARCH_MAX_WORKERS,
+    account_timeout: float = ACCOUNT_TIMEOUT,
+    limit: int | None = None,
+    fields: List[str] | None = None,
+) -> AsyncIterator[Dict]:
+    """Async counterpart of ``cloudfront_search`` yielding events as accounts finish.
+
+    Yields ``{"event": "start", "accounts": n}``, then for every account its
+    ``"match"`` events followed by one ``"account_done"`` event, and finally
+    ``{"event": "end", "found": n}``. Reaching ``limit`` (see
+    ``cloudfront_search``) or closing the generator cancels the remaining
+    accounts, including the scans already running.
+
+    Id searches fetch the distribution directly; DomainName searches list,
+    since falling back from a stale inventory would restart the stream. The
+    ``end`` event carries the ``plan``.
+    """
+    plan = plan_cloudfront_search(search_type, search_value, _default_limit(search_type, limit), use_inventory=False)
+    project = projector("cloudfront", fields)
+    limit = plan.limit
+    sso_client = await _run_blocking(client_pool.client, "sso", sso_region)
+    accounts = await _run_blocking(_list_accounts, sso_client, access_token)
+    yield {"event": "start", "accounts": len(accounts)}
+
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+
+    def scan(account: Dict, deadline: Deadline) -> List[Dict]:
+        return _project(plan.scan(sso_client, access_token, account, deadline), "distribution", project)
+
+    cancel = threading.Event()
+
+    async def run(account: Dict) -> tuple[Dict, List[Dict]]:
+        async with semaphore:
+            return await _run_blocking(_run_account_scan, scan, account, account_timeout, cancel)
+
+    found = 0
+    tasks = [asyncio.ensure_future(run(account)) for account in accounts]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            status, items = await next_done
+            for item in items[:limit - found] if limit else items:
+                found += 1
+                yield {"event": "match", **item}
+            yield {"event": "account_done", **status}
+            if limit and found >= limit:
+                break
+    finally:
+        cancel.set()
+        for task in tasks:
+            task.cancel()
+    yield {"event": "end", "found": found, "stopped_early": bool(limit) and found >= limit, "plan": plan.describe()}
+
+
+async def route53_search_events(
+    access_token: str,
+    sso_region: str,
+    search_type: str,
+    search_value: str,
+    fields: List[str] | None = None,
+    accounts: str | None = None,
+    max_workers: int = SEARCH_MAX_WORKERS,
+    zone_workers: int = ROUTE53_ZONE_WORKERS,
+    account_timeout: float = ROUTE53_ACCOUNT_TIMEOUT,
+) -> AsyncIterator[Dict]:
+    """Async counterpart of ``route53_search`` yielding events as zones finish.
+
+    Yields ``{"event": "start", "accounts": n}``, then as each zone of any
+    account finishes its ``"match"`` events and one ``"zone_done"`` event,
+    one ``"account_done"`` event per account, and finally ``"end"`` with
+    the ``plan``. Closing the generator cancels the remaining accounts.
+    """
+    plan = plan_route53_search(search_type, search_value)
+    project = projector("route53", fields)
+    sso_client = await _run_blocking(client_pool.client, "sso", sso_region)
+    selection = ROUTE53_ACCOUNTS if accounts is None else accounts
+    targets = _route53_accounts(await _run_blocking(_list_accounts, sso_client, access_token), selection)
+    yield {"event": "start", "accounts": len(targets)}
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+    cancel = threading.Event()
+
+    def scan(account: Dict, deadline: Deadline) -> List[Dict]:
+        def zone_done(zone: Dict, items: List[Dict]) -> None:
+            loop.call_soon_threadsafe(queue.put_nowait, ("zone", account, zone, items))
+
+        return _scan_route53_account(sso_client, access_token, account, plan, zone_workers, deadline, on_zone_done=zone_done)
+
+    async def run(account: Dict) -> None:
+        async with semaphore:
+            status, _ = await _run_blocking(_run_account_scan, scan, account, account_timeout, cancel)
+        queue.put_nowait(("account", account, status, None))
+
+    found = 0
+    # A zone read again under another role after a failure is only reported once.
+    reported = set()
+    tasks = [asyncio.ensure_future(run(account)) for account in targets]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            kind, account, detail, items = await queue.get()
+            if kind == "account":
+                remaining -= 1
+                yield {"event": "account_done", **detail}
+                continue
+            if (account["accountId"], detail["Id"]) in reported:
+                continue
+            reported.add((account["accountId"], detail["Id"]))
+            for item in _project(items, "record", project):
+                found += 1
+                yield {"event": "match", **item}
+            yield {"event": "zone_done", "zone_name": detail["Name"], "account_id": account["accountId"]}
+    finally:
+        cancel.set()
+        for task in tasks:
+            task.cancel()
+    yield {"event": "end", "found": found, "plan": plan.describe()}
+
+
+async def blocking_search_events(search: Callable[..., List[Dict]], *args, **kwargs) -> AsyncIterator[Dict]:
+    """Streams the results of a blocking search function once it returns.
+
+    Used for single-account ``*_search_creds`` searches and inventory lookups,
+    where there are no per-account events to report.
+    """
+    yield {"event": "start", "accounts": 1}
+    results = await _run_blocking(search, *args, **kwargs)
+    for item in results:
+        yield {"event": "match", **item}
+    end = {"event": "end", "found": len(results)}
+    if getattr(results, "meta", {}).get("snapshot") is not None:
+        end["snapshot"] = results.meta["snapshot"]
+    yield end
+
+
+def _replayed_events(results: SearchResults) -> Iterator[Dict]:
+    """The events of a finished search, for results served by ``search_cache``."""
+    statuses = results.meta.get("accounts", [])
+    yield {"event": "start", "accounts": len(statuses) or 1}
+    for item in results:
+        yield {"event": "match", **item}
+    for status in statuses:
+        yield {"event": "account_done", **status}
+    end = {"event": "end", "found": len(results), "cache": results.meta["cache"]}
+    for key in ("snapshot", "stopped_early"):
+        if results.meta.get(key) is not None:
+            end[key] = results.meta[key]
+    yield end
+
+
+async def cached_search_events(key: tuple, events: AsyncIterator[Dict]) -> AsyncIterator[Dict]:
+    """Streams ``events`` through ``search_cache``, like ``SearchCache.run`` for blocking searches.
+
+    A cached or coalesced search replays its results at once. Otherwise the
+    events stream live and the finished search is shared; the ``end`` event
+    carries ``cache`` in every case.
+    """
+    status, claimed = await _run_blocking(search_cache.claim, key)
+    if status != "miss":
+        await events.aclose()
+        for event in _replayed_events(claimed):
+            yield event
+        return
+
+    items: List[Dict] = []
+    meta: Dict = {"accounts": []}
+    try:
+        async for event in events:
+            fields = {name: value for name, value in event.items() if name != "event"}
+            if event["event"] == "match":
+                items.append(fields)
+            elif event["event"] == "account_done":
+                meta["accounts"].append(fields)
+            elif event["event"] == "end":
+                fields.pop("found", None)
+                meta.update(fields)
+                search_cache.finish(key, claimed, SearchResults(items, meta))
+                event = dict(event, cache={"status": "miss"})
+            yield event
+    except Exception as e:
+        search_cache.finish(key, claimed, error=e)
+        raise
+    finally:
+        # Closed early, or ended without an ``end`` event.
+        if not claimed.done.is_set():
+            search_cache.finish(key, claimed)
+
+
+async def cloudfront_search_async(*args, **kwargs) -> SearchResults:
+    """Awaitable ``cloudfront_search``, merged in account name order."""
+    per_account: Dict[str, List[Dict]] = {}
+    statuses: List[Dict] = []
+    async for event in cloudfront_search_events(*args, **kwargs):
+        if event["event"] == "match":
+            item = {k: v for k, v in event.items() if k != "event"}
+            per_account.setdefault(item["account_id"], []).append(item)
+        elif event["event"] == "account_done":
+            statuses.append({k: v for k, v in event.items() if k != "event"})
+    statuses.sort(key=lambda x: x["account_name"])
+    results = SearchResults(meta={"accounts": statuses, "clients": client_pool.stats(), "rate_limits": rate_limiters.stats()})
+    for status in statuses:
+        results.extend(per_account.get(status["account_id"], []))
     return results
@@ -0,0 +1,235 @@
+"""Long-running search server for the CLI, over a local Unix socket.
+
+``aws-manager.py daemon start`` runs ``serve()`` in the background. The
+daemon keeps everything a cold CLI run would rebuild: the SSO token, role
+credentials, pooled clients, the local inventory, and the recent results in
+``search_cache``. Later subcommands send it their search instead of
+starting Python with boto3 and scanning again.
+
+The protocol is one JSON request line per connection, answered by JSON event
+lines:
+
+- ``{"event": "start", "columns": [...]}``;
+- one ``{"event": "match", "item": ..., "row": ...}`` per result, where
+  ``row`` is the compact row of ``resultsets.py`` when the request asked for
+  ``"rows": true``;
+- ``{"event": "account_done", "status": ...}`` per account;
+- ``{"event": "end", "found": n, "meta": ...}``, or
+  ``{"event": "failed", "kind": "query" | "login" | "error", "error": ...}``.
+
+CloudFront and Route53 matches are sent as each account finishes. The socket is only
+accessible to its owner.
+"""
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from . import aws_manager_core as core
+from .query import QueryError
+from .resultsets import COLUMNS, compact_row
+
+DAEMON_IDLE_TIMEOUT = float(os.environ.get("AWS_MANAGER_DAEMON_IDLE_TIMEOUT", "28800"))
+# How long the SSO token read from the caches is reused before checking them again.
+LOGIN_CHECK_INTERVAL = 60
+
+
+class LoginRequired(Exception):
+    """Raised when no cached SSO token is usable; the daemon cannot run the device flow."""
+
+
+class SearchDaemon:
+    """Answers the requests of one daemon process."""
+
+    def __init__(self, login: Callable[[], tuple[str, str] | None]):
+        self._login = login
+        self._session: tuple[str, str] | None = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.last_request = time.time()
+        self.requests = 0
+
+    def session(self) -> tuple[str, str]:
+        """The ``(access_token, sso_region)`` of the daemon, re-read from the caches once a minute."""
+        with self._lock:
+            if self._session is None or time.time() - self._checked_at > LOGIN_CHECK_INTERVAL:
+                self._session = self._login()
+                self._checked_at = time.time()
+            if self._session is None:
+                raise LoginRequired("no cached SSO token, log in with aws-manager.py first")
+            return self._session
+
+    def status(self) -> Dict:
+        return {
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "search_cache": core.search_cache.stats(),
+            "clients": core.client_pool.stats(),
+        }
+
+    def handle(self, request: Dict, send: Callable[[Dict], None]) -> None:
+        self.requests += 1
+        self.last_request = time.time()
+        command = request.get("command")
+        if command == "status":
+            send({"event": "status", **self.status()})
+        elif command in ("cloudfront", "route53", "trace"):
+            try:
+                self._search(command, request, send)
+            except QueryError as e:
+                send({"event": "failed", "kind": "query", "error": str(e)})
+            except LoginRequired as e:
+                send({"event": "failed", "kind": "login", "error": str(e)})
+            except Exception as e:
+                send({"event": "failed", "kind": "error", "error": str(e)})
+        else:
+            send({"event": "failed", "kind": "error", "error": f"unknown command '{command}'"})
+
+    def _search(self, command: str, request: Dict, send: Callable[[Dict], None]) -> None:
+        access_token, sso_region = self.session()
+        identity = hashlib.sha256(access_token.encode()).hexdigest()
+        source = request.get("source", "live")
+        fields = request.get("fields")
+        limit = request.get("limit")
+        rows = request.get("rows", False)
+        state = {"found": 0, "streamed": False, "gone": False}
+
+        def send_items(items: List[Dict]) -> None:
+            for item in items:
+                if limit and state["found"] >= limit:
+                    return
+                state["found"] += 1
+                event = {"event": "match", "item": item}
+                if rows:
+                    event["row"] = compact_row(command, item)
+                send(event)
+
+        def on_account(status: Dict, items: List[Dict]) -> None:
+            # Runs inside the shared search, which coalesced clients wait on:
+            # a client going away must not abort it.
+            state["streamed"] = True
+            if state["gone"]:
+                return
+            try:
+                send_items(items)
+                send({"event": "account_done", "status": status})
+            except (BrokenPipeError, ConnectionResetError):
+                state["gone"] = True
+
+        send({"event": "start", "columns": COLUMNS[command]})
+        if command == "cloudfront":
+            key = core.search_key(identity, command, request["search_type"], request["search_value"], mode=source, fields=fields, limit=limit)
+            results = core.search_cache.run(
+                key, core.cloudfront_search, access_token, sso_region, request["search_type"], request["search_value"],
+                on_account=on_account, mode=source, limit=limit, fields=fields,
+            )
+        elif command == "route53":
+            accounts = request.get("accounts")
+            key = core.search_key(identity, command, request["search_type"], request["search_value"], mode=source, fields=fields, accounts=accounts)
+            results = core.search_cache.run(
+                key, core.route53_search, access_token, sso_region, request["search_type"], request["search_value"],
+                on_account=on_account, mode=source, fields=fields, accounts=accounts,
+            )
+        else:
+            accounts = request.get("accounts")
+            key = core.search_key(identity, command, None, request["search_value"], mode=source, accounts=accounts)
+            results = core.search_cache.run(
+                key, core.trace_hostname, access_token, sso_region, request["search_value"], mode=source, accounts=accounts,
+            )
+
+        if state["gone"]:
+            return
+        # Cached, coalesced and non-streamed searches send everything at the end.
+        if not state["streamed"]:
+            send_items(results)
+            for status in results.meta.get("accounts", []):
+                send({"event": "account_done", "status": status})
+        meta = {key: value for key, value in results.meta.items() if key != "accounts"}
+        send({"event": "end", "found": state["found"], "meta": meta})
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        try:
+            request = json.loads(self.rfile.readline() or b"{}")
+        except ValueError:
+            request = {}
+
+        def send(event: Dict) -> None:
+            self.wfile.write(json.dumps(event, default=str).encode() + b"\n")
+            self.wfile.flush()
+
+        try:
+            if request.get("command") == "stop":
+                send({"event": "stopped"})
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+            else:
+                self.server.daemon.handle(request, send)
+        except (BrokenPipeError, ConnectionResetError):
+            # The CLI went away, for example ``| head``.
+            pass
+
+
+class DaemonRunning(Exception):
+    """Raised by ``serve()`` when another daemon already answers on the socket."""
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def _answers(path: Path) -> bool:
+    """Whether a server accepts connections on the Unix socket ``path``."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(1)
+    try:
+        sock.connect(str(path))
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def serve(path: Path, login: Callable[[], tuple[str, str] | None], idle_timeout: float = DAEMON_IDLE_TIMEOUT) -> None:
+    """Serves requests on the Unix socket ``path`` until stopped or idle for ``idle_timeout`` seconds.
+
+    Raises ``DaemonRunning`` when a daemon already answers on ``path``; a
+    socket file nobody answers on is left over from a crash and replaced.
+    """
+    path = Path(path)
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if path.exists():
+        if _answers(path):
+            raise DaemonRunning(f"a daemon is already serving on {path}")
+        path.unlink()
+    # Only the owner may connect: the daemon searches with their SSO session.
+    umask = os.umask(0o177)
+    try:
+        server = _Server(str(path), _Handler)
+    finally:
+        os.umask(umask)
+    server.daemon = SearchDaemon(login)
+
+    def watch_idle() -> None:
+        while not stopped.wait(min(60, idle_timeout)):
+            if time.time() - server.daemon.last_request > idle_timeout:
+                server.shutdown()
+                return
+
+    stopped = threading.Event()
+    threading.Thread(target=watch_idle, daemon=True).start()
+    try:
+        server.serve_forever()
+    finally:
+        stopped.set()
+        server.server_close()
+        if path.exists():
+            path.unlink()
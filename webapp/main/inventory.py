@@ -0,0 +1,356 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+INVENTORY_DB = os.environ.get(
+    "AWS_MANAGER_INVENTORY_DB",
+    str(Path(__file__).resolve().parent.parent / "inventory.sqlite3"),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    resource TEXT NOT NULL,
+    account_id TEXT NOT NULL,
+    account_name TEXT NOT NULL,
+    refreshed_at REAL NOT NULL,
+    PRIMARY KEY (resource, account_id)
+);
+CREATE TABLE IF NOT EXISTS cloudfront_distributions (
+    account_id TEXT NOT NULL,
+    account_name TEXT NOT NULL,
+    id TEXT NOT NULL,
+    domain_name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (account_id, id)
+);
+CREATE INDEX IF NOT EXISTS cloudfront_distributions_id ON cloudfront_distributions (id);
+CREATE INDEX IF NOT EXISTS cloudfront_distributions_domain ON cloudfront_distributions (domain_name);
+CREATE TABLE IF NOT EXISTS cloudfront_aliases (
+    alias TEXT NOT NULL,
+    account_id TEXT NOT NULL,
+    distribution_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cloudfront_aliases_alias ON cloudfront_aliases (alias);
+CREATE INDEX IF NOT EXISTS cloudfront_aliases_account ON cloudfront_aliases (account_id);
+CREATE TABLE IF NOT EXISTS route53_records (
+    id INTEGER PRIMARY KEY,
+    account_id TEXT NOT NULL,
+    account_name TEXT NOT NULL,
+    zone_id TEXT NOT NULL,
+    zone_name TEXT NOT NULL,
+    name TEXT NOT NULL,
+    search_values TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS route53_records_zone ON route53_records (account_id, zone_id);
+CREATE TABLE IF NOT EXISTS route53_trigrams (
+    trigram TEXT NOT NULL,
+    field TEXT NOT NULL,
+    record_id INTEGER NOT NULL,
+    PRIMARY KEY (trigram, field, record_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS route53_trigrams_record ON route53_trigrams (record_id);
+CREATE TABLE IF NOT EXISTS route53_zones (
+    account_id TEXT NOT NULL,
+    zone_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    record_count INTEGER NOT NULL,
+    comment TEXT NOT NULL,
+    private INTEGER NOT NULL,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (account_id, zone_id)
+);
+"""
+
+# Fields of the Route 53 trigram index.
+NAME_FIELD = "N"
+VALUE_FIELD = "V"
+
+
+def zone_fingerprint(zone: Dict) -> tuple:
+    """The cheap ``list_hosted_zones`` metadata compared by incremental syncs."""
+    config = zone.get("Config", {})
+    return (
+        zone["Name"],
+        zone.get("ResourceRecordSetCount", 0),
+        config.get("Comment", ""),
+        int(config.get("PrivateZone", False)),
+    )
+
+
+def trigrams(text: str) -> set[str]:
+    """Returns the set of 3-character substrings of ``text``."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class Inventory:
+    """Local SQLite snapshot of AWS resources, refreshed one account at a time.
+
+    Every method opens its own connection, so an instance can be shared by
+    the worker threads that refresh accounts concurrently.
+    """
+
+    def __init__(self, path: str = INVENTORY_DB):
+        self.path = path
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        if not self._schema_ready:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+        return conn
+
+    def replace_cloudfront_account(self, account: Dict, distributions: Iterable[Dict]) -> int:
+        """Replaces the snapshot of one account with ``distributions``."""
+        account_id = account["accountId"]
+        count = 0
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM cloudfront_distributions WHERE account_id = ?", (account_id,))
+                conn.execute("DELETE FROM cloudfront_aliases WHERE account_id = ?", (account_id,))
+                for dist in distributions:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO cloudfront_distributions VALUES (?, ?, ?, ?, ?)",
+                        (account_id, account["accountName"], dist["Id"], dist.get("DomainName", ""), json.dumps(dist, default=str)),
+                    )
+                    conn.executemany(
+                        "INSERT INTO cloudfront_aliases VALUES (?, ?, ?)",
+                        [(alias, account_id, dist["Id"]) for alias in dist.get("Aliases", {}).get("Items", [])],
+                    )
+                    count += 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO snapshots VALUES ('cloudfront', ?, ?, ?)",
+                    (account_id, account["accountName"], time.time()),
+                )
+        finally:
+            conn.close()
+        return count
+
+    def cloudfront_lookup(self, search_type: str, search_value: str, account_ids: Iterable[str] | None = None) -> List[Dict]:
+        """Answers an Id, DomainName or Aliases search from the snapshot."""
+        source = "cloudfront_distributions d"
+        if search_type == "Id":
+            where, args = "d.id = ?", [search_value]
+        elif search_type == "DomainName":
+            where, args = "d.domain_name = ?", [search_value]
+        elif search_type == "Aliases":
+            source = "cloudfront_aliases a JOIN cloudfront_distributions d ON d.account_id = a.account_id AND d.id = a.distribution_id"
+            where, args = "a.alias = ?", [search_value]
+        else:
+            return []
+        if account_ids is not None:
+            account_ids = list(account_ids)
+            where += f" AND d.account_id IN ({', '.join('?' * len(account_ids))})"
+            args += account_ids
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT d.account_id, d.account_name, d.data FROM {source} WHERE {where} ORDER BY d.account_name, d.id",
+                args,
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            {"account_name": row["account_name"], "account_id": row["account_id"], "distribution": json.loads(row["data"])}
+            for row in rows
+        ]
+
+    def cloudfront_items(self, account_ids: Iterable[str] | None = None) -> List[Dict]:
+        """Returns every distribution of the snapshot, for queries no index can answer."""
+        where, args = "", []
+        if account_ids is not None:
+            account_ids = list(account_ids)
+            where, args = f" WHERE account_id IN ({', '.join('?' * len(account_ids))})", account_ids
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT account_id, account_name, data FROM cloudfront_distributions{where} ORDER BY account_name, id",
+                args,
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            {"account_name": row["account_name"], "account_id": row["account_id"], "distribution": json.loads(row["data"])}
+            for row in rows
+        ]
+
+    def replace_route53_zone(self, account: Dict, zone: Dict, records: Iterable[Dict]) -> int:
+        """Replaces the records of one hosted zone and their trigram postings."""
+        account_id = account["accountId"]
+        count = 0
+        conn = self._connect()
+        try:
+            with conn:
+                self._delete_route53_zone(conn, account_id, zone["Id"])
+                for record in records:
+                    name = record.get("Name", "").lower()
+                    values = [rr.get("Value", "").lower() for rr in record.get("ResourceRecords", [])]
+                    if record.get("AliasTarget", {}).get("DNSName"):
+                        values.append(record["AliasTarget"]["DNSName"].lower())
+                    cursor = conn.execute(
+                        "INSERT INTO route53_records (account_id, account_name, zone_id, zone_name, name, search_values, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (account_id, account["accountName"], zone["Id"], zone["Name"], name, json.dumps(values), json.dumps(record, default=str)),
+                    )
+                    postings = [(t, NAME_FIELD, cursor.lastrowid) for t in trigrams(name)]
+                    postings += [(t, VALUE_FIELD, cursor.lastrowid) for t in set().union(*map(trigrams, values))]
+                    conn.executemany("INSERT INTO route53_trigrams VALUES (?, ?, ?)", postings)
+                    count += 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO route53_zones VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (account_id, zone["Id"], *zone_fingerprint(zone), time.time()),
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO snapshots VALUES ('route53', ?, ?, ?)",
+                    (account_id, account["accountName"], time.time()),
+                )
+        finally:
+            conn.close()
+        return count
+
+    @staticmethod
+    def _delete_route53_zone(conn: sqlite3.Connection, account_id: str, zone_id: str) -> None:
+        conn.execute(
+            "DELETE FROM route53_trigrams WHERE record_id IN (SELECT id FROM route53_records WHERE account_id = ? AND zone_id = ?)",
+            (account_id, zone_id),
+        )
+        conn.execute("DELETE FROM route53_records WHERE account_id = ? AND zone_id = ?", (account_id, zone_id))
+        conn.execute("DELETE FROM route53_zones WHERE account_id = ? AND zone_id = ?", (account_id, zone_id))
+
+    def route53_zones(self, account_id: str) -> Dict[str, Dict]:
+        """Returns the synced hosted zones of an account, keyed by zone Id."""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT * FROM route53_zones WHERE account_id = ?", (account_id,)).fetchall()
+        finally:
+            conn.close()
+        return {row["zone_id"]: dict(row) for row in rows}
+
+    def touch_route53_account(self, account: Dict, keep_zone_ids: Iterable[str]) -> int:
+        """Marks an account as synced and drops the zones that no longer exist."""
+        account_id = account["accountId"]
+        keep_zone_ids = set(keep_zone_ids)
+        conn = self._connect()
+        try:
+            with conn:
+                stale = [
+                    row["zone_id"]
+                    for row in conn.execute("SELECT zone_id FROM route53_zones WHERE account_id = ?", (account_id,))
+                    if row["zone_id"] not in keep_zone_ids
+                ]
+                for zone_id in stale:
+                    self._delete_route53_zone(conn, account_id, zone_id)
+                conn.execute(
+                    "INSERT OR REPLACE INTO snapshots VALUES ('route53', ?, ?, ?)",
+                    (account_id, account["accountName"], time.time()),
+                )
+        finally:
+            conn.close()
+        return len(stale)
+
+    def route53_lookup(self, search_type: str, search_value: str, account_ids: Iterable[str] | None = None) -> List[Dict]:
+        """Case-insensitive substring search on record names or values.
+
+        Candidates are the records whose posting lists contain every trigram
+        of the query; each candidate is then checked against the real
+        substring. Queries shorter than three characters scan the records.
+        """
+        field = NAME_FIELD if search_type == "Name" else VALUE_FIELD if search_type == "Value" else None
+        if field is None:
+            return []
+        needle = search_value.lower()
+        grams = trigrams(needle)
+
+        where, args = [], []
+        if grams:
+            where.append(
+                f"r.id IN (SELECT record_id FROM route53_trigrams WHERE field = ? AND trigram IN ({', '.join('?' * len(grams))}) "
+                "GROUP BY record_id HAVING COUNT(*) = ?)"
+            )
+            args += [field, *grams, len(grams)]
+        if account_ids is not None:
+            account_ids = list(account_ids)
+            where.append(f"r.account_id IN ({', '.join('?' * len(account_ids))})")
+            args += account_ids
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT r.account_id, r.account_name, r.zone_name, r.name, r.search_values, r.data FROM route53_records r"
+                + (f" WHERE {' AND '.join(where)}" if where else "")
+                + " ORDER BY r.account_name, r.zone_name, r.id",
+                args,
+            ).fetchall()
+        finally:
+            conn.close()
+
+        results = []
+        for row in rows:
+            if field == NAME_FIELD:
+                matched = needle in row["name"]
+            else:
+                matched = any(needle in value for value in json.loads(row["search_values"]))
+            if matched:
+                results.append({
+                    "zone_name": row["zone_name"],
+                    "record": json.loads(row["data"]),
+                    "account_name": row["account_name"],
+                    "account_id": row["account_id"],
+                })
+        return results
+
+    def route53_items(self, account_ids: Iterable[str] | None = None) -> List[Dict]:
+        """Returns every indexed record, for queries the trigram index cannot answer."""
+        where, args = "", []
+        if account_ids is not None:
+            account_ids = list(account_ids)
+            where, args = f" WHERE account_id IN ({', '.join('?' * len(account_ids))})", account_ids
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT account_id, account_name, zone_name, data FROM route53_records{where} ORDER BY account_name, zone_name, id",
+                args,
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            {"zone_name": row["zone_name"], "record": json.loads(row["data"]), "account_name": row["account_name"], "account_id": row["account_id"]}
+            for row in rows
+        ]
+
+    def snapshot_info(self, resource: str) -> Dict | None:
+        """Returns how many accounts a snapshot covers and when it was refreshed.
+
+        ``age`` is measured from the oldest account refresh, since that bounds
+        how stale an answer from the snapshot can be.
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT COUNT(*) AS accounts, MIN(refreshed_at) AS oldest, MAX(refreshed_at) AS newest FROM snapshots WHERE resource = ?",
+                (resource,),
+            ).fetchone()
+        finally:
+            conn.close()
+        if not row["accounts"]:
+            return None
+        return {
+            "accounts": row["accounts"],
+            "refreshed_at": row["oldest"],
+            "newest_refresh_at": row["newest"],
+            "age": round(time.time() - row["oldest"], 1),
+        }
+
+
+inventory = Inventory()
@@ -0,0 +1,115 @@
+"""Matchers for searching many values at once."""
+from collections import deque
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton finding every pattern contained in a text in one pass.
+
+    Matching is case-insensitive. ``search`` walks the text once, whatever
+    the number of patterns, and returns the patterns (as given) it contains.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+
+        for pattern in patterns:
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern.lower():
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][char] = next_state
+                state = next_state
+            self._out[state].append(len(self.patterns))
+            self.patterns.append(pattern)
+
+        # Breadth-first, so the failure state of a node is always built first.
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def search(self, text: str) -> Set[str]:
+        found: Set[str] = set()
+        state = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in out[state]:
+                found.add(self.patterns[index])
+        return found
+
+
+def reversed_labels(name: str) -> Tuple[str, ...]:
+    """The labels of a DNS name read right to left, lowercase: ``www.example.com.`` is ``("com", "example", "www")``."""
+    return tuple(label for label in reversed(name.strip().lower().rstrip(".").split(".")) if label)
+
+
+class LabelTrie:
+    """Trie of DNS names keyed by their labels read right to left.
+
+    Names sharing a suffix share a path, so ``suffixes`` and ``subtree``
+    walk one node per label of the queried name, however many names are
+    stored.
+    """
+
+    def __init__(self, items: Iterable[Tuple[str, object]] = ()):
+        self._children: List[Dict[str, int]] = [{}]
+        self._values: List[List[object]] = [[]]
+        for name, value in items:
+            self.add(name, value)
+
+    def add(self, name: str, value: object) -> None:
+        node = 0
+        for label in reversed_labels(name):
+            next_node = self._children[node].get(label)
+            if next_node is None:
+                next_node = len(self._children)
+                self._children.append({})
+                self._values.append([])
+                self._children[node][label] = next_node
+            node = next_node
+        self._values[node].append(value)
+
+    def suffixes(self, name: str) -> List[object]:
+        """Values of the stored names ``name`` ends with, itself included, shortest first."""
+        found: List[object] = list(self._values[0])
+        node = 0
+        for label in reversed_labels(name):
+            node = self._children[node].get(label)
+            if node is None:
+                break
+            found.extend(self._values[node])
+        return found
+
+    def subtree(self, name: str) -> List[object]:
+        """Values of the stored names strictly below ``name``."""
+        node = 0
+        for label in reversed_labels(name):
+            node = self._children[node].get(label)
+            if node is None:
+                return []
+        found: List[object] = []
+        stack = list(self._children[node].values())
+        while stack:
+            node = stack.pop()
+            found.extend(self._values[node])
+            stack.extend(self._children[node].values())
+        return found
@@ -0,0 +1,230 @@
+"""Span trees recording how one search spent its time.
+
+``profiled()`` starts recording for the code it wraps: every ``span()``
+opened below it, in the same thread or in worker threads started through
+``run_in_context()``, becomes a child of the span that was current when it
+opened. The core opens spans for accounts, roles, hosted zones, stages,
+client construction and client-side rate limit waits, and
+``attach_client()`` adds one span per AWS API call (one per page when
+paginating). Outside ``profiled()`` a span costs a single context variable
+lookup.
+
+A finished ``Profile`` renders as waterfall rows or as Chrome trace events
+(``chrome://tracing``, Perfetto).
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+_current: contextvars.ContextVar = contextvars.ContextVar("aws_manager_span", default=None)
+
+
+class Span:
+    __slots__ = ("profile", "parent", "name", "category", "attrs", "start", "end", "thread")
+
+    def __init__(self, profile: "Profile", parent: "Span | None", name: str, category: str, attrs: Dict):
+        self.profile = profile
+        self.parent = parent
+        self.name = name
+        self.category = category
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: float | None = None
+        self.thread = threading.get_ident()
+
+    def finish(self, **attrs) -> None:
+        self.attrs.update(attrs)
+        self.end = time.perf_counter()
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+
+class Profile:
+    """The spans of one search, rooted at a span named after it."""
+
+    def __init__(self, name: str, **attrs):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self.root = self.open(None, name, "search", attrs)
+
+    def __getstate__(self) -> Dict:
+        # Stored result sets are pickled with their profile; the lock is not.
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def open(self, parent: Span | None, name: str, category: str, attrs: Dict) -> Span:
+        span = Span(self, parent, name, category, attrs)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    @property
+    def duration(self) -> float:
+        return self.root.duration
+
+    def _children(self) -> Dict[int, List[Span]]:
+        children: Dict[int, List[Span]] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            if span.parent is not None:
+                children.setdefault(id(span.parent), []).append(span)
+        for siblings in children.values():
+            siblings.sort(key=lambda s: s.start)
+        return children
+
+    def waterfall(self) -> List[Dict]:
+        """Spans in tree order, with offsets and durations in milliseconds and as percentages of the search."""
+        children = self._children()
+        total = max(self.duration, 1e-9)
+        rows: List[Dict] = []
+
+        def walk(span: Span, depth: int) -> None:
+            offset = span.start - self.root.start
+            rows.append({
+                "name": span.name,
+                "category": span.category,
+                "depth": depth,
+                "offset_ms": round(offset * 1000, 1),
+                "duration_ms": round(span.duration * 1000, 1),
+                "left": round(offset / total * 100, 2),
+                "width": round(max(span.duration / total * 100, 0.1), 2),
+                "attrs": span.attrs,
+            })
+            for child in children.get(id(span), []):
+                walk(child, depth + 1)
+
+        walk(self.root, 0)
+        return rows
+
+    def slowest(self, category: str = "account", count: int = 5) -> List[Dict]:
+        """The ``count`` longest spans of ``category``, such as the accounts dominating a search."""
+        with self._lock:
+            spans = [span for span in self.spans if span.category == category]
+        spans.sort(key=lambda s: s.duration, reverse=True)
+        return [{"name": s.name, "duration_ms": round(s.duration * 1000, 1), "attrs": s.attrs} for s in spans[:count]]
+
+    def chrome_trace(self) -> Dict:
+        """The spans as Chrome trace events, one complete event each, one track per thread."""
+        with self._lock:
+            spans = list(self.spans)
+        threads: Dict[int, int] = {}
+        events = []
+        for span in spans:
+            tid = threads.setdefault(span.thread, len(threads) + 1)
+            events.append({
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": round((span.start - self.root.start) * 1e6, 1),
+                "dur": round(span.duration * 1e6, 1),
+                "pid": 1,
+                "tid": tid,
+                "args": {key: str(value) for key, value in span.attrs.items()},
+            })
+        events += [
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": "search" if tid == 1 else f"worker {tid - 1}"}}
+            for tid in threads.values()
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"search": self.root.name}}
+
+
+@contextmanager
+def profiled(name: str, **attrs) -> Iterator[Profile]:
+    """Records the spans opened by the wrapped code into a new ``Profile``."""
+    profile = Profile(name, **attrs)
+    token = _current.set(profile.root)
+    try:
+        yield profile
+    finally:
+        profile.root.finish()
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Closed from another context, as async generators can be.
+            pass
+
+
+def start_span(name: str, category: str, **attrs) -> Span | None:
+    """Opens a child of the current span; ``None`` when nothing is being profiled."""
+    parent = _current.get()
+    if parent is None:
+        return None
+    return parent.profile.open(parent, name, category, attrs)
+
+
+@contextmanager
+def span(name: str, category: str, **attrs) -> Iterator[Span | None]:
+    """Runs the wrapped code inside a child span of the current one."""
+    child = start_span(name, category, **attrs)
+    if child is None:
+        yield None
+        return
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.attrs.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        _current.reset(token)
+        child.finish()
+
+
+def record_span(name: str, category: str, started: float, **attrs) -> None:
+    """Adds a finished child span that started at ``started`` (``time.perf_counter()``)."""
+    child = start_span(name, category, **attrs)
+    if child is not None:
+        child.start = started
+        child.finish()
+
+
+def attach_client(client, service: str) -> None:
+    """Records every API call made by ``client`` as a span of the search making it."""
+
+    def before_call(event_name: str, context: Dict, **kwargs):
+        child = start_span(event_name.rsplit(".", 1)[-1], "api", service=service)
+        if child is not None:
+            context["profile_span"] = child
+            context["profile_token"] = _current.set(child)
+
+    def finish(context: Dict | None, **attrs) -> None:
+        child = (context or {}).pop("profile_span", None)
+        if child is None:
+            return
+        try:
+            _current.reset(context.pop("profile_token"))
+        except ValueError:
+            pass
+        child.finish(**attrs)
+
+    def after_call(event_name: str, http_response=None, parsed=None, context=None, **kwargs):
+        metadata = (parsed or {}).get("ResponseMetadata", {})
+        attrs = {"status": getattr(http_response, "status_code", None)}
+        if metadata.get("RetryAttempts"):
+            attrs["retries"] = metadata["RetryAttempts"]
+        if (parsed or {}).get("Error"):
+            attrs["error"] = parsed["Error"].get("Code")
+        finish(context, **attrs)
+
+    def after_call_error(event_name: str, exception=None, context=None, **kwargs):
+        finish(context, error=type(exception).__name__)
+
+    client.meta.events.register("before-call", before_call)
+    client.meta.events.register("after-call", after_call)
+    client.meta.events.register("after-call-error", after_call_error)
+
+
+def run_in_context(func):
+    """Wraps ``func`` to run in a copy of the caller's context, for worker threads."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
@@ -0,0 +1,441 @@
+"""A small query language for CloudFront distributions and Route53 records.
+
+A query is made of ``field:value`` terms combined with ``AND``, ``OR``,
+``NOT`` and parentheses; terms next to each other are ANDed::
+
+    origin:*.s3.amazonaws.com AND NOT enabled:false
+    cert:/certificate\\/1234/ OR alias:"www.example.com"
+    type:CNAME ttl<=60 (name:*.internal.* OR value:*.elb.amazonaws.com)
+
+Values are compared case-insensitively. A value containing ``*`` or ``?``
+is a wildcard, ``/.../`` (optionally followed by ``i``) is a regular
+expression searched anywhere in the field, a double quoted value is taken
+literally, and ``>``, ``>=``, ``<``, ``<=`` compare numbers. A bare value
+without a field matches the resource's default fields by substring.
+
+Fields are the short names of ``FIELDS`` or any dotted path into the
+boto3 structure (``ViewerCertificate.MinimumProtocolVersion``); lists and
+``{"Items": [...]}`` wrappers along the path are traversed, and a term
+matches when any of the values found matches. Queries are compiled once
+into a predicate, so matching a record does no parsing and the value is
+only normalized once.
+"""
+import fnmatch
+import re
+from typing import Callable, Dict, List
+
+FIELDS = {
+    "cloudfront": {
+        "id": "Id",
+        "arn": "ARN",
+        "domain": "DomainName",
+        "alias": "Aliases.Items",
+        "origin": "Origins.DomainName",
+        "origin_id": "Origins.Id",
+        "origin_path": "Origins.OriginPath",
+        "cert": "ViewerCertificate.ACMCertificateArn",
+        "iam_cert": "ViewerCertificate.IAMCertificateId",
+        "tls": "ViewerCertificate.MinimumProtocolVersion",
+        "comment": "Comment",
+        "status": "Status",
+        "enabled": "Enabled",
+        "waf": "WebACLId",
+        "price_class": "PriceClass",
+        "http_version": "HttpVersion",
+        "modified": "LastModifiedTime",
+    },
+    "route53": {
+        "name": "Name",
+        "type": "Type",
+        "value": "ResourceRecords.Value",
+        "ttl": "TTL",
+        "alias_target": "AliasTarget.DNSName",
+        "alias_zone": "AliasTarget.HostedZoneId",
+        "set_id": "SetIdentifier",
+        "weight": "Weight",
+        "region": "Region",
+        "health_check": "HealthCheckId",
+    },
+}
+
+# Fields searched by a bare value.
+DEFAULT_FIELDS = {
+    "cloudfront": ["id", "domain", "alias"],
+    "route53": ["name", "value"],
+}
+
+# The fixed search types of the search forms, as (fields, operator). A
+# record value is either a ResourceRecords value or an alias target.
+SEARCH_TYPES = {
+    "cloudfront": {"Id": (("id",), "=="), "DomainName": (("domain",), "=="), "Aliases": (("alias",), "==")},
+    "route53": {"Name": (("name",), "~"), "Value": (("value", "alias_target"), "~")},
+}
+
+QUERY_SEARCH_TYPE = "Query"
+
+Predicate = Callable[[Dict], bool]
+
+
+class QueryError(ValueError):
+    """Raised when a query cannot be parsed."""
+
+
+def _path(resource: str, field: str) -> List[str]:
+    return FIELDS.get(resource, {}).get(field.lower(), field).split(".")
+
+
+def field_getter(resource: str, field: str) -> Callable[[Dict], List]:
+    """Compiles a field name into a function returning all its values in an item."""
+    keys = _path(resource, field)
+
+    def get(item: Dict) -> List:
+        values = [item]
+        for key in keys:
+            found = []
+            for value in values:
+                if isinstance(value, dict) and key not in value and isinstance(value.get("Items"), list):
+                    value = value["Items"]
+                for candidate in value if isinstance(value, list) else (value,):
+                    if isinstance(candidate, dict) and key in candidate:
+                        leaf = candidate[key]
+                        if isinstance(leaf, list):
+                            found.extend(leaf)
+                        elif leaf is not None:
+                            found.append(leaf)
+            values = found
+            if not values:
+                break
+        return values
+
+    return get
+
+
+def _text(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _number(value) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _value_test(op: str, value: str, quoted: bool = False) -> Callable[[object], bool]:
+    """Compiles one comparison into a test of a single field value."""
+    if op in (">", ">=", "<", "<="):
+        limit = _number(value)
+        if limit is None:
+            raise QueryError(f"'{op}' needs a number, got '{value}'")
+        compare = {
+            ">": lambda x: x > limit,
+            ">=": lambda x: x >= limit,
+            "<": lambda x: x < limit,
+            "<=": lambda x: x <= limit,
+        }[op]
+
+        def test_number(field_value) -> bool:
+            number = _number(field_value)
+            return number is not None and compare(number)
+
+        return test_number
+
+    if op == "==":
+        return lambda field_value: field_value == value
+
+    if op == "~":
+        needle = value.lower()
+        return lambda field_value: needle in (field_value if type(field_value) is str else _text(field_value)).lower()
+
+    if not quoted and len(value) > 1 and value.startswith("/") and value.rstrip("imsx").endswith("/"):
+        flags = value[value.rindex("/") + 1:]
+        try:
+            pattern = re.compile(
+                value[1:value.rindex("/")],
+                (re.IGNORECASE if "i" in flags else 0)
+                | (re.MULTILINE if "m" in flags else 0)
+                | (re.DOTALL if "s" in flags else 0)
+                | (re.VERBOSE if "x" in flags else 0),
+            )
+        except re.error as e:
+            raise QueryError(f"invalid regular expression {value}: {e}") from None
+        return lambda field_value: pattern.search(_text(field_value)) is not None
+
+    if not quoted and ("*" in value or "?" in value):
+        pattern = re.compile(fnmatch.translate(value), re.IGNORECASE)
+        return lambda field_value: pattern.match(_text(field_value)) is not None
+
+    expected = value.lower()
+    return lambda field_value: (field_value if type(field_value) is str else _text(field_value)).lower() == expected
+
+
+def field_predicate(resource: str, field: str, op: str, value: str, quoted: bool = False) -> Predicate:
+    """Compiles ``field op value`` into a predicate on a whole item.
+
+    ``op`` is ``:``/``=`` (equality, wildcard or regex), ``==`` (exact,
+    case-sensitive), ``~`` (substring) or a numeric comparison.
+    """
+    keys = _path(resource, field)
+    test = _value_test(op, value, quoted)
+
+    if op == "==":
+        def matches(field_value) -> bool:
+            return field_value == value or (type(field_value) is list and value in field_value)
+    else:
+        def matches(field_value) -> bool:
+            if type(field_value) is not list:
+                return test(field_value)
+            for element in field_value:
+                if element is not None and test(element):
+                    return True
+            return False
+
+    # One and two level paths cover every named field; they are read inline
+    # rather than through the generic getter, with strings tested directly.
+    # Exact and substring tests, which the search forms use, are inlined too.
+    if len(keys) == 1 and op == "==":
+        key = keys[0]
+
+        def predicate(item: Dict) -> bool:
+            field_value = item.get(key)
+            return field_value == value or (type(field_value) is list and value in field_value)
+
+        return predicate
+
+    if len(keys) == 1 and op == "~":
+        key, needle = keys[0], value.lower()
+
+        def predicate(item: Dict) -> bool:
+            field_value = item.get(key)
+            if type(field_value) is str:
+                return needle in field_value.lower()
+            return field_value is not None and matches(field_value)
+
+        return predicate
+
+    if len(keys) == 1:
+        key = keys[0]
+
+        def predicate(item: Dict) -> bool:
+            field_value = item.get(key)
+            if type(field_value) is str:
+                return test(field_value)
+            return field_value is not None and matches(field_value)
+
+        return predicate
+
+    if len(keys) == 2:
+        outer_key, inner_key = keys
+        exact, contains, needle = op == "==", op == "~", value.lower()
+
+        def predicate(item: Dict) -> bool:
+            outer = item.get(outer_key)
+            if type(outer) is dict:
+                if inner_key in outer:
+                    leaf = outer[inner_key]
+                    if exact:
+                        return leaf == value or (type(leaf) is list and value in leaf)
+                    return leaf is not None and matches(leaf)
+                outer = outer.get("Items")
+            if type(outer) is not list:
+                return False
+            for element in outer:
+                if type(element) is dict:
+                    field_value = element.get(inner_key)
+                    if type(field_value) is str:
+                        if (needle in field_value.lower()) if contains else test(field_value):
+                            return True
+                    elif field_value is not None and matches(field_value):
+                        return True
+            return False
+
+        return predicate
+
+    get = field_getter(resource, field)
+
+    def predicate(item: Dict) -> bool:
+        for field_value in get(item):
+            if test(field_value):
+                return True
+        return False
+
+    return predicate
+
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<paren>[()])
+      | (?P<keyword>(?:AND|OR|NOT)(?=[\s()]|$))
+      | (?:(?P<field>[A-Za-z_][\w.]*)\s*(?P<op>>=|<=|[:=<>]))?
+        (?P<value>"(?:[^"\\]|\\.)*"|/(?:[^/\\]|\\.)*/[imsx]*(?=[\s()]|$)|[^\s()]+)
+    )""",
+    re.VERBOSE,
+)
+
+
+def _tokenize(text: str) -> List[Dict]:
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise QueryError(f"unexpected input at position {position}: {text[position:position + 20]!r}")
+        tokens.append({k: v for k, v in match.groupdict().items() if v is not None})
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, resource: str, tokens: List[Dict]):
+        self.resource = resource
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> Dict | None:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self) -> Dict:
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def parse(self) -> Predicate:
+        if not self.tokens:
+            raise QueryError("empty query")
+        predicate = self.parse_or()
+        if self.peek() is not None:
+            raise QueryError("unbalanced ')'")
+        return predicate
+
+    def parse_or(self) -> Predicate:
+        terms = [self.parse_and()]
+        while (self.peek() or {}).get("keyword") == "OR":
+            self.take()
+            terms.append(self.parse_and())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda item: any(term(item) for term in terms)
+
+    def parse_and(self) -> Predicate:
+        terms = [self.parse_not()]
+        while True:
+            token = self.peek()
+            if token is None or token.get("paren") == ")" or token.get("keyword") == "OR":
+                break
+            if token.get("keyword") == "AND":
+                self.take()
+            terms.append(self.parse_not())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda item: all(term(item) for term in terms)
+
+    def parse_not(self) -> Predicate:
+        if (self.peek() or {}).get("keyword") == "NOT":
+            self.take()
+            term = self.parse_not()
+            return lambda item: not term(item)
+        return self.parse_term()
+
+    def parse_term(self) -> Predicate:
+        token = self.peek()
+        if token is None:
+            raise QueryError("query ends where a term was expected")
+        self.take()
+        if token.get("paren") == "(":
+            predicate = self.parse_or()
+            if (self.peek() or {}).get("paren") != ")":
+                raise QueryError("missing ')'")
+            self.take()
+            return predicate
+        if "value" not in token:
+            raise QueryError(f"unexpected {token.get('paren') or token.get('keyword')!r}")
+
+        value = token["value"]
+        quoted = value.startswith('"')
+        if quoted:
+            value = re.sub(r"\\(.)", r"\1", value[1:-1])
+        if "field" in token:
+            return field_predicate(self.resource, token["field"], token["op"], value, quoted)
+
+        op = "=" if not quoted and (value.startswith("/") or "*" in value or "?" in value) else "~"
+        terms = [field_predicate(self.resource, field, op, value, quoted) for field in DEFAULT_FIELDS[self.resource]]
+        return lambda item: any(term(item) for term in terms)
+
+
+def compile_query(query: str, resource: str) -> Predicate:
+    """Compiles a query for ``resource`` ("cloudfront" or "route53") into a predicate."""
+    if resource not in FIELDS:
+        raise QueryError(f"unknown resource '{resource}'")
+    return _Parser(resource, _tokenize(query)).parse()
+
+
+def search_predicate(resource: str, search_type: str, search_value: str) -> Predicate:
+    """Compiles a search form's type and value into a predicate.
+
+    ``Query`` compiles ``search_value`` as a query. CloudFront Id, DomainName
+    and Aliases are exact matches; Route53 Name and Value are substring
+    matches, Value covering alias targets too. Unknown search types match
+    nothing.
+    """
+    if search_type == QUERY_SEARCH_TYPE:
+        return compile_query(search_value, resource)
+    if search_type not in SEARCH_TYPES.get(resource, {}):
+        return lambda item: False
+    fields, op = SEARCH_TYPES[resource][search_type]
+    predicates = [field_predicate(resource, field, op, search_value, quoted=True) for field in fields]
+    if len(predicates) == 1:
+        return predicates[0]
+    return lambda item: any(predicate(item) for predicate in predicates)
+
+
+def _project_path(value, keys: List[str]):
+    if not keys:
+        return value
+    if isinstance(value, list):
+        # Missing elements become {} so that projections of the same list line up.
+        projected = [_project_path(element, keys) for element in value]
+        return [{} if element is None else element for element in projected]
+    if not isinstance(value, dict):
+        return None
+    key = keys[0]
+    if key not in value and isinstance(value.get("Items"), list):
+        return {"Items": _project_path(value["Items"], keys)}
+    if key not in value:
+        return None
+    projected = _project_path(value[key], keys[1:])
+    return None if projected is None else {key: projected}
+
+
+def _merge(into, other):
+    if isinstance(into, dict) and isinstance(other, dict):
+        for key, value in other.items():
+            into[key] = _merge(into[key], value) if key in into else value
+        return into
+    if isinstance(into, list) and isinstance(other, list) and len(into) == len(other):
+        return [_merge(a, b) for a, b in zip(into, other)]
+    return other
+
+
+def projector(resource: str, fields: List[str] | None) -> Callable[[Dict], Dict]:
+    """Compiles a projection list into a function keeping only those fields.
+
+    The projected item keeps the shape of the original, so ``["id",
+    "origin"]`` turns a distribution into ``{"Id": ..., "Origins": {"Items":
+    [{"DomainName": ...}]}}``. No fields keeps the whole item.
+    """
+    if not fields:
+        return lambda item: item
+    paths = [_path(resource, field) for field in fields]
+
+    def project(item: Dict) -> Dict:
+        projected: Dict = {}
+        for keys in paths:
+            part = _project_path(item, keys)
+            if part is not None:
+                projected = _merge(projected, part)
+        return projected
+
+    return project
@@ -0,0 +1,187 @@
+"""Search results kept on the server and served one page at a time.
+
+A finished search is stored as an immutable result set under a random id.
+The search page and the JSON API then page, sort and filter it without
+another AWS scan, sending compact rows instead of whole distributions or
+records. Full items stay available one at a time.
+"""
+import hashlib
+import uuid
+from typing import Dict, List
+
+from .profiling import Profile
+from .query import compile_query
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Compact row columns per kind of result, in display order.
+COLUMNS = {
+    "cloudfront": ["account_name", "account_id", "id", "domain", "aliases", "origins", "status"],
+    "route53": ["account_name", "account_id", "zone_name", "name", "type", "ttl", "values"],
+    "trace": ["hostname", "record", "target", "matched_by", "account_name", "id", "origins"],
+}
+
+# Where the query language finds the resource in a stored item.
+_QUERY_KEYS = {"cloudfront": "distribution", "route53": "record"}
+
+
+def _items(wrapper: Dict | None) -> List:
+    return (wrapper or {}).get("Items", [])
+
+
+def compact_row(resource: str, item: Dict) -> Dict:
+    """Projects one search result onto the columns of its resource."""
+    if resource == "cloudfront":
+        dist = item.get("distribution", {})
+        return {
+            "account_name": item.get("account_name", ""),
+            "account_id": item.get("account_id", ""),
+            "id": dist.get("Id", ""),
+            "domain": dist.get("DomainName", ""),
+            "aliases": ", ".join(_items(dist.get("Aliases"))),
+            "origins": ", ".join(origin.get("DomainName", "") for origin in _items(dist.get("Origins"))),
+            "status": dist.get("Status", ""),
+        }
+    if resource == "route53":
+        record = item.get("record", {})
+        values = [rr.get("Value", "") for rr in record.get("ResourceRecords", [])]
+        if record.get("AliasTarget", {}).get("DNSName"):
+            values.append("ALIAS " + record["AliasTarget"]["DNSName"])
+        return {
+            "account_name": item.get("account_name", ""),
+            "account_id": item.get("account_id", ""),
+            "zone_name": item.get("zone_name", ""),
+            "name": record.get("Name", ""),
+            "type": record.get("Type", ""),
+            "ttl": record.get("TTL", ""),
+            "values": ", ".join(values),
+        }
+    if resource == "trace":
+        dist = item.get("distribution") or {}
+        return {
+            "hostname": item.get("hostname", ""),
+            "record": ((item.get("record") or {}).get("record") or {}).get("Name", ""),
+            "target": item.get("target") or "",
+            "matched_by": item.get("matched_by") or "",
+            "account_name": item.get("account_name") or "",
+            "id": dist.get("Id", ""),
+            "origins": ", ".join(item.get("origins", [])),
+        }
+    raise ValueError(f"unknown resource '{resource}'")
+
+
+def result_set_etag(result_set_id: str, owner: str) -> str:
+    """Result sets never change, so their id and owner identify their content."""
+    return hashlib.sha1(f"{result_set_id}:{owner}".encode()).hexdigest()[:16]
+
+
+class ResultSet:
+    """One stored search: the full items, their compact rows and the search's profile."""
+
+    def __init__(self, resource: str, items: List[Dict], owner: str, meta: Dict | None = None, profile: Profile | None = None):
+        self.id = uuid.uuid4().hex
+        self.resource = resource
+        self.owner = owner
+        self.items = list(items)
+        self.rows = [compact_row(resource, item) for item in self.items]
+        self.meta = meta or {}
+        self.profile = profile
+        self.etag = result_set_etag(self.id, owner)
+
+    def page(
+        self,
+        page: int = 1,
+        page_size: int = PAGE_SIZE,
+        sort: str | None = None,
+        q: str | None = None,
+        query: str | None = None,
+    ) -> Dict:
+        """Returns one page of compact rows, filtered and sorted.
+
+        ``q`` keeps the rows containing it in any column. ``query`` is a
+        query (see ``query.py``) on the full items and raises ``QueryError``
+        when invalid. ``sort`` is a column name, prefixed with ``-`` for
+        descending order.
+        """
+        indexes = range(len(self.rows))
+        if query:
+            if self.resource not in _QUERY_KEYS:
+                indexes = []
+            else:
+                match = compile_query(query, self.resource)
+                key = _QUERY_KEYS[self.resource]
+                indexes = [i for i in indexes if match(self.items[i][key])]
+        if q:
+            needle = q.lower()
+            indexes = [i for i in indexes if any(needle in str(value).lower() for value in self.rows[i].values())]
+
+        columns = COLUMNS[self.resource]
+        indexes = list(indexes)
+        if sort and sort.lstrip("-") in columns:
+            column = sort.lstrip("-")
+            indexes.sort(key=lambda i: str(self.rows[i][column]).lower(), reverse=sort.startswith("-"))
+
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        pages = max(1, -(-len(indexes) // page_size))
+        page = max(1, min(page, pages))
+        start = (page - 1) * page_size
+        return {
+            "id": self.id,
+            "resource": self.resource,
+            "columns": columns,
+            "total": len(self.rows),
+            "filtered": len(indexes),
+            "page": page,
+            "pages": pages,
+            "page_size": page_size,
+            "sort": sort or "",
+            "rows": [dict(self.rows[i], index=i) for i in indexes[start:start + page_size]],
+            "meta": self.meta,
+            "profiled": self.profile is not None,
+        }
+
+
+class ResultSetStore:
+    """Result sets kept in a Django cache, so every worker process of the server sees them.
+
+    The ``result_sets`` cache in the settings drops them after
+    ``AWS_MANAGER_RESULT_SET_TTL`` seconds unused.
+    """
+
+    def __init__(self, alias: str = "result_sets"):
+        self.alias = alias
+
+    @property
+    def _sets(self):
+        # Imported here: the CLI daemon uses this module without Django settings.
+        from django.core.cache import caches
+
+        return caches[self.alias]
+
+    def create(
+        self, resource: str, items: List[Dict], owner: str, meta: Dict | None = None, profile: Profile | None = None
+    ) -> ResultSet:
+        result_set = ResultSet(resource, items, owner, meta, profile)
+        self._sets.set(result_set.id, result_set)
+        return result_set
+
+    def etag(self, result_set_id: str, owner: str) -> str | None:
+        """The ETag of a result set that still exists, without loading it."""
+        if not result_set_id.isalnum() or not self._sets.has_key(result_set_id):
+            return None
+        return result_set_etag(result_set_id, owner)
+
+    def get(self, result_set_id: str, owner: str) -> ResultSet | None:
+        """Returns the result set if it still exists and belongs to ``owner``."""
+        if not result_set_id.isalnum():
+            return None
+        result_set = self._sets.get(result_set_id)
+        if result_set is None or result_set.owner != owner:
+            return None
+        # Reading a result set keeps it alive.
+        self._sets.touch(result_set_id)
+        return result_set
+
+
+result_sets = ResultSetStore()
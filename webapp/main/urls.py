@@ -4,7 +4,16 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('search/', views.search, name='search'),
+    path('search/batch/', views.batch_search, name='batch_search'),
+    path('search/stream/', views.search_stream, name='search_stream'),
+    path('search/profile/<str:result_set_id>/', views.search_profile, name='search_profile'),
+    path('api/results/<str:result_set_id>/', views.result_set_api, name='result_set_api'),
+    path('api/results/<str:result_set_id>/items/<int:index>/', views.result_set_item, name='result_set_item'),
+    path('api/results/<str:result_set_id>/trace/', views.result_set_trace, name='result_set_trace'),
+    path('inventory/refresh/', views.refresh_inventory, name='refresh_inventory'),
     path('login/', views.login_view, name='login'),
+    path('login/sso/poll/', views.sso_poll, name='sso_poll'),
     path('logout/', views.logout_view, name='logout'),
+    path('metrics/', views.metrics, name='metrics'),
     path('upload-logo/', views.upload_logo, name='upload_logo'),
 ]
@@ -1,6 +1,15 @@
 from django.shortcuts import render, redirect
 from django.conf import settings
+from django.urls import reverse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition
+from asgiref.sync import sync_to_async
+from datetime import datetime, timezone
+import hashlib
+import hmac
+import json
 import os
+import threading
 
 
 def get_logo_url():
@@ -10,12 +19,32 @@ def get_logo_url():
         return settings.MEDIA_URL + 'logo.png'
     return None
 from .aws_manager_core import (
-    sso_login,
+    sso_start_device_authorization,
+    sso_poll_token,
     cloudfront_search,
     route53_search,
     cloudfront_search_creds,
     route53_search_creds,
+    cloudfront_search_events,
+    route53_search_events,
+    blocking_search_events,
+    refresh_cloudfront_inventory,
+    refresh_route53_inventory,
+    parse_batch_values,
+    cloudfront_batch_search,
+    route53_batch_search,
+    cloudfront_batch_search_creds,
+    route53_batch_search_creds,
+    trace_hostname,
+    api_metrics,
+    cached_search_events,
+    search_cache,
+    search_key,
 )
+from .inventory import inventory
+from .profiling import profiled
+from .query import QueryError
+from .resultsets import PAGE_SIZE, compact_row, result_sets
 
 
 def index(request):
@@ -27,59 +56,407 @@ def search(request):
     if 'login_type' not in request.session:
         return redirect('login')
 
-    context = {'logo_url': get_logo_url()}
+    context = {
+        'logo_url': get_logo_url(),
+        'snapshots': _snapshots(),
+        'refreshing': _refresh_lock.locked(),
+    }
     if request.method == 'POST':
         resource = request.POST.get('resource')
         search_type = request.POST.get('search_type')
         search_value = request.POST.get('search_value')
+        source = request.POST.get('source', 'live')
+        fields = _fields(request.POST.get('fields'))
+        # Identical searches of the same credentials share one scan.
+        key = _search_key(request.session, resource, search_type, search_value, source, fields)
 
-        if request.session['login_type'] == 'sso':
-            access_token = request.session.get('access_token')
-            sso_region = request.session.get('sso_region')
-            if not all([access_token, sso_region]):
-                context['error'] = 'SSO login data missing.'
-            else:
-                if resource == 'cloudfront':
-                    results = cloudfront_search(access_token, sso_region, search_type, search_value)
+        with profiled(_search_name(resource, search_type, search_value)) as profile:
+            try:
+                if request.session['login_type'] == 'sso':
+                    access_token = request.session.get('access_token')
+                    sso_region = request.session.get('sso_region')
+                    if not all([access_token, sso_region]):
+                        context['error'] = 'SSO login data missing.'
+                    elif resource == 'trace':
+                        results = search_cache.run(key, trace_hostname, access_token, sso_region, search_value, mode=source)
+                    else:
+                        if resource == 'cloudfront':
+                            search = cloudfront_search
+                        else:
+                            search = route53_search
+                        results = search_cache.run(
+                            key, search, access_token, sso_region, search_type, search_value, mode=source, fields=fields
+                        )
                 else:
-                    results = route53_search(access_token, sso_region, search_type, search_value)
-                context['results'] = results
+                    access_key = request.session.get('access_key')
+                    secret_key = request.session.get('secret_key')
+                    session_token = request.session.get('session_token')
+                    if not all([access_key, secret_key]):
+                        context['error'] = 'Credential login data missing.'
+                    elif resource == 'trace':
+                        context['error'] = TRACE_NEEDS_SSO
+                    else:
+                        if resource == 'cloudfront':
+                            search = cloudfront_search_creds
+                        else:
+                            search = route53_search_creds
+                        results = search_cache.run(
+                            key, search, access_key, secret_key, session_token, search_type, search_value, fields
+                        )
+            except QueryError as e:
+                context['error'] = f'Invalid query: {e}'
+
+        if 'error' not in context:
+            # Results are kept server side and shown one page at a time.
+            result_set = result_sets.create(
+                _result_kind(resource), results, _owner(request.session), _result_meta(results), profile
+            )
+            return redirect(f"{reverse('search')}?rs={result_set.id}")
+
+    elif request.GET.get('rs'):
+        result_set = result_sets.get(request.GET['rs'], _owner(request.session))
+        if result_set is None:
+            context['error'] = 'These results expired, please search again.'
         else:
-            access_key = request.session.get('access_key')
-            secret_key = request.session.get('secret_key')
-            session_token = request.session.get('session_token')
-            if not all([access_key, secret_key]):
-                context['error'] = 'Credential login data missing.'
-            else:
-                if resource == 'cloudfront':
-                    results = cloudfront_search_creds(access_key, secret_key, session_token, search_type, search_value)
-                else:
-                    results = route53_search_creds(access_key, secret_key, session_token, search_type, search_value)
-                context['results'] = results
+            args = _page_args(request.GET)
+            try:
+                page = result_set.page(**args)
+            except QueryError as e:
+                context['error'] = f'Invalid query: {e}'
+                page = result_set.page(sort=args['sort'], q=args['q'])
+            context.update({
+                'page': page,
+                'page_rows': [(row['index'], [row[column] for column in page['columns']]) for row in page['rows']],
+                'q': args['q'] or '',
+                'query': args['query'] or '',
+            })
+
+    return render(request, 'main/search.html', context)
+
+
+def _owner(login):
+    """Identifies who may read a result set: the AWS identity of the session."""
+    secret = login.get('access_token') or f"{login.get('access_key')}:{login.get('secret_key')}"
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
+def _search_key(login, resource, search_type, search_value, source, fields):
+    """Key under which ``search_cache`` shares a search of the session's credentials."""
+    if resource == 'trace':
+        return search_key(_owner(login), 'trace', None, search_value, mode=source)
+    return search_key(_owner(login), _result_kind(resource), search_type, search_value, mode=source, fields=fields)
+
+
+def _search_name(resource, search_type, search_value):
+    """Names a search in its profile."""
+    if resource == 'trace':
+        return f'trace {search_value}'
+    return f'{_result_kind(resource)} {search_type}={search_value}'
+
+
+def _result_kind(resource):
+    return resource if resource in ('cloudfront', 'trace') else 'route53'
+
+
+def _result_meta(results):
+    """The small part of a search's meta worth keeping with its result set."""
+    meta = {}
+    source = getattr(results, 'meta', {})
+    for key in ('snapshot', 'error', 'route53_error', 'stopped_early', 'timings', 'cache', 'plan'):
+        if source.get(key) is not None:
+            meta[key] = source[key]
+    failed = [status for status in source.get('accounts', []) if status['status'] not in ('ok', 'cancelled')]
+    if failed:
+        meta['accounts'] = failed
+    return meta
+
+
+def _page_args(params):
+    def number(name, default):
+        try:
+            return int(params.get(name, default))
+        except ValueError:
+            return default
+
+    return {
+        'page': number('page', 1),
+        'page_size': number('page_size', PAGE_SIZE),
+        'sort': params.get('sort') or None,
+        'q': params.get('q') or None,
+        'query': params.get('query') or None,
+    }
+
+
+def _result_set_etag(request, result_set_id):
+    etag = result_sets.etag(result_set_id, _owner(request.session))
+    if etag is None:
+        return None
+    params = '&'.join(f'{key}={value}' for key, value in sorted(_page_args(request.GET).items()))
+    return hashlib.sha1(f'{etag}?{params}'.encode()).hexdigest()
+
+
+@condition(etag_func=_result_set_etag)
+def result_set_api(request, result_set_id):
+    """One page of a stored result set as JSON, with compact rows.
+
+    Answers ``304 Not Modified`` when ``If-None-Match`` holds the page ETag,
+    since a result set never changes once stored.
+    """
+    if 'login_type' not in request.session:
+        return JsonResponse({'error': 'Not logged in.'}, status=401)
+    result_set = result_sets.get(result_set_id, _owner(request.session))
+    if result_set is None:
+        return JsonResponse({'error': 'Result set not found or expired.'}, status=404)
+    try:
+        return JsonResponse(result_set.page(**_page_args(request.GET)), json_dumps_params={'default': str})
+    except QueryError as e:
+        return JsonResponse({'error': f'Invalid query: {e}'}, status=400)
+
+
+def result_set_item(request, result_set_id, index):
+    """The full distribution or record behind one row of a result set."""
+    if 'login_type' not in request.session:
+        return JsonResponse({'error': 'Not logged in.'}, status=401)
+    result_set = result_sets.get(result_set_id, _owner(request.session))
+    if result_set is None:
+        return JsonResponse({'error': 'Result set not found or expired.'}, status=404)
+    if not 0 <= index < len(result_set.items):
+        return JsonResponse({'error': 'Not found.'}, status=404)
+    return JsonResponse(result_set.items[index], json_dumps_params={'default': str})
+
+
+def search_profile(request, result_set_id):
+    """Waterfall of how the search behind a result set spent its time."""
+    if 'login_type' not in request.session:
+        return redirect('login')
+    result_set = result_sets.get(result_set_id, _owner(request.session))
+    context = {'logo_url': get_logo_url()}
+    if result_set is None or result_set.profile is None:
+        context['error'] = 'This search profile expired, please search again.'
+    else:
+        profile = result_set.profile
+        context.update({
+            'result_set': result_set,
+            'name': profile.root.name,
+            'total_ms': round(profile.duration * 1000, 1),
+            'rows': profile.waterfall(),
+            'slowest': profile.slowest('account', 5),
+        })
+    return render(request, 'main/profile.html', context)
+
+
+def result_set_trace(request, result_set_id):
+    """The profile of a result set's search as Chrome trace-event JSON."""
+    if 'login_type' not in request.session:
+        return JsonResponse({'error': 'Not logged in.'}, status=401)
+    result_set = result_sets.get(result_set_id, _owner(request.session))
+    if result_set is None:
+        return JsonResponse({'error': 'Result set not found or expired.'}, status=404)
+    if result_set.profile is None:
+        return JsonResponse({'error': 'Not found.'}, status=404)
+    response = JsonResponse(result_set.profile.chrome_trace())
+    response['Content-Disposition'] = f'attachment; filename="search-{result_set_id}.trace.json"'
+    return response
+
+
+TRACE_NEEDS_SSO = 'Hostname trace needs an SSO login, since it scans every account.'
+
 
+def _fields(text):
+    """Parses the comma separated projection list of the search form."""
+    return [field.strip() for field in (text or '').split(',') if field.strip()] or None
+
+
+def batch_search(request):
+    """Searches every value of an uploaded text or CSV file in one scan."""
+    if 'login_type' not in request.session:
+        return redirect('login')
+    if request.method != 'POST':
+        return redirect('search')
+
+    context = {
+        'logo_url': get_logo_url(),
+        'snapshots': _snapshots(),
+        'refreshing': _refresh_lock.locked(),
+    }
+    resource = request.POST.get('resource')
+    search_type = request.POST.get('search_type')
+    source = request.POST.get('source', 'live')
+    upload = request.FILES.get('values_file')
+    values = parse_batch_values(upload.read().decode('utf-8-sig', errors='replace')) if upload else []
+    if not values:
+        context['error'] = 'The uploaded file has no values to search.'
+        return render(request, 'main/search.html', context)
+
+    if request.session['login_type'] == 'sso':
+        access_token = request.session.get('access_token')
+        sso_region = request.session.get('sso_region')
+        if not all([access_token, sso_region]):
+            context['error'] = 'SSO login data missing.'
+        elif resource == 'cloudfront':
+            context['batch'] = cloudfront_batch_search(access_token, sso_region, search_type, values, mode=source)
+        else:
+            context['batch'] = route53_batch_search(access_token, sso_region, search_type, values, mode=source)
+    else:
+        access_key = request.session.get('access_key')
+        secret_key = request.session.get('secret_key')
+        session_token = request.session.get('session_token')
+        if not all([access_key, secret_key]):
+            context['error'] = 'Credential login data missing.'
+        elif resource == 'cloudfront':
+            context['batch'] = cloudfront_batch_search_creds(access_key, secret_key, session_token, search_type, values)
+        else:
+            context['batch'] = route53_batch_search_creds(access_key, secret_key, session_token, search_type, values)
+    if 'batch' in context:
+        context['batch_resource'] = resource
+        context['batch_found'] = len(values) - len(context['batch'].meta['not_found'])
     return render(request, 'main/search.html', context)
 
 
+# Only one inventory refresh runs at a time, in a background thread.
+_refresh_lock = threading.Lock()
+
+
+def _snapshots():
+    """Describes the local inventory snapshots shown on the search page."""
+    snapshots = []
+    for resource, label in (('cloudfront', 'CloudFront'), ('route53', 'Route53')):
+        info = inventory.snapshot_info(resource)
+        if info:
+            info['label'] = label
+            info['refreshed'] = datetime.fromtimestamp(info['refreshed_at'], tz=timezone.utc)
+            snapshots.append(info)
+    return snapshots
+
+
+def refresh_inventory(request):
+    """Starts a background rebuild of the CloudFront and Route53 inventory."""
+    if request.session.get('login_type') != 'sso':
+        return redirect('login')
+    if request.method == 'POST' and _refresh_lock.acquire(blocking=False):
+        access_token = request.session.get('access_token')
+        sso_region = request.session.get('sso_region')
+
+        def run():
+            try:
+                refresh_cloudfront_inventory(access_token, sso_region)
+                refresh_route53_inventory(access_token, sso_region)
+            finally:
+                _refresh_lock.release()
+
+        threading.Thread(target=run, daemon=True).start()
+    return redirect('search')
+
+
+def _search_events(login, resource, search_type, search_value, source='live', fields=None):
+    """Picks the async event source matching the session login type."""
+    if login.get('login_type') == 'sso':
+        access_token = login.get('access_token')
+        sso_region = login.get('sso_region')
+        if not all([access_token, sso_region]):
+            return None
+        if resource == 'trace':
+            return blocking_search_events(trace_hostname, access_token, sso_region, search_value, mode=source)
+        if source == 'index':
+            search = cloudfront_search if resource == 'cloudfront' else route53_search
+            return blocking_search_events(search, access_token, sso_region, search_type, search_value, mode='index', fields=fields)
+        if resource == 'cloudfront':
+            return cloudfront_search_events(access_token, sso_region, search_type, search_value, fields=fields)
+        return route53_search_events(access_token, sso_region, search_type, search_value, fields=fields)
+
+    access_key = login.get('access_key')
+    secret_key = login.get('secret_key')
+    session_token = login.get('session_token')
+    if not all([access_key, secret_key]):
+        return None
+    if resource == 'trace':
+        return _failed_events(TRACE_NEEDS_SSO)
+    search = cloudfront_search_creds if resource == 'cloudfront' else route53_search_creds
+    return blocking_search_events(search, access_key, secret_key, session_token, search_type, search_value, fields)
+
+
+async def _failed_events(error):
+    yield {'event': 'failed', 'error': error}
+
+
+def _sse_message(event):
+    return f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+async def _sse(events, resource=None, owner=None, name='search'):
+    """Formats search events as SSE.
+
+    With a ``resource``, matches are sent as compact rows and kept; the end
+    event then carries the id of the result set they were stored under,
+    along with the profile of the search.
+    """
+    items, statuses = [], []
+    with profiled(name) as profile:
+        try:
+            async for event in events:
+                if resource and event['event'] == 'match':
+                    item = {key: value for key, value in event.items() if key != 'event'}
+                    items.append(item)
+                    event = {'event': 'match', 'index': len(items) - 1, **compact_row(resource, item)}
+                elif resource and event['event'] == 'account_done':
+                    statuses.append({key: value for key, value in event.items() if key != 'event'})
+                elif resource and event['event'] == 'end':
+                    meta = _result_meta({'accounts': statuses, **event})
+                    event = dict(event, result_set=result_sets.create(resource, items, owner, meta, profile).id)
+                yield _sse_message(event)
+        except QueryError as e:
+            yield _sse_message({'event': 'failed', 'error': f'Invalid query: {e}'})
+
+
+async def search_stream(request):
+    """Streams search results as Server-Sent Events while accounts are scanned.
+
+    Served without blocking when running under ASGI; the WSGI development
+    server buffers the whole stream instead.
+    """
+    login = await sync_to_async(lambda: dict(request.session.items()))()
+    if 'login_type' not in login:
+        return HttpResponse(status=401)
+
+    args = (
+        request.GET.get('resource'),
+        request.GET.get('search_type'),
+        request.GET.get('search_value', ''),
+        request.GET.get('source', 'live'),
+        _fields(request.GET.get('fields')),
+    )
+    events = _search_events(login, *args)
+    if events is None:
+        return HttpResponse(status=401)
+    events = cached_search_events(_search_key(login, *args), events)
+
+    resource = _result_kind(request.GET.get('resource'))
+    name = _search_name(request.GET.get('resource'), request.GET.get('search_type'), request.GET.get('search_value', ''))
+    response = StreamingHttpResponse(_sse(events, resource, _owner(login), name), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 def login_view(request):
     context = {'logo_url': get_logo_url()}
     if request.method == 'POST':
         login_type = request.POST.get('login_type')
         if login_type == 'sso':
-            result = sso_login()
-            if not result:
-                context['error'] = 'SSO login failed.'
+            # Every visitor approves their own device: the on-disk token
+            # caches belong to whoever runs the server.
+            pending = sso_start_device_authorization()
+            if not pending:
+                context['error'] = 'Falha no login via SSO.'
             else:
-                access_token, sso_region = result
-                request.session['login_type'] = 'sso'
-                request.session['access_token'] = access_token
-                request.session['sso_region'] = sso_region
-                return redirect('search')
+                request.session['sso_pending'] = pending
+                context['sso'] = pending
         else:
             access_key = request.POST.get('access_key')
             secret_key = request.POST.get('secret_key')
             session_token = request.POST.get('session_token')
             if not access_key or not secret_key:
-                context['error'] = 'Please provide credentials.'
+                context['error'] = 'Informe as credenciais.'
             else:
                 request.session['login_type'] = 'creds'
                 request.session['access_key'] = access_key
@@ -90,6 +467,27 @@ def login_view(request):
     return render(request, 'main/login.html', context)
 
 
+def sso_poll(request):
+    """Checks once whether the pending SSO device authorization was approved."""
+    pending = request.session.get('sso_pending')
+    if not pending:
+        return JsonResponse({'status': 'error'}, status=400)
+
+    result = sso_poll_token(pending)
+    if result['status'] == 'ok':
+        del request.session['sso_pending']
+        request.session['login_type'] = 'sso'
+        request.session['access_token'] = result['access_token']
+        request.session['sso_region'] = result['sso_region']
+        return JsonResponse({'status': 'ok', 'redirect': reverse('search')})
+    if result['status'] == 'slow_down':
+        pending['interval'] = result['interval']
+        request.session['sso_pending'] = pending
+    elif result['status'] != 'pending':
+        del request.session['sso_pending']
+    return JsonResponse({'status': result['status'], 'interval': pending['interval']})
+
+
 def logout_view(request):
     request.session.flush()
     return redirect('login')
@@ -105,3 +503,27 @@ def upload_logo(request):
         return redirect('index')
     context = {'logo_url': get_logo_url()}
     return render(request, 'main/upload_logo.html', context)
+
+
+def _metrics_allowed(request):
+    if 'login_type' in request.session:
+        return True
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return bool(settings.METRICS_TOKEN) and scheme.lower() == 'bearer' and hmac.compare_digest(token, settings.METRICS_TOKEN)
+
+
+def metrics(request):
+    """AWS API metrics and search cache counters of this process, in the Prometheus text format.
+
+    The metrics are labelled with account ids, so they need a login session
+    or the ``METRICS_TOKEN`` bearer token.
+    """
+    if not _metrics_allowed(request):
+        return HttpResponse('Not logged in.', status=401, content_type='text/plain; charset=utf-8')
+    stats = search_cache.stats()
+    lines = [
+        '# HELP aws_manager_search_cache_total Searches by how the search cache answered them.',
+        '# TYPE aws_manager_search_cache_total counter',
+    ] + [f'aws_manager_search_cache_total{{result="{result}"}} {stats[result]}' for result in ('hit', 'coalesced', 'miss')]
+    body = api_metrics.prometheus() + '\n'.join(lines) + '\n'
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
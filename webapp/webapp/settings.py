@@ -49,6 +49,24 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'webapp.wsgi.application'
 
+# Result sets are shared by every worker process of the server through this
+# cache. Point AWS_MANAGER_RESULT_SET_DIR at a shared volume, or replace the
+# backend with Redis or Memcached, when the workers run on several hosts.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'result_sets': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('AWS_MANAGER_RESULT_SET_DIR', str(BASE_DIR / 'result_sets')),
+        'TIMEOUT': float(os.environ.get('AWS_MANAGER_RESULT_SET_TTL', '1800')),
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('AWS_MANAGER_RESULT_SETS', '256'))},
+    },
+}
+
+# Bearer token that lets a scraper read /metrics/ without a login session.
+METRICS_TOKEN = os.environ.get('AWS_MANAGER_METRICS_TOKEN', '')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',